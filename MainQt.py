@@ -2,17 +2,38 @@
 import logging
 import cv2
 import os
+import threading
+import time
 import numpy as np
 import pyqtgraph as pg
 from datetime import datetime
 from PySide6.QtWidgets import (QApplication, QMainWindow, QFileDialog, QMessageBox,
-    QStatusBar, QLabel,QMenuBar,QPlainTextEdit, QVBoxLayout
+    QStatusBar, QLabel,QMenuBar,QPlainTextEdit, QVBoxLayout, QInputDialog
 )
-from PySide6.QtCore import Qt, QTimer, Signal, Slot,QObject
-from PySide6.QtGui import QImage, QIcon, QPixmap
+from PySide6.QtCore import Qt, QTimer, Signal, Slot,QObject, QUrl
+from PySide6.QtGui import QImage, QIcon, QPixmap, QDesktopServices
 
 from ui import Ui_MainWindow
 from yolo5_model_5 import YOLOv5Model
+import trajectory_analysis
+from history_viewer import HistoryViewer
+from multi_camera_view import MultiCameraView
+from batch_result_table import BatchResultTable
+from frame_buffer import FrameRingBuffer
+from event_capture import ClipCapture
+import metrics_server
+import result_publisher
+from metrics_server import METRICS
+from motion_gate import MotionGate
+import cpu_autotune
+from resolution_policy import ResolutionPolicy
+from frame_trace import TRACER
+from video_source import PrefetchVideoSource
+from camera_source import LiveCameraSource
+from shm_transport import SharedMemorySource
+from seek_index import SeekIndex, parse_position, parse_range
+from session_store import SessionStore, camera_tag, DEFAULT_CAMERA
+from replay import DetectionRecorder, DetectionLog, detections_file_for, recorded_source
 
 # 自定义一个 Qt 线程安全的日志 Handler
 # --------------------------------------------------
@@ -56,6 +77,8 @@ class QPlainTextEditHandler(logging.Handler):
         # bar.setValue(bar.maximum())
 
 class MainWindow(QMainWindow, Ui_MainWindow):
+    cpu_tune_finished = Signal(object)   # 后台调优线程 emit 最佳配置(失败为 None)，主线程应用
+
     def __init__(self):
         super().__init__()
         self.setupUi(self)
@@ -98,6 +121,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # ---------- 变量 ----------
         self.camera_index = 0
         self.cap   = None
+        self.source = None               # 当前数据源(相机索引或视频路径)，记录文件名里的相机名由它生成
         self.timer = QTimer()
         self.timer.timeout.connect(self.next_frame)
         
@@ -107,11 +131,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.contact_point_x = []
         self.contact_point_y = []
         self.max_points = 1000  # 增加显示点数
+
+        # 最近画面回看缓冲：点击曲线可以查看对应帧
+        self.frame_buffer = FrameRingBuffer(seconds=10, fps=30, budget_mb=200)
+        # 事件触发片段录制：丢失/突跳/低置信度时从回看缓冲保存前后各2秒
+        results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+        self.clip_capture = ClipCapture(self.frame_buffer, os.path.join(results_dir, "clips"),
+                                        pre_frames=60, post_frames=60)
+        # 运动门控：画面静止/重复帧时复用上一次检测结果
+        self.motion_gate = MotionGate(threshold=4.0, max_reuse=30)
         
         # 数据持久化存储相关
+        self.results_path = results_dir
+        self.session_store = SessionStore(os.path.join(results_dir, "sessions.db"))
         self.data_file = None
         self.data_writer = None
         self.is_recording = False
+        self.detection_recorder = None   # 每帧检测框，供回放使用
+        self.replay = None               # 回放模式下的 DetectionLog，None 表示实时检测
+        self.frame_interval = 30         # 播放定时器间隔(ms)，由播放速度决定
+        self.speed = 1.0                 # 播放倍速，0 为不限速
         
         # 初始化曲线绘制组件
         self.init_plot()
@@ -133,9 +172,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # 默认权重
         default_weight = "weights/best.pt"
-        self.model = YOLOv5Model(default_weight)
+        self.model = YOLOv5Model(default_weight, backend='auto')
         self.model.iou_thres = self.iou_slider.value()/100.0
         self.model.conf_thres = self.conf_slider.value()/100.0
+        self.frame_buffer.overlay = self.model.overlay   # 显示叠加模式下缓存画面的画框
+        # 输入尺寸动态调整：超出延迟预算或目标足够大时降档，置信度下降时升档
+        self.resolution_policy = ResolutionPolicy(sizes=(416, 512, 640), budget_ms=40.0)
+        self.warmed_shape = None
+        self.trace_seq = 0               # 逐帧追踪 id
+        self.seek_index = None           # 当前视频文件的帧索引，后台建立
+        self.range_end = None            # 区间处理的结束帧号，None 表示处理到结尾
         # self.model.conf_thres = self.conf_slider.value() 会导致没有结果
         # 可以用 self.iou_slider.value() 注意value本身是 0-100  因为只能是整数
         # 可以用 doublespinbox 是小数，在ui.py里的设置好了，
@@ -143,6 +189,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # ---------- 信号连接槽函数 ----------
         # 菜单栏信号与槽函数的连接
         self.control_menu.triggered.connect(self.action_triggered)
+        self.cpu_tune_finished.connect(self._on_cpu_tune_finished)
         self.swift_lang.triggered.connect(self.swift_lang_def)  
         # 输入图片视频
         self.btn_image.clicked.connect(self.select_image)
@@ -165,10 +212,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.btn_pause_detect.clicked.connect(self.pause_detection)
         self.btn_save.clicked.connect(self.save_result)
 
+        # "位置列表"页：图片文件夹批量检测结果
+        self.batch_table = BatchResultTable(self.model)
+        tab2_layout = QVBoxLayout(self.tab2)
+        tab2_layout.setContentsMargins(0, 0, 0, 0)
+        tab2_layout.addWidget(self.batch_table)
+        self.batch_table.image_selected.connect(self.show_cv_img)
+
         # 必须在控件创建好之后再初始化 logging
         self.init_logging(self.plaintext)
 
         logging.info("日志初始化完成")
+
+        # 可选的指标接口：设置环境变量 METRICS_PORT 后启动
+        self.metrics_server = metrics_server.start_from_env()
+        # 可选的结果发布：设置环境变量 RESULT_PUBLISH=地址:端口 后启动
+        self.publisher = result_publisher.start_from_env(self.model.names)
     
     # ---------- 曲线绘制初始化 ----------
     def init_plot(self):
@@ -213,6 +272,25 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         
         # 将布局添加到tab1
         self.tab1.setLayout(plot_layout)
+
+        # 点击曲线显示缓冲中对应帧
+        self.plot_widget_x.scene().sigMouseClicked.connect(
+            lambda e: self.show_buffered_frame(self.plot_widget_x, e))
+        self.plot_widget_y.scene().sigMouseClicked.connect(
+            lambda e: self.show_buffered_frame(self.plot_widget_y, e))
+
+    def show_buffered_frame(self, widget, event):
+        """从回看缓冲里取出点击位置对应的帧并显示，播放中则先暂停"""
+        frame_number = int(round(widget.getViewBox().mapSceneToView(event.scenePos()).x()))
+        hit = self.frame_buffer.get(frame_number)
+        if hit is None:
+            logging.info(f"回看缓冲中没有帧 {frame_number}")
+            return
+        if self.video_play == True:
+            self.pause_play()
+        frame_number, img = hit
+        self.show_cv_img(img)
+        logging.info(f"回看帧 {frame_number}")
     
     # ---------- 菜单栏方法实现 ----------
     # 菜单栏的槽函数
@@ -224,28 +302,252 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             ...
             return
         elif action == self.logs_dir:
-            '''
-            
-            filename, filter = QFileDialog.getOpenFileName(self, "打开", ".", "文本文件(*.txt)")
-
-            try:
-                fp = open(filename, encoding="UTF-8")
-                string = fp.readlines()
-                self.plainText.clear()
-                for i in string:
-                    self.plainText.appendPlainText(i)
-                fp.close()
-
-            except:
-                QMessageBox.critical(self, "打开文件失败", "请选择适合的文件!")
-            '''  
+            logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+            QDesktopServices.openUrl(QUrl.fromLocalFile(logs_dir))
             return
         elif action == self.results_dir:
-            ...
+            # 结果文件夹：记录文件、会话库 sessions.db、事件片段、性能追踪
+            os.makedirs(self.results_path, exist_ok=True)
+            QDesktopServices.openUrl(QUrl.fromLocalFile(self.results_path))
+            return
+        elif action == self.history_view:
+            self.open_history_viewer()
+            return
+        elif action == self.cpu_tune:
+            self.start_cpu_tune()
+            return
+        elif action == self.export_trace:
+            results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+            os.makedirs(results_dir, exist_ok=True)
+            path = os.path.join(results_dir, datetime.now().strftime("trace_%Y%m%d_%H%M%S.json"))
+            n = TRACER.export(path)
+            logging.info(f"性能追踪已导出 {n} 个事件: {path} (用 chrome://tracing 或 ui.perfetto.dev 打开)")
+            return
+        elif action == self.jump_frame:
+            text, ok = QInputDialog.getText(self, "跳转", "帧号 / 秒(70s) / 时分秒(01:10:05):")
+            if ok and text:
+                try:
+                    self.seek_to_frame(parse_position(text, self.seek_index))
+                except ValueError as e:
+                    QMessageBox.warning(self, "提示", str(e))
+            return
+        elif action == self.process_range:
+            text, ok = QInputDialog.getText(self, "区间处理", "起始-结束 (帧号 / 秒 / 时分秒):")
+            if ok and text:
+                try:
+                    start, end = parse_range(text, self.seek_index)
+                except ValueError as e:
+                    QMessageBox.warning(self, "提示", str(e))
+                    return
+                if self.seek_to_frame(start):
+                    self.range_end = end
+                    logging.info(f"区间处理: 帧 {start} - {end}")
+                    if self.video_play == False:
+                        self.pause_play()
+            return
+        elif action == self.multi_camera:
+            self.open_multi_camera()
+            return
+        elif action == self.replay_mode:
+            if action.isChecked():
+                self.open_replay()
+            else:
+                self.exit_replay()
+            return
+        elif action == self.playback_speed:
+            speed, ok = QInputDialog.getDouble(self, "播放速度", "倍速(0 为不限速，按解码速度播放):",
+                                               self.speed, 0, 64, 2)
+            if ok:
+                self.speed = speed
+                self.apply_playback_speed()
+            return
+        elif action == self.display_overlay:
+            # 开启后模型不在源分辨率上画框，显示前缩放到控件尺寸再画
+            self.model.draw_boxes = not action.isChecked()
+            logging.info(f"按显示尺寸画框已{'开启' if action.isChecked() else '关闭'}")
+            return
+        elif action == self.tiled_mode:
+            self.model.tiled = action.isChecked()
+            logging.info(f"分块推理已{'开启' if self.model.tiled else '关闭'}")
             return
         elif action == self.quit:  # 退出动作
             self.close()
 
+    def start_cpu_tune(self):
+        """实测各线程配置耗时几十秒，放在后台线程里做，期间暂停播放，界面保持响应"""
+        self.timer.stop()
+        self.cpu_tune.setEnabled(False)
+        logging.info("开始 CPU 调优...")
+        threading.Thread(target=self._run_cpu_tune, daemon=True).start()
+
+    def _run_cpu_tune(self):
+        cfg = None
+        try:
+            cfg, _ = cpu_autotune.autotune(self.model)
+        except Exception as e:
+            logging.error(f"CPU 调优失败: {str(e)}")
+        finally:
+            self.cpu_tune_finished.emit(cfg)
+
+    def _on_cpu_tune_finished(self, cfg):
+        if cfg:
+            # 线程数设置对调用线程生效，推理在主线程进行，所以在主线程再应用一次
+            cpu_autotune.apply_threads(cfg)
+            cpu_autotune.apply_model_options(self.model, cfg)
+        self.cpu_tune.setEnabled(True)
+        if self.video_play == True:
+            self.timer.start(self.frame_interval)
+
+    def open_history_viewer(self):
+        """选择一个记录文件，用多级降采样金字塔浏览整段曲线"""
+        path, _ = QFileDialog.getOpenFileName(self, "选择记录文件", "", "记录(*.csv)")
+        if not path:
+            return
+        try:
+            self.history_viewer = HistoryViewer(path, self)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"无法打开记录文件: {str(e)}")
+            logging.error(f"打开历史记录失败: {str(e)}")
+            return
+        self.history_source = recorded_source(path)
+        self.history_viewer.frame_selected.connect(self.seek_history_frame)
+        self.history_viewer.show()
+        logging.info(f"历史回看 {path}")
+
+    def seek_history_frame(self, frame_number):
+        """历史曲线上选中的帧：只在当前视频就是该记录的源视频时跳转；未打开视频时打开记录的源视频"""
+        source = self.history_source
+        if not isinstance(self.cap, PrefetchVideoSource):
+            if not os.path.isfile(source):
+                QMessageBox.warning(self, "提示", "请先打开与该记录对应的视频")
+                return
+            self.video_play = True
+            self.is_inputed = True
+            self.open_source(source)
+            self.btn_pause_video.setEnabled(True)
+            self.btn_pause_video.setStyleSheet(self.btn_enable_stylesheet)
+        elif not source:
+            logging.warning("该记录没有对应的检测结果文件，无法确认源视频，按当前视频跳转")
+        elif os.path.abspath(source) != os.path.abspath(self.cap.src):
+            QMessageBox.warning(self, "提示", f"该记录对应的视频是 {source}，与当前视频不同")
+            return
+        self.seek_to_frame(frame_number)
+
+    def open_replay(self):
+        """加载检测结果文件，按记录的结果回放当前视频；未打开视频时打开记录里的源视频"""
+        path, _ = QFileDialog.getOpenFileName(self, "选择检测结果文件", self.results_path, "检测结果(detections_*.csv)")
+        if not path:
+            self.replay_mode.setChecked(False)
+            return
+        try:
+            log = DetectionLog(path)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"无法打开检测结果文件: {str(e)}")
+            logging.error(f"加载检测结果失败: {str(e)}")
+            self.replay_mode.setChecked(False)
+            return
+        if not isinstance(self.cap, PrefetchVideoSource):
+            if not os.path.isfile(log.source):
+                QMessageBox.warning(self, "提示", "请先打开与检测结果对应的视频")
+                self.replay_mode.setChecked(False)
+                return
+            self.video_play = True
+            self.is_inputed = True
+            self.open_source(log.source)
+            self.btn_pause_video.setEnabled(True)
+            self.btn_pause_video.setStyleSheet(self.btn_enable_stylesheet)
+        elif log.source and os.path.abspath(log.source) != os.path.abspath(self.cap.src):
+            logging.warning(f"检测结果记录的视频是 {log.source}，当前视频是 {self.cap.src}")
+        if self.detection_running:
+            self.pause_detection()
+        self.replay = log
+        self.replay_mode.setChecked(True)
+        # 从记录的第一帧开始回放
+        self.seek_to_frame(log.first_frame)
+        logging.info(f"回放 {path}: 帧 {log.first_frame} - {log.last_frame}")
+
+    def exit_replay(self):
+        if self.replay is None:
+            return
+        self.replay = None
+        self.replay_mode.setChecked(False)
+        logging.info("退出回放")
+
+    def open_multi_camera(self):
+        """多路相机同时监测，与主窗口共用同一个模型"""
+        text, ok = QInputDialog.getText(self, "多路监测", "相机索引或流地址(逗号分隔):", text="0,1")
+        if not ok or not text.strip():
+            return
+        sources = [s.strip() for s in text.split(',') if s.strip()]
+        sources = [int(s) if s.isdigit() else s for s in sources]
+        # 与主窗口共用一个发布器，序号连续，订阅端按路号区分
+        self.multi_camera_view = MultiCameraView(self.model, sources, self, publisher=self.publisher)
+        self.multi_camera_view.show()
+        logging.info(f"多路监测 {sources}")
+
+    def _build_seek_index(self, path):
+        """后台建立帧索引，首次打开长视频需要扫描一遍，之后直接读旁挂文件"""
+        try:
+            index = SeekIndex(path)
+        except Exception as e:
+            logging.error(f"建立视频索引失败: {str(e)}")
+            return
+        if isinstance(self.cap, PrefetchVideoSource) and self.cap.src == path:
+            self.seek_index = index
+
+    def seek_to_frame(self, frame_number):
+        """视频定位到指定帧并从该帧继续，曲线和回看缓冲从新位置重新开始"""
+        if not isinstance(self.cap, PrefetchVideoSource):
+            logging.warning("只有视频文件支持跳转")
+            return False
+        if self.seek_index is not None:
+            self.cap.seek(frame_number, self.seek_index)
+        else:
+            logging.info("视频索引尚未建立，使用容器定位")
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, max(frame_number - 1, 0))
+        self.range_end = None
+        self.clip_capture.flush()
+        self.frame_buffer.clear()
+        self.motion_gate.reset()
+        self.reset_resolution()
+        TRACER.reset_clock()
+        if self.replay is not None:
+            # 回放时曲线直接从记录补齐到跳转位置
+            self.frame_numbers, self.contact_point_x, self.contact_point_y = \
+                self.replay.contact_range(frame_number - self.max_points, frame_number - 1)
+        else:
+            self.frame_numbers, self.contact_point_x, self.contact_point_y = [], [], []
+        logging.info(f"跳转到帧 {frame_number}")
+        # 暂停中则立即显示目标帧
+        if self.video_play == False:
+            self.next_frame()
+        return True
+
+    def apply_playback_speed(self):
+        """
+        按倍速设置定时器间隔，1 倍速的间隔取自视频本身的帧率；4 倍速以上定时器间隔已接近界面刷新的极限，
+        改为每 n 帧解码显示 1 帧，其余帧由预取线程只 grab 不解码
+        """
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap is not None else 0
+        if not fps or not 0 < fps <= 240:
+            fps = 30.0               # 部分相机/容器不报告帧率
+        stride = 1
+        if self.speed > 4 and isinstance(self.cap, PrefetchVideoSource):
+            stride = int(np.ceil(self.speed / 4))
+        if isinstance(self.cap, PrefetchVideoSource):
+            self.cap.decode_stride = stride
+        self.frame_interval = int(round(1000.0 / fps * stride / self.speed)) if self.speed > 0 else 0
+        if self.timer.isActive():
+            self.timer.start(self.frame_interval)
+        logging.info(f"播放速度 {self.speed:g}x ({fps:.1f} fps), 帧间隔 {self.frame_interval}ms, 每 {stride} 帧显示 1 帧")
+
+    def reset_resolution(self):
+        """换源或跳转后输入尺寸回到最大档，延迟统计重新开始"""
+        self.resolution_policy.reset()
+        self.model.img_size = self.resolution_policy.size
+        self.motion_gate.reset()
+        self.size_label.setText(f"输入 {self.resolution_policy.size}")
+
     def swift_lang_def(self):
         print("swift not yet")
         ...
@@ -316,9 +618,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.btn_start_detect.setStyleSheet(self.btn_enable_stylesheet)
 
             
-            # 用于展示图片
-            image = QImage(path)
-            self.label_img.setPixmap(QPixmap.fromImage(image).scaled(640,480))
+            # 用于展示图片：解码一次放入缓存，检测时直接复用
+            img = self.batch_table.cache.get(path)
+            self.show_cv_img(img)
             self.scaleFactor = 1.0
             
             #img = cv2.imread(path)
@@ -373,17 +675,45 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.cap.release(); self.cap = None
 
         self.detection_running = False
-
-        self.cap = cv2.VideoCapture(src)
+        self.frame_buffer.clear()
+        self.motion_gate.reset()
+        self.reset_resolution()
+        TRACER.reset_clock()
+
+        # 视频文件用后台预取解码，解码与推理重叠；相机用最新帧抓取，只处理最新画面
+        self.seek_index = None
+        self.range_end = None
+        self.exit_replay()
+        self.latency_label.setText("")
+        self.source = src
+        if isinstance(src, str):
+            self.cap = PrefetchVideoSource(src)
+            threading.Thread(target=self._build_seek_index, args=(src,), daemon=True).start()
+        elif os.environ.get('CAPTURE_PROCESS'):
+            # 相机在独立进程里采集解码，经共享内存传帧
+            self.cap = SharedMemorySource(src, width=1280, height=720, fps=30, fourcc='MJPG')
+        else:
+            self.cap = LiveCameraSource(src, width=1280, height=720, fps=30, fourcc='MJPG')
         if not self.cap.isOpened():
             QMessageBox.critical(self, "错误", "无法打开视频/摄像头")
             logging.warning(f"无法打开相机，相机索引{self.camera_index}，相机是否已连接")
             return
         
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.clip_capture.fps = fps if fps and fps > 0 else 30.0
+        self.frame_buffer.set_fps(self.clip_capture.fps)
+
+        # 按画面尺寸预热全部候选输入尺寸(同一尺寸只做一次)
+        frame_shape = (int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        if all(frame_shape) and frame_shape != self.warmed_shape:
+            self.model.warmup_sizes(self.resolution_policy.sizes, frame_shape)
+            self.warmed_shape = frame_shape
+
         self.btn_video_end.setEnabled(True)
         self.btn_video_end.setStyleSheet(self.btn_enable_stylesheet)
         self.path_line.setText(str(src))
-        self.timer.start(30)
+        self.apply_playback_speed()
+        self.timer.start(self.frame_interval)
     
     # 实现暂停播放：注意对状态 video_play 进行改变 共几次？ 是每次
     def pause_play(self):
@@ -395,7 +725,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             logging.info("暂停")
             #self.show_results("暂停"+ f" ---{self.now:%Y/%m/%d %H:%M}---")
         else:
-            self.timer.start(30)  # 实现播放
+            self.timer.start(self.frame_interval)  # 实现播放
+            TRACER.reset_clock()  # 暂停期间不计入采集-显示延迟
             self.video_play = True
             logging.info("播放")
             #self.show_results("播放"+ f" ---{self.now:%Y/%m/%d %H:%M}---")
@@ -405,6 +736,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.timer.stop()
         # 停止数据记录
         self.stop_data_recording()
+        self.clip_capture.flush()
+        if self.motion_gate.reused_total:
+            logging.info(f"运动门控: 复用检测结果 {self.motion_gate.reused_total} 帧, "
+                         f"其中重复帧 {self.motion_gate.duplicates_total}")
         if self.cap:
             self.cap.release(); self.cap = None
         # 注意对video_play 状态改变
@@ -429,14 +764,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def closeEvent(self, event):
         if self.cap is not None:  # 先检查是否读取视频，否则退出时报错
             self.cap.release()
+        self.frame_buffer.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.publisher is not None:
+            self.publisher.close()
         super().closeEvent(event)
 
 
     # ---------- 权重切换与参数设置 ----------
     def load_pt(self):
-        path, _ = QFileDialog.getOpenFileName(self, "选择权重文件", "", "pt(*.pt)")
+        path, _ = QFileDialog.getOpenFileName(self, "选择权重文件", "", "权重(*.pt *.deploy)")
         if path:
-            self.model.weights_path = path 
+            try:
+                self.model.load_weights(path)
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"无法加载权重: {str(e)}")
+                logging.error(f"加载权重失败: {str(e)}")
+                return
+            self.warmed_shape = None     # 新权重需要重新预热各输入尺寸
+            self.motion_gate.reset()     # 旧权重的检测结果不再复用
             self.pt_loaded = True
             #self.show_results(f'载入权重{path}'+f' ---{self.now:%Y/%m/%d %H:%M}---')
             #print(f'载入权重{path}')
@@ -459,6 +806,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.iou_slider.setValue(iou)
         #logging.info(f"IOU阈值已变更为{iou}")
         #self.iou_threshold = iou
+        self.motion_gate.reset()          # 新阈值下上一次的结果不能再复用
         self.iou_timer.start(self.delay_time)
     # 日志延迟记录调整过程中最后一个值，delay_time = 500ms
     def _really_log_iou(self):  
@@ -480,6 +828,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.conf_slider.setValue(conf)
         #logging.info(f"置信度阈值已变更为{conf}")
         #self.conf_threshold = conf
+        self.motion_gate.reset()
         self.conf_timer.start(self.delay_time)
 
     def _really_log_conf(self):  
@@ -528,7 +877,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             
         if self.video_play is None and self.is_inputed:
             # 单一图片检测：只处理图像，不更新曲线
-            img = cv2.imread(self.image_path)  # 注意读取图片 而不是输入path给model
+            img = self.batch_table.cache.get(self.image_path)
+            if img is None:
+                QMessageBox.critical(self, "错误", f"无法读取图片: {self.image_path}")
+                logging.error(f"无法读取图片 {self.image_path}")
+                return
+            img = img.copy()  # 缓存中的解码结果，拷贝后再画框
             # 虽然predict方法返回两个值，但我们只关心处理后的图像
             img_out, _ = self.model.predict(img)  # 忽略contact_points
             self.show_cv_img(img_out)
@@ -673,12 +1027,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         try:
             # 创建一个带时间戳的文件名
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            self.data_file = f"coordinate_data_{timestamp}.csv"
+            os.makedirs(self.results_path, exist_ok=True)
+            camera = camera_tag(self.source) if self.source is not None else DEFAULT_CAMERA
+            self.data_file = os.path.join(self.results_path, f"coordinate_data_{camera}_{timestamp}.csv")
             
             # 创建CSV写入器
             self.data_writer = open(self.data_file, 'w')
-            # 写入表头
-            self.data_writer.write('frame_number,x_center,y_center\n')
+            # 写入表头；帧号是源的绝对帧号(跳转、倍速都会让它与时间脱节)，另记采样时刻
+            self.data_writer.write('frame_number,x_center,y_center,reused,timestamp\n')
+            # 同时记录每帧全部检测框，回放时不必重新推理
+            self.detection_recorder = DetectionRecorder(detections_file_for(self.data_file),
+                                                        source=self.path_line.text())
             
             self.is_recording = True
             logging.info(f"开始记录数据到文件: {self.data_file}")
@@ -688,15 +1047,33 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def stop_data_recording(self):
         """停止数据记录并关闭文件"""
         if self.is_recording and self.data_writer:
+            data_file = self.data_file
             try:
                 self.data_writer.close()
+                if self.detection_recorder is not None:
+                    self.detection_recorder.close()
                 logging.info(f"数据记录已停止，文件已保存: {self.data_file}")
+                # 后台线程做离线分析，避免阻塞界面；日志 handler 本身是线程安全的
+                threading.Thread(target=self._analyze_recording, args=(data_file, self.clip_capture.fps),
+                                 daemon=True).start()
             except Exception as e:
                 logging.error(f"关闭数据文件失败: {str(e)}")
             finally:
                 self.is_recording = False
                 self.data_writer = None
                 self.data_file = None
+                self.detection_recorder = None
+
+    def _analyze_recording(self, data_file, fps):
+        """对刚保存的记录文件做轨迹分析，结果写入日志，并导入会话库"""
+        try:
+            trajectory_analysis.log_summary(trajectory_analysis.analyze_recording(data_file, fps=fps))
+        except Exception as e:
+            logging.error(f"轨迹分析失败: {str(e)}")
+        try:
+            self.session_store.ingest_csv(data_file, fps=fps)
+        except Exception as e:
+            logging.error(f"导入会话库失败: {str(e)}")
 
     ''' logging更新太快，有冗余，弃用
     # iou 滑块值与spinbox 互变统一
@@ -730,28 +1107,38 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     @Slot()
     def start_detection(self):
         """开始/继续检测"""
+        # 回放中开始检测则退出回放，改为实时推理
+        self.exit_replay()
         # 开始记录数据到文件
         if not self.is_recording:
             self.start_data_recording()
             
         if self.video_play is None and self.is_inputed:
             # 单一图片检测：只处理图像，不更新曲线
-            img = cv2.imread(self.image_path)  # 注意读取图片 而不是输入path给model
+            img = self.batch_table.cache.get(self.image_path)
+            if img is None:
+                QMessageBox.critical(self, "错误", f"无法读取图片: {self.image_path}")
+                logging.error(f"无法读取图片 {self.image_path}")
+                return
+            img = img.copy()  # 缓存中的解码结果，拷贝后再画框
             # 虽然predict方法返回两个值，但我们只关心处理后的图像
             img_out, _ = self.model.predict(img)  # 忽略contact_points
-            self.show_cv_img(img_out)
+            # 显示叠加模式下 predict 不画框，在显示尺寸上画
+            self.show_cv_img(img_out, None if self.model.draw_boxes else self.model.last_detections)
 
 
         else:
             ret, frame = self.cap.read()
             if not ret:
-                self.stop_play(); return            
+                if getattr(self.cap, 'ended', True):
+                    self.stop_play()
+                return            
             if self.detection_running:
                 # 调用 YOLOv5 模型进行推理
                 self.model.conf_thres= self.conf_spinbox.value()
                 self.model.iou_thres= self.iou_spinbox.value()
-                frame = self.model.predict(frame) 
-                self.show_cv_img(frame) 
+                frame, _ = self.model.predict(frame)
+                self.show_cv_img(frame, None if self.model.draw_boxes else self.model.last_detections)
 
                 pass
         self.detection_running = True
@@ -790,18 +1177,58 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     # ---------- 显示 ----------
     def next_frame(self):
+        # 每帧一个 trace id，贯穿读帧到显示的各阶段
+        self.trace_seq += 1
+        TRACER.begin_frame(self.trace_seq)
+        t_frame = time.perf_counter()
         ret, frame = self.cap.read()
+        t_read = time.perf_counter()
+        TRACER.add_stamps((t_frame, t_read), ('cap.read',))
         if not ret:
-            self.stop_play(); return
+            # 解码/定位慢导致的超时不是结尾，下一次定时器再读
+            if getattr(self.cap, 'ended', True):
+                self.stop_play()
+            return
+        METRICS.observe('stage_latency_seconds', t_read - t_frame, stage='read')
         
         # 检测帧号
         current_frame = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if self.range_end is not None and current_frame > self.range_end:
+            # 区间处理完成：暂停在区间末尾
+            logging.info(f"区间处理完成，结束帧 {self.range_end}")
+            self.range_end = None
+            self.stop_data_recording()
+            self.clip_capture.flush()
+            self.timer.stop()
+            self.video_play = False
+            return
         
         if self.detection_running:
             # 调用 YOLOv5 模型进行推理
             self.model.conf_thres= self.conf_spinbox.value()
             self.model.iou_thres= self.iou_spinbox.value()
-            frame, contact_points = self.model.predict(frame) 
+            reused = self.motion_gate.check(frame)
+            if reused:
+                frame, contact_points = self.model.reuse(frame)
+            else:
+                t_infer = time.perf_counter()
+                frame, contact_points = self.model.predict(frame) 
+                new_size = self.resolution_policy.update((time.perf_counter() - t_infer) * 1000,
+                                                         self.model.last_detections, frame.shape)
+                if new_size is not None:
+                    self.model.img_size = new_size
+                    self.motion_gate.reset()
+                    self.size_label.setText(f"输入 {new_size}")
+            # 推理完立即发布，下游报警不等记录、曲线和显示
+            if self.publisher is not None:
+                self.publisher.publish(current_frame, self.cap.get(cv2.CAP_PROP_POS_MSEC),
+                                       self.model.last_detections, contact_points)
+            if self.detection_recorder is not None:
+                try:
+                    with TRACER.span('record'):
+                        self.detection_recorder.write(current_frame, self.model.last_detections)
+                except Exception as e:
+                    logging.error(f"写入检测结果失败: {str(e)}")
             
             # 处理contact point信息并更新曲线
             if contact_points:
@@ -816,7 +1243,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 # 将数据保存到文件
                 if self.is_recording and self.data_writer:
                     try:
-                        self.data_writer.write(f'{current_frame},{x_center},{y_center}\n')
+                        with TRACER.span('record'):
+                            self.data_writer.write(f'{current_frame},{x_center},{y_center},{int(reused)},'
+                                                   f'{time.time():.3f}\n')
                     except Exception as e:
                         logging.error(f"写入数据失败: {str(e)}")
                 
@@ -830,9 +1259,50 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         self.contact_point_y = self.contact_point_y[-self.max_points:]
                 
                 # 更新曲线显示
-                self.update_plot()
+                with TRACER.span('update_plot'):
+                    self.update_plot()
+        elif self.replay is not None:
+            # 回放：检测框和接触点取自记录文件，不做推理
+            detections = self.replay.get(current_frame)
+            contact_points = self.replay.contact_points(current_frame)
+            if self.model.draw_boxes:
+                self.model.overlay.draw(frame, detections)
+            if contact_points:
+                x_center, y_center = contact_points[0]
+                self.frame_numbers.append(current_frame)
+                self.contact_point_x.append(x_center)
+                self.contact_point_y.append(y_center)
+                if len(self.frame_numbers) > self.max_points * 1.5:
+                    self.frame_numbers = self.frame_numbers[-self.max_points:]
+                    self.contact_point_x = self.contact_point_x[-self.max_points:]
+                    self.contact_point_y = self.contact_point_y[-self.max_points:]
+                with TRACER.span('update_plot'):
+                    self.update_plot()
         
-        self.show_cv_img(frame)
+        # 显示叠加模式下 frame 上没有框：显示时在显示尺寸上画，缓冲在后台线程画，回看和事件片段仍是带框画面
+        overlay_dets = None
+        if not self.model.draw_boxes:
+            if self.detection_running:
+                overlay_dets = self.model.last_detections
+            elif self.replay is not None:
+                overlay_dets = detections
+        with TRACER.span('replay_buffer'):
+            self.frame_buffer.push(current_frame, frame, overlay_dets)
+            if self.detection_running:
+                self.clip_capture.update(current_frame, contact_points, self.model.last_detections)
+        with TRACER.span('show_cv_img'):
+            self.show_cv_img(frame, overlay_dets)
+        t_end = time.perf_counter()
+        TRACER.add_stamps((t_frame, t_end), ('frame',))
+        TRACER.mark_display(self.cap.get(cv2.CAP_PROP_POS_MSEC))
+        if isinstance(self.cap, (LiveCameraSource, SharedMemorySource)):
+            # 相机采集到结果显示的延迟
+            latency_ms = self.cap.latency_ms()
+            METRICS.observe('camera_latency_seconds', latency_ms / 1000)
+            if self.trace_seq % 10 == 0:
+                self.latency_label.setText(f"延迟 {latency_ms:.0f}ms")
+        METRICS.observe('stage_latency_seconds', t_end - t_frame, stage='frame')
+        METRICS.tick_frame()
 
 
     def update_plot(self):
@@ -903,9 +1373,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # 设置横轴刻度间距为50
         self.plot_widget_y.getAxis('bottom').setTickSpacing(50, 10)
     
-    def show_cv_img(self, cv_img):
+    def show_cv_img(self, cv_img, detections=None):
         if cv_img is None: 
             return
+        if detections is not None:
+            # 先缩放到显示尺寸再画框，画框开销与源分辨率无关
+            h, w = cv_img.shape[:2]
+            scale = min(self.label_img.width() / w, self.label_img.height() / h)
+            cv_img = cv2.resize(cv_img, (max(int(w * scale), 1), max(int(h * scale), 1)),
+                                interpolation=cv2.INTER_AREA)
+            self.model.overlay.draw(cv_img, detections, scale=scale)
         rgb = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
         h, w, ch = rgb.shape
         qt_img = QImage(rgb.data, w, h, ch*w, QImage.Format_RGB888)
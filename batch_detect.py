@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+图片文件夹批量检测
+解码放在线程池里并行(cv2.imread 解码时释放 GIL)，按顺序凑成 batch 交给 YOLOv5Model.predict_batch，
+解码与推理重叠。解码结果进入有内存上限的 LRU 缓存，表格里点选查看、重复检测时不必再次解码。
+结果可以整体导出为 CSV。
+
+    python batch_detect.py --folder captures/ --out detections.csv --workers 4 --batch 8
+"""
+import argparse
+import csv
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from overlay import OverlayRenderer
+from yolo5_model_5 import YOLOv5Model
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif')
+
+
+def list_images(folder, recursive=False):
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTS))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+class ImageCache:
+    """解码后图像的 LRU 缓存，按 (路径, 修改时间) 作键，总字节数有上限"""
+    def __init__(self, budget_mb=512):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return path, os.stat(path).st_mtime_ns
+
+    def get(self, path):
+        """返回 BGR 图像，缓存未命中时解码；读取失败返回 None"""
+        try:
+            key = self._key(path)
+        except OSError:
+            return None
+        with self._lock:
+            img = self._items.get(key)
+            if img is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+        img = cv2.imread(path)
+        if img is None:
+            return None
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = img
+                self._bytes += img.nbytes
+            while self._bytes > self.budget and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= old.nbytes
+        return img
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+class ImageResult:
+    __slots__ = ('path', 'shape', 'detections', 'contact_points', 'thumbnail', 'error')
+
+    def __init__(self, path, shape=None, detections=(), contact_points=(), thumbnail=None, error=None):
+        self.path = path
+        self.shape = shape
+        self.detections = list(detections)
+        self.contact_points = list(contact_points)
+        self.thumbnail = thumbnail
+        self.error = error
+
+
+_THUMB_OVERLAY = OverlayRenderer(color=(100, 160, 0), line_thickness=1)
+
+
+def make_thumbnail(img, detections, size=96):
+    """画好框的缩略图，长边为 size；先缩小再画框"""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    thumb = cv2.resize(img, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+    return _THUMB_OVERLAY.draw(thumb, detections, scale=scale, labels=False)
+
+
+class FolderBatchDetector:
+    def __init__(self, model, paths, cache=None, workers=4, batch_size=8, thumb_size=96):
+        self.model = model
+        self.paths = list(paths)
+        self.cache = cache if cache is not None else ImageCache()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.thumb_size = thumb_size
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _decoded(self, pool):
+        """按原顺序产出 (path, img)，线程池提前解码至多 workers * 2 张"""
+        pending = deque()
+        it = iter(self.paths)
+        for path in it:
+            pending.append((path, pool.submit(self.cache.get, path)))
+            if len(pending) >= self.workers * 2:
+                break
+        while pending:
+            path, fut = pending.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(self.cache.get, nxt)))
+            yield path, fut.result()
+
+    def run(self, on_batch=None):
+        """逐批检测，每批完成后回调 on_batch(list[ImageResult])，返回全部结果"""
+        results = []
+        batch = []
+        t0 = time.perf_counter()
+
+        def flush():
+            preds = self.model.predict_batch([img for _, img in batch])
+            out = [ImageResult(path, img.shape, det, cps, make_thumbnail(img, det, self.thumb_size))
+                   for (path, img), (det, cps) in zip(batch, preds)]
+            batch.clear()
+            return out
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for path, img in self._decoded(pool):
+                if self._cancel.is_set():
+                    break
+                if img is None:
+                    out = [ImageResult(path, error="无法读取")]
+                else:
+                    batch.append((path, img))
+                    if len(batch) < self.batch_size:
+                        continue
+                    out = flush()
+                results.extend(out)
+                if on_batch:
+                    on_batch(out)
+            if batch and not self._cancel.is_set():
+                out = flush()
+                results.extend(out)
+                if on_batch:
+                    on_batch(out)
+
+        dt = time.perf_counter() - t0
+        logging.info(f"批量检测完成: {len(results)} 张, 耗时 {dt:.1f}s "
+                     f"({len(results) / max(dt, 1e-6):.1f} 张/s), 缓存命中 {self.cache.hits}")
+        return results
+
+
+def export_csv(results, path):
+    """每个检测框一行；没有检测结果的图片也保留一行"""
+    n = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['image', 'width', 'height', 'class', 'conf', 'x1', 'y1', 'x2', 'y2', 'error'])
+        for r in results:
+            h, w = r.shape[:2] if r.shape else ('', '')
+            if not r.detections:
+                writer.writerow([r.path, w, h, '', '', '', '', '', '', r.error or ''])
+            for xyxy, conf, name in r.detections:
+                writer.writerow([r.path, w, h, name, f'{conf:.4f}'] + [f'{v:.1f}' for v in xyxy] + [''])
+                n += 1
+    logging.info(f"导出 {len(results)} 张图片的 {n} 个检测结果: {path}")
+    return n
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='图片文件夹批量检测')
+    parser.add_argument('--folder', required=True)
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--out', default='detections.csv')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--recursive', action='store_true')
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    detector = FolderBatchDetector(YOLOv5Model(opt.weights), list_images(opt.folder, opt.recursive),
+                                   workers=opt.workers, batch_size=opt.batch)
+    export_csv(detector.run(), opt.out)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+批量检测结果表(主窗口"位置列表"页)
+选择文件夹后在后台线程里批量检测，每批结果通过信号送回主线程追加到表格，附带画好框的缩略图。
+双击一行在主画面显示该图片的检测结果。
+"""
+import logging
+import threading
+
+import cv2
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTableWidget,
+                               QTableWidgetItem, QHeaderView, QFileDialog, QAbstractItemView)
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QImage, QPixmap
+
+from batch_detect import FolderBatchDetector, ImageCache, list_images, export_csv
+
+
+class BatchResultTable(QWidget):
+    batch_ready = Signal(list)          # 后台线程 emit，主线程追加表格行
+    finished = Signal()
+    image_selected = Signal(object)     # 双击行时发出画好框的 BGR 图像
+
+    def __init__(self, model, parent=None, thumb_size=96):
+        super().__init__(parent)
+        self.model = model
+        self.thumb_size = thumb_size
+        self.cache = ImageCache(budget_mb=512)
+        self.results = []
+        self.detector = None
+
+        self.btn_folder = QPushButton("选择文件夹")
+        self.btn_stop = QPushButton("停止")
+        self.btn_stop.setEnabled(False)
+        self.btn_export = QPushButton("导出")
+        self.btn_export.setEnabled(False)
+        self.status_label = QLabel("")
+        top = QHBoxLayout()
+        top.addWidget(self.btn_folder)
+        top.addWidget(self.btn_stop)
+        top.addWidget(self.btn_export)
+        top.addWidget(self.status_label, 1)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["缩略图", "文件", "检测数", "接触点"])
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.verticalHeader().setDefaultSectionSize(thumb_size + 4)
+        self.table.setColumnWidth(0, thumb_size + 4)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.table)
+
+        self.btn_folder.clicked.connect(self.select_folder)
+        self.btn_stop.clicked.connect(self.stop)
+        self.btn_export.clicked.connect(self.export)
+        self.batch_ready.connect(self._append_rows)
+        self.finished.connect(self._on_finished)
+        self.table.cellDoubleClicked.connect(self._on_double_click)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择图片文件夹")
+        if not folder:
+            return
+        paths = list_images(folder)
+        if not paths:
+            logging.warning(f"文件夹中没有图片: {folder}")
+            return
+        self.table.setRowCount(0)
+        self.results = []
+        self.total = len(paths)
+        self.detector = FolderBatchDetector(self.model, paths, cache=self.cache, thumb_size=self.thumb_size)
+        self.btn_folder.setEnabled(False)
+        self.btn_stop.setEnabled(True)
+        self.btn_export.setEnabled(False)
+        logging.info(f"批量检测 {folder}: {len(paths)} 张")
+        # 与主画面共用同一个模型，前向由 model.lock 串行化
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            self.detector.run(on_batch=self.batch_ready.emit)
+        except Exception as e:
+            logging.error(f"批量检测失败: {str(e)}")
+        finally:
+            self.finished.emit()
+
+    def stop(self):
+        if self.detector is not None:
+            self.detector.cancel()
+
+    def _append_rows(self, batch):
+        for r in batch:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            self.results.append(r)
+            if r.thumbnail is not None:
+                rgb = cv2.cvtColor(r.thumbnail, cv2.COLOR_BGR2RGB)
+                h, w, ch = rgb.shape
+                thumb = QLabel()
+                thumb.setPixmap(QPixmap.fromImage(QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888).copy()))
+                thumb.setAlignment(Qt.AlignCenter)
+                self.table.setCellWidget(row, 0, thumb)
+            self.table.setItem(row, 1, QTableWidgetItem(r.path))
+            self.table.setItem(row, 2, QTableWidgetItem(r.error or str(len(r.detections))))
+            cps = "; ".join(f"({x:.0f}, {y:.0f})" for x, y in r.contact_points)
+            self.table.setItem(row, 3, QTableWidgetItem(cps))
+        self.status_label.setText(f"{len(self.results)} / {self.total}")
+
+    def _on_finished(self):
+        self.btn_folder.setEnabled(True)
+        self.btn_stop.setEnabled(False)
+        self.btn_export.setEnabled(bool(self.results))
+
+    def _on_double_click(self, row, column):
+        r = self.results[row]
+        img = self.cache.get(r.path)
+        if img is None:
+            return
+        self.image_selected.emit(self.model.overlay.draw(img.copy(), r.detections))
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出检测结果", "detections.csv", "CSV(*.csv)")
+        if path:
+            try:
+                export_csv(self.results, path)
+            except Exception as e:
+                logging.error(f"导出失败: {str(e)}")
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+低延迟实时相机源
+打开相机时协商像素格式(MJPG 等压缩格式可在 USB 带宽内跑满分辨率和帧率)、分辨率和帧率，
+并把驱动缓冲设为 1。后台线程持续读帧，只保留最新一帧；推理慢于相机时直接丢弃旧帧，
+显示的接触点不会因为 OpenCV 内部缓冲堆积而越来越滞后。对实时弓网监测来说，新鲜度比完整性更重要。
+
+接口与 cv2.VideoCapture 兼容(read / get / set / isOpened / release)，可直接替换 MainWindow.cap。
+"""
+import logging
+import threading
+import time
+
+import cv2
+
+from metrics_server import METRICS
+
+
+class LiveCameraSource:
+    def __init__(self, index, width=1280, height=720, fps=30, fourcc='MJPG', buffer_size=1,
+                 api_preference=cv2.CAP_ANY):
+        self.src = index
+        self.cap = cv2.VideoCapture(index, api_preference)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._latest = None              # (frame, 序号, 采集时刻 perf_counter)
+        self._returned_seq = 0           # 最近一次 read 返回帧的序号
+        self.frame_number = 0
+        self.capture_time = None         # 最近一次 read 返回帧的采集时刻
+        self.dropped = 0                 # 被更新的帧覆盖、从未被取走的帧数
+        self._t_open = time.perf_counter()
+        self._props = {}                 # 协商后的属性，get 直接返回，避免与抓帧线程同时访问 cap
+        self._thread = None
+        if self.cap.isOpened():
+            self._negotiate(width, height, fps, fourcc, buffer_size)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _negotiate(self, width, height, fps, fourcc, buffer_size):
+        """按 格式 -> 分辨率 -> 帧率 的顺序设置(部分驱动在切换格式后会重置分辨率)，再读回实际值"""
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        # 并非所有后端都支持(V4L2/DSHOW 支持)，不支持时靠后台线程及时取帧来保证新鲜度
+        buffer_ok = self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        actual_fourcc = ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code > 0 else '?'
+        actual = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                  self.cap.get(cv2.CAP_PROP_FPS))
+        self._props = {cv2.CAP_PROP_FRAME_WIDTH: actual[0], cv2.CAP_PROP_FRAME_HEIGHT: actual[1],
+                       cv2.CAP_PROP_FPS: actual[2], cv2.CAP_PROP_FOURCC: code}
+        logging.info(f"相机 {self.src} 协商结果: {actual[0]}x{actual[1]} @ {actual[2]:.1f}fps, "
+                     f"格式 {actual_fourcc}, 驱动缓冲{'=' + str(buffer_size) if buffer_ok else '不可设置'}")
+        if fourcc and actual_fourcc.strip('\x00') != fourcc:
+            logging.warning(f"相机不支持 {fourcc} 格式，实际为 {actual_fourcc}")
+        if width and height and actual[:2] != (width, height):
+            logging.warning(f"相机不支持 {width}x{height}，实际为 {actual[0]}x{actual[1]}")
+
+    # ---------- 后台抓帧 ----------
+    def _run(self):
+        seq = 0
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            t = time.perf_counter()
+            if not ret:
+                logging.warning(f"相机 {self.src} 读取失败")
+                with self._cond:
+                    self._latest = (None, seq, t)
+                    self._cond.notify_all()
+                return
+            seq += 1
+            with self._cond:
+                if self._latest is not None and self._latest[1] > self._returned_seq:
+                    self.dropped += 1
+                    METRICS.inc('frames_dropped_total', reason='stale_camera')
+                self._latest = (frame, seq, t)
+                self._cond.notify_all()
+
+    # ---------- 消费端 ----------
+    def read(self, timeout=2.0):
+        """等待比上次更新的一帧，只返回最新帧；中间来不及处理的帧被丢弃"""
+        with self._cond:
+            # 有新帧，或抓帧线程已经结束(frame 为 None)
+            ok = self._cond.wait_for(lambda: self._latest is not None and
+                                     (self._latest[1] > self._returned_seq or self._latest[0] is None), timeout)
+            if not ok or self._latest[0] is None:
+                return False, None
+            frame, seq, t = self._latest
+            self._returned_seq = seq
+        self.frame_number, self.capture_time = seq, t
+        return True, frame
+
+    @property
+    def ended(self):
+        """抓帧线程已因读取失败结束"""
+        latest = self._latest
+        return latest is not None and latest[0] is None
+
+    def latency_ms(self):
+        """最近返回帧从采集到此刻的时间"""
+        if self.capture_time is None:
+            return None
+        return (time.perf_counter() - self.capture_time) * 1000
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame_number
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return 0.0 if self.capture_time is None else (self.capture_time - self._t_open) * 1000
+        if prop in self._props:
+            return self._props[prop]
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.cap.release()
+        if self.dropped:
+            logging.info(f"相机 {self.src}: 为保证实时性丢弃旧帧 {self.dropped} 帧")
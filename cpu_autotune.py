@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 推理线程自动调优
+在本机上用已加载的权重实测 torch 线程数、OpenCV 线程数、channels_last 布局和 inference_mode 的组合，
+按 主机名 + 权重哈希 把最快的配置保存到 autotune.json，之后 YOLOv5Model 启动时自动应用。
+各台工控机配置不同，这样每台都能跑在自己的最佳状态。
+
+    python cpu_autotune.py --weights weights/best.pt
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+import torch
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'autotune.json')
+
+
+def weights_hash(weights_path):
+    """权重文件 sha1 前 16 位，用作缓存键的一部分"""
+    h = hashlib.sha1()
+    with open(weights_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def _cache_key(weights_path, device):
+    return f"{platform.node()}|{weights_hash(weights_path)}|{torch.device(device).type}"
+
+
+def _load_cache():
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    try:
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"读取调优缓存失败: {str(e)}")
+        return {}
+
+
+def apply_threads(cfg):
+    """设置线程数；inter-op 线程只能在首次并行计算之前设置，之后会抛 RuntimeError"""
+    torch.set_num_threads(int(cfg['torch_threads']))
+    cv2.setNumThreads(int(cfg['cv2_threads']))
+    if cfg.get('interop_threads'):
+        try:
+            torch.set_num_interop_threads(int(cfg['interop_threads']))
+        except RuntimeError:
+            pass
+
+
+def apply_model_options(model, cfg):
+    """把 channels_last / inference_mode 应用到 YOLOv5Model"""
+    with model.lock:
+        model.channels_last = bool(cfg.get('channels_last'))
+        model.inference_mode = bool(cfg.get('inference_mode'))
+        if model.channels_last:
+            model.model.to(memory_format=torch.channels_last)
+        else:
+            model.model.to(memory_format=torch.contiguous_format)
+
+
+def apply_saved(weights_path, device):
+    """启动时调用：有本机+本权重的调优结果就应用线程设置并返回配置，否则返回 None"""
+    if torch.device(device).type != 'cpu' or not os.path.exists(weights_path):
+        return None
+    cfg = _load_cache().get(_cache_key(weights_path, device))
+    if cfg:
+        apply_threads(cfg)
+        logging.info(f"已应用 CPU 调优配置: {cfg}")
+    return cfg
+
+
+def _bench(model, img, iters):
+    """返回中位延迟(ms)；每次都拷贝输入，因为 predict 会在原图上画框"""
+    for _ in range(2):
+        model.predict(img.copy())
+    times = []
+    for _ in range(iters):
+        frame = img.copy()
+        t0 = time.perf_counter()
+        model.predict(frame)
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+
+def autotune(model, sample=None, iters=10):
+    """
+    在已加载的 YOLOv5Model 上逐项搜索(坐标下降)最佳配置并保存，返回 (配置, 延迟ms)
+    sample 为用于测试的 BGR 图像，不给则用 720p 随机图
+    """
+    if model.device.type != 'cpu':
+        logging.info("GPU 推理无需 CPU 线程调优")
+        return None, None
+    if sample is None:
+        sample = np.random.randint(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+    n_cpu = os.cpu_count() or 1
+    thread_candidates = sorted({1, 2, 4, 6, 8, 12, 16, n_cpu // 2, n_cpu} & set(range(1, n_cpu + 1)))
+    best = {'torch_threads': torch.get_num_threads(), 'cv2_threads': cv2.getNumThreads(),
+            'interop_threads': torch.get_num_interop_threads(),
+            'channels_last': False, 'inference_mode': False}
+
+    def run(cfg):
+        apply_threads(cfg)
+        apply_model_options(model, cfg)
+        ms = _bench(model, sample, iters)
+        logging.info(f"调优 {cfg} -> {ms:.1f} ms")
+        return ms
+
+    best_ms = run(best)
+    for key, candidates in (('torch_threads', thread_candidates),
+                            ('cv2_threads', sorted({0, 1, 2, n_cpu // 2})),
+                            ('channels_last', [False, True]),
+                            ('inference_mode', [False, True])):
+        for value in candidates:
+            if value == best[key]:
+                continue
+            cfg = dict(best, **{key: value})
+            ms = run(cfg)
+            if ms < best_ms:
+                best, best_ms = cfg, ms
+
+    apply_threads(best)
+    apply_model_options(model, best)
+    # 单路推理几乎没有可并行的算子间任务，inter-op 设为 1 避免与 intra-op 线程抢核；
+    # 本进程已无法修改，下次启动时生效
+    best['interop_threads'] = 1
+    best['latency_ms'] = round(best_ms, 2)
+    best['tuned_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    cache = _load_cache()
+    cache[_cache_key(model.weights_path, model.device)] = best
+    with open(CACHE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    model.tune_config = best
+    logging.info(f"CPU 调优完成: {best}, 已保存到 {CACHE_PATH}")
+    return best, best_ms
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CPU 推理线程自动调优')
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--image', default=None, help='测试用图片，不给则用随机图')
+    parser.add_argument('--iters', type=int, default=10)
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    from yolo5_model_5 import YOLOv5Model
+    yolo = YOLOv5Model(opt.weights, 'cpu')
+    autotune(yolo, cv2.imread(opt.image) if opt.image else None, opt.iters)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+部署模型文件 (*.deploy)
+attempt_load 每次启动/切换权重都要反序列化完整的训练 checkpoint 再融合 Conv+BN。
+这里一次性把融合后的权重转存为:
+
+    8 字节头长度(小端) | JSON 头 | 按 64 字节对齐的原始张量数据
+
+JSON 头包含类别名、stride、输入尺寸、网络结构 yaml、源权重哈希以及每个张量的 dtype/shape/偏移。
+加载时按结构 yaml 构建网络并融合，张量直接从文件 mmap(写时复制)出来赋给模型参数，不做反序列化和拷贝，
+同一台机器上的多个进程共享权重所在的页缓存。
+
+    python deploy_artifact.py weights/best.pt            # 生成 weights/best.deploy
+"""
+import argparse
+import json
+import logging
+import os
+import struct
+import time
+
+import numpy as np
+import torch
+
+import cpu_autotune
+
+SUFFIX = '.deploy'
+FORMAT_VERSION = 1
+_ALIGN = 64
+
+
+def artifact_path(weights_path):
+    return os.path.splitext(weights_path)[0] + SUFFIX
+
+
+def is_artifact(path):
+    return str(path).endswith(SUFFIX)
+
+
+def export(weights_path, out_path=None, img_size=640):
+    """把 yolov5 checkpoint 融合后转存为部署文件，返回输出路径"""
+    from models.experimental import attempt_load
+    out_path = out_path or artifact_path(weights_path)
+    model = attempt_load(weights_path, map_location='cpu')   # 已融合 Conv+BN 并转为 float
+    model.eval()
+    names = model.module.names if hasattr(model, 'module') else model.names
+
+    tensors, offset = {}, 0
+    state = {k: v.detach().cpu().contiguous() for k, v in model.state_dict().items()}
+    for name, t in state.items():
+        offset = (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+        arr = t.numpy()
+        tensors[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset, 'nbytes': arr.nbytes}
+        offset += arr.nbytes
+
+    header = {
+        'format': FORMAT_VERSION,
+        'meta': {
+            'names': list(names),
+            'stride': [float(s) for s in model.stride],
+            'img_size': img_size,
+            'yaml': model.yaml,
+            'source': os.path.basename(weights_path),
+            'source_hash': cpu_autotune.weights_hash(weights_path),
+            'torch': torch.__version__,
+        },
+        'tensors': tensors,
+    }
+    head = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = (8 + len(head) + _ALIGN - 1) // _ALIGN * _ALIGN
+    head += b' ' * (data_start - 8 - len(head))      # 数据区起点对齐
+
+    tmp = out_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack('<Q', len(head)))
+        f.write(head)
+        for name, t in state.items():
+            f.seek(data_start + tensors[name]['offset'])
+            f.write(t.numpy().tobytes())
+    os.replace(tmp, out_path)
+    logging.info(f"部署模型已生成: {out_path} ({len(tensors)} 个张量, {offset / 1024 / 1024:.1f} MB)")
+    return out_path
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        (n,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(n).decode('utf-8'))
+    if header.get('format') != FORMAT_VERSION:
+        raise ValueError(f"不支持的部署模型版本: {header.get('format')}")
+    return header, 8 + n
+
+
+def load(path, device='cpu'):
+    """按结构 yaml 构建并融合网络，权重从文件 mmap 后直接赋给参数；返回 (model, meta)"""
+    from models.yolo import Model
+    t0 = time.perf_counter()
+    header, data_start = read_header(path)
+    meta = header['meta']
+    buf = np.memmap(path, dtype=np.uint8, mode='c')           # 写时复制：只读时与其他进程共享页
+    state = {}
+    for name, info in header['tensors'].items():
+        start = data_start + info['offset']
+        arr = buf[start:start + info['nbytes']].view(np.dtype(info['dtype'])).reshape(info['shape'])
+        state[name] = torch.from_numpy(arr)
+
+    model = Model(meta['yaml'], ch=3, nc=len(meta['names']))
+    model.fuse().eval()
+    try:
+        model.load_state_dict(state, assign=True)             # 参数直接引用 mmap 内存
+    except TypeError:
+        model.load_state_dict(state)                           # 旧版 torch 没有 assign，退化为拷贝
+    model.names = meta['names']
+    model.stride = torch.tensor(meta['stride'])
+    model.to(device)
+    logging.info(f"载入部署模型 {path}: {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return model, meta
+
+
+def find_for(weights_path):
+    """weights_path 旁边存在且与其内容一致的部署文件，没有返回 None"""
+    path = artifact_path(weights_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        header, _ = read_header(path)
+    except (OSError, ValueError) as e:
+        logging.warning(f"部署模型无法读取: {path}, {str(e)}")
+        return None
+    if header['meta'].get('source_hash') != cpu_autotune.weights_hash(weights_path):
+        logging.info(f"部署模型与权重不一致，忽略: {path}")
+        return None
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='yolov5 权重转换为快速加载的部署模型')
+    parser.add_argument('weights')
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--img-size', type=int, default=640)
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    export(opt.weights, opt.out, opt.img_size)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+精度 / 速度评估
+在带标注的弓网视频片段上跑多组 YOLOv5Model 配置(输入尺寸、分块、推理后端、跳帧、ROI 裁剪等)，
+并排输出 fps、延迟分位数、mAP@0.5、mAP@0.5:0.95 和接触点像素误差，打印表格并保存 json。
+以后任何性能改动都可以先在这里用数据判断值不值得。
+
+数据集目录: 每个视频 xxx.mp4 旁边放同名标注 xxx.csv，表头
+    frame_number,class,x1,y1,x2,y2
+frame_number 从 1 开始，与 CAP_PROP_POS_FRAMES 一致；没有标注行的帧表示没有目标。
+
+配置文件(json 列表)，例:
+    [{"name": "base"},
+     {"name": "512", "img_size": 512},
+     {"name": "skip1", "frame_skip": 1},
+     {"name": "roi", "roi": [400, 0, 1000, 720]}]
+模型属性: weights, backend, img_size, tiled, conf_thres, iou_thres
+评估属性: frame_skip(每推理一帧跳过几帧，跳过的帧沿用上次结果), roi([x, y, w, h])
+
+    python eval_harness.py --data samples/ --configs configs.json --device cpu
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+CONTACT = 'contact point'
+MODEL_KEYS = ('img_size', 'tiled', 'conf_thres', 'iou_thres')
+
+
+def load_labels(csv_path):
+    """返回 {帧号: [(类别名, x1, y1, x2, y2), ...]}"""
+    labels = defaultdict(list)
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+        col = {name: i for i, name in enumerate(header)}
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) < len(header):
+                continue
+            labels[int(parts[col['frame_number']])].append(
+                (parts[col['class']], *(float(parts[col[k]]) for k in ('x1', 'y1', 'x2', 'y2'))))
+    return labels
+
+
+def box_iou(a, b):
+    """a: (N,4), b: (M,4) xyxy，返回 (N,M) IoU"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def average_precision(recall, precision):
+    """101 点插值 AP (COCO 方式)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    # 每个召回率阈值取召回率不低于它的最大精度
+    idx = np.searchsorted(mrec, np.linspace(0, 1, 101), side='left')
+    return float(np.mean(mpre[np.minimum(idx, len(mpre) - 1)]))
+
+
+class DetectionEvaluator:
+    """累计每帧预测与标注，最后计算各 IoU 阈值下的 mAP"""
+    iou_thresholds = np.linspace(0.5, 0.95, 10)
+
+    def __init__(self):
+        self.records = defaultdict(list)    # 类别 -> [(conf, tp 向量)]
+        self.n_gt = defaultdict(int)
+
+    def add(self, predictions, truths):
+        """predictions: [(xyxy, conf, 类别名)], truths: [(类别名, x1, y1, x2, y2)]"""
+        classes = {p[2] for p in predictions} | {t[0] for t in truths}
+        for cls in classes:
+            preds = sorted((p for p in predictions if p[2] == cls), key=lambda p: -p[1])
+            gts = np.array([t[1:] for t in truths if t[0] == cls], dtype=np.float64).reshape(-1, 4)
+            self.n_gt[cls] += len(gts)
+            if not preds:
+                continue
+            tp = np.zeros((len(preds), len(self.iou_thresholds)), dtype=bool)
+            if len(gts):
+                ious = box_iou(np.array([p[0] for p in preds], dtype=np.float64), gts)
+                for k, thr in enumerate(self.iou_thresholds):
+                    matched = np.zeros(len(gts), dtype=bool)
+                    for i in range(len(preds)):   # 按置信度从高到低贪心匹配
+                        cand = np.where((ious[i] >= thr) & ~matched)[0]
+                        if len(cand):
+                            j = cand[np.argmax(ious[i, cand])]
+                            matched[j] = True
+                            tp[i, k] = True
+            self.records[cls].extend((p[1], tp[i]) for i, p in enumerate(preds))
+
+    def summary(self):
+        aps = []
+        for cls in set(self.n_gt) | set(self.records):
+            n_gt = self.n_gt[cls]
+            recs = sorted(self.records[cls], key=lambda r: -r[0])
+            if not n_gt:
+                continue
+            if not recs:
+                aps.append(np.zeros(len(self.iou_thresholds)))
+                continue
+            tp = np.array([r[1] for r in recs], dtype=np.float64)
+            tpc = np.cumsum(tp, axis=0)
+            fpc = np.cumsum(1 - tp, axis=0)
+            recall = tpc / n_gt
+            precision = tpc / (tpc + fpc)
+            aps.append(np.array([average_precision(recall[:, k], precision[:, k])
+                                 for k in range(len(self.iou_thresholds))]))
+        if not aps:
+            return {'mAP50': None, 'mAP50_95': None}
+        aps = np.mean(aps, axis=0)
+        return {'mAP50': float(aps[0]), 'mAP50_95': float(aps.mean())}
+
+
+def _contact_center(items, is_truth):
+    for it in items:
+        name, box = (it[0], it[1:]) if is_truth else (it[2], it[0])
+        if name == CONTACT:
+            return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    return None
+
+
+def evaluate_config(model, clips, cfg):
+    """在全部片段上评估一组配置，返回结果 dict"""
+    for key in MODEL_KEYS:
+        if key in cfg:
+            setattr(model, key, cfg[key])
+    skip = int(cfg.get('frame_skip', 0))
+    roi = cfg.get('roi')
+
+    evaluator = DetectionEvaluator()
+    latencies, cp_errors = [], []
+    cp_missed = cp_total = frames = 0
+    t_start = time.perf_counter()
+    for video_path, labels in clips:
+        cap = cv2.VideoCapture(video_path)
+        last = []
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            frames += 1
+            if (index - 1) % (skip + 1) == 0:
+                img = frame
+                if roi:
+                    x, y, w, h = roi
+                    img = np.ascontiguousarray(frame[y:y + h, x:x + w])
+                t0 = time.perf_counter()
+                model.predict(img)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                last = [(list(xyxy), conf, name) for xyxy, conf, name in model.last_detections]
+                if roi:
+                    for det in last:
+                        det[0][0] += x; det[0][2] += x
+                        det[0][1] += y; det[0][3] += y
+            # 跳过的帧沿用上一次的检测结果，这正是跳帧的精度代价
+            truths = labels.get(index, [])
+            evaluator.add(last, truths)
+            gt_cp = _contact_center(truths, True)
+            if gt_cp is not None:
+                cp_total += 1
+                pred_cp = _contact_center(last, False)
+                if pred_cp is None:
+                    cp_missed += 1
+                else:
+                    cp_errors.append(float(np.hypot(pred_cp[0] - gt_cp[0], pred_cp[1] - gt_cp[1])))
+        cap.release()
+    wall = time.perf_counter() - t_start
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    err = np.array(cp_errors) if cp_errors else None
+    result = {
+        'name': cfg.get('name', str(cfg)),
+        'config': cfg,
+        'frames': frames,
+        'inferred': len(latencies),
+        'fps': frames / wall if wall > 0 else 0.0,
+        'latency_p50_ms': float(np.percentile(lat, 50)),
+        'latency_p90_ms': float(np.percentile(lat, 90)),
+        'latency_p99_ms': float(np.percentile(lat, 99)),
+        'cp_error_mean_px': float(err.mean()) if err is not None else None,
+        'cp_error_p95_px': float(np.percentile(err, 95)) if err is not None else None,
+        'cp_miss_rate': cp_missed / cp_total if cp_total else None,
+    }
+    result.update(evaluator.summary())
+    return result
+
+
+def format_table(results):
+    cols = [('name', '配置', '{}'), ('fps', 'fps', '{:.1f}'),
+            ('latency_p50_ms', 'p50ms', '{:.1f}'), ('latency_p90_ms', 'p90ms', '{:.1f}'),
+            ('latency_p99_ms', 'p99ms', '{:.1f}'), ('mAP50', 'mAP50', '{:.3f}'),
+            ('mAP50_95', 'mAP50-95', '{:.3f}'), ('cp_error_mean_px', 'CP误差px', '{:.2f}'),
+            ('cp_miss_rate', 'CP漏检', '{:.1%}')]
+    rows = [[title for _, title, _ in cols]]
+    for r in results:
+        rows.append(['-' if r[key] is None else fmt.format(r[key]) for key, _, fmt in cols])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(cols))]
+    return '\n'.join('  '.join(cell.ljust(w) for cell, w in zip(row, widths)) for row in rows)
+
+
+def find_clips(data_dir):
+    clips = []
+    for ext in ('mp4', 'avi', 'mkv', 'mov'):
+        for video in sorted(glob.glob(os.path.join(data_dir, f'*.{ext}'))):
+            label_path = os.path.splitext(video)[0] + '.csv'
+            if os.path.exists(label_path):
+                clips.append((video, load_labels(label_path)))
+            else:
+                logging.warning(f"缺少标注文件，跳过 {video}")
+    return clips
+
+
+def run(data_dir, configs, weights='weights/best.pt', device=None):
+    from yolo5_model_5 import YOLOv5Model
+    clips = find_clips(data_dir)
+    if not clips:
+        raise FileNotFoundError(f"{data_dir} 下没有带标注的视频")
+    models = {}
+    results = []
+    for cfg in configs:
+        key = (cfg.get('weights', weights), cfg.get('backend', 'torch'))
+        if key not in models:
+            models[key] = YOLOv5Model(key[0], device, backend=key[1])
+        model = models[key]
+        # 每组配置从默认值开始，避免上一组的设置残留
+        model.img_size, model.tiled, model.conf_thres, model.iou_thres = 640, False, 0.25, 0.45
+        logging.info(f"评估配置 {cfg}")
+        results.append(evaluate_config(model, clips, cfg))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='弓网检测精度/速度评估')
+    parser.add_argument('--data', required=True, help='带标注视频片段所在目录')
+    parser.add_argument('--configs', default=None, help='配置 json 文件，不给则只评估默认配置')
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--out', default='eval_results.json')
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    configs = [{'name': 'default'}]
+    if opt.configs:
+        with open(opt.configs, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    results = run(opt.data, configs, opt.weights, opt.device)
+    print(format_table(results))
+    with open(opt.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    logging.info(f"评估结果已保存到 {opt.out}")
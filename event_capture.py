@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+事件触发的片段录制
+在检测结果流上判断: 连续丢失接触点、接触点坐标突跳、置信度过低，
+触发后从 FrameRingBuffer 里取出前后若干帧写成短视频，并把事件追加到索引文件 events.csv。
+不再需要整段录像再人工查找。
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+
+class EventTrigger:
+    """逐帧判断是否触发事件，返回触发原因列表(空列表表示未触发)"""
+    def __init__(self, miss_frames=5, jump_px=30.0, conf_low=0.4):
+        self.miss_frames = miss_frames
+        self.jump_px = jump_px
+        self.conf_low = conf_low
+        self._missed = 0
+        self._last_point = None
+        self._jumping = False
+        self._low_conf = False
+
+    def reset(self):
+        self._missed = 0
+        self._last_point = None
+        self._jumping = False
+        self._low_conf = False
+
+    def check(self, contact_points, detections):
+        reasons = []
+        if not contact_points:
+            self._missed += 1
+            # 只在刚好达到阈值的那一帧触发一次，避免长时间丢失时反复触发
+            if self._missed == self.miss_frames:
+                reasons.append(f"missing>={self.miss_frames}")
+            return reasons
+        self._missed = 0
+
+        # 突跳和低置信度与丢失一样只在进入该状态的那一帧触发，持续抖动/雾天不会每帧重复触发
+        x, y = contact_points[0]
+        jumping = False
+        if self._last_point is not None:
+            step = float(np.hypot(x - self._last_point[0], y - self._last_point[1]))
+            jumping = step > self.jump_px
+            if jumping and not self._jumping:
+                reasons.append(f"jump={step:.1f}px")
+        self._jumping = jumping
+        self._last_point = (x, y)
+
+        confs = [conf for _, conf, name in detections if name == 'contact point']
+        low_conf = bool(confs) and max(confs) < self.conf_low
+        if low_conf and not self._low_conf:
+            reasons.append(f"low_conf={max(confs):.2f}")
+        self._low_conf = low_conf
+        return reasons
+
+
+class ClipCapture:
+    """
+    触发后等待 post_frames 帧，再从回看缓冲里取 [触发帧-pre_frames, 触发帧+post_frames] 写出片段。
+    后置录制期间再次触发则延长当前事件，不会产生重叠片段。
+    单个事件最长不超过回看缓冲能容纳的帧数，达到上限时先写出已有部分，剩余部分作为新事件继续。
+    """
+    def __init__(self, frame_buffer, out_dir, trigger=None, pre_frames=60, post_frames=60, fps=30.0):
+        self.frame_buffer = frame_buffer
+        self.out_dir = out_dir
+        self.trigger = trigger or EventTrigger()
+        self.pre_frames = pre_frames
+        self.post_frames = post_frames
+        self.fps = fps
+        # 回看缓冲是异步压缩的，结束帧之后再多等几帧确保已经入缓冲
+        self.flush_margin = 10
+        self.max_event_frames = None     # None 时按回看缓冲容量
+        self._event = None
+        os.makedirs(out_dir, exist_ok=True)
+        self.index_path = os.path.join(out_dir, 'events.csv')
+        if not os.path.exists(self.index_path):
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                f.write('time,trigger_frame,start_frame,end_frame,reasons,clip\n')
+
+    def update(self, frame_number, contact_points, detections):
+        reasons = self.trigger.check(contact_points, detections)
+        if reasons:
+            if self._event is None:
+                self._event = {'time': datetime.now(), 'trigger': frame_number,
+                               'start': frame_number - self.pre_frames,
+                               'end': frame_number + self.post_frames,
+                               'reasons': list(reasons)}
+                logging.warning(f"事件触发 帧{frame_number}: {', '.join(reasons)}")
+            else:
+                self._event['end'] = frame_number + self.post_frames
+                self._event['reasons'].extend(r for r in reasons if r not in self._event['reasons'])
+
+        if self._event is not None:
+            cut = self._event['start'] + self.event_limit - 1
+            if self._event['end'] > cut and frame_number >= cut + self.flush_margin:
+                # 事件过长：先写出 [start, cut]，避免片段开头被缓冲淘汰
+                rest = dict(self._event, time=datetime.now(), trigger=cut + 1, start=cut + 1,
+                            reasons=[r for r in self._event['reasons'] if r != 'continued'] + ['continued'])
+                self._event['end'] = cut
+                self._finish()
+                self._event = rest
+            elif frame_number >= self._event['end'] + self.flush_margin:
+                self._finish()
+
+    @property
+    def event_limit(self):
+        """单个事件的最大帧数：写出时整段仍在回看缓冲里"""
+        if self.max_event_frames:
+            return self.max_event_frames
+        return max(self.frame_buffer.max_frames - 2 * self.flush_margin, self.pre_frames + 1)
+
+    def flush(self):
+        """视频结束时把未完成的事件写出"""
+        if self._event is not None:
+            self._finish()
+        self.trigger.reset()
+
+    def _finish(self):
+        event, self._event = self._event, None
+        frames = self.frame_buffer.encoded_between(event['start'], event['end'])
+        if not frames:
+            logging.warning(f"事件 帧{event['trigger']} 的画面已不在回看缓冲中，仅记录索引")
+        threading.Thread(target=self._write, args=(event, frames), daemon=True).start()
+
+    def _write(self, event, frames):
+        clip_name = ''
+        try:
+            if frames:
+                clip_name = event['time'].strftime('event_%Y%m%d_%H%M%S') + f"_{event['trigger']}.mp4"
+                writer = None
+                for _, data in frames:
+                    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                    if writer is None:
+                        h, w = img.shape[:2]
+                        writer = cv2.VideoWriter(os.path.join(self.out_dir, clip_name),
+                                                 cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (w, h))
+                    writer.write(img)
+                writer.release()
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(f"{event['time']:%Y-%m-%d %H:%M:%S},{event['trigger']},"
+                        f"{frames[0][0] if frames else event['start']},"
+                        f"{frames[-1][0] if frames else event['end']},"
+                        f"{'|'.join(event['reasons'])},{clip_name}\n")
+            logging.info(f"事件片段已保存: {clip_name or '无画面'} ({len(frames)} 帧)")
+        except Exception as e:
+            logging.error(f"保存事件片段失败: {str(e)}")
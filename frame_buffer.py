@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+最近若干秒画面的内存环形缓冲
+实时路径只负责把帧放进一个有界队列(满了就丢，不阻塞)，JPEG 压缩和淘汰都在后台线程里做。
+按帧号索引，点击曲线时可以立刻取回对应画面。
+"""
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from metrics_server import METRICS
+
+
+class FrameRingBuffer:
+    def __init__(self, seconds=10.0, fps=30.0, budget_mb=200, jpeg_quality=85, queue_size=8, overlay=None):
+        self.seconds = seconds
+        self.max_frames = max(int(seconds * fps), 1)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.jpeg_quality = jpeg_quality
+        self.overlay = overlay           # OverlayRenderer，push 带检测框时在后台线程画到缓存的画面上
+
+        self._frames = OrderedDict()     # 帧号 -> JPEG 字节
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0                 # 压缩线程跟不上时丢弃的帧数
+        self._generation = 0             # clear() 时加一，后台线程丢掉清空前入队的帧
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def push(self, frame_number, frame, detections=None):
+        """
+        实时路径调用：只入队，不压缩。调用方之后不能再原地修改 frame。
+        frame 上没有画框(只在显示尺寸上叠加)时传入 detections，压缩前在后台线程的拷贝上画框
+        """
+        try:
+            self._queue.put_nowait((self._generation, frame_number, frame, detections))
+        except queue.Full:
+            self.dropped += 1
+            METRICS.inc('frames_dropped_total', reason='replay_buffer')
+
+    def _run(self):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            generation, frame_number, frame, detections = item
+            if generation != self._generation:
+                continue
+            if detections and self.overlay is not None:
+                frame = self.overlay.draw(frame.copy(), detections)
+            ok, buf = cv2.imencode('.jpg', frame, params)
+            if not ok:
+                continue
+            data = buf.tobytes()
+            with self._lock:
+                # 压缩期间可能被 clear()，旧帧号不能再写回
+                if generation != self._generation:
+                    continue
+                old = self._frames.pop(frame_number, None)
+                if old is not None:
+                    self._bytes -= len(old)
+                self._frames[frame_number] = data
+                self._bytes += len(data)
+                # 按帧数和内存预算两个条件淘汰最旧的帧
+                while self._frames and (len(self._frames) > self.max_frames
+                                        or self._bytes > self.budget_bytes):
+                    _, evicted = self._frames.popitem(last=False)
+                    self._bytes -= len(evicted)
+
+    def close(self):
+        self._queue.put(None)
+
+    def clear(self):
+        """清空缓存；已经入队还没压缩的帧也一并作废(跳转后帧号不再连续)"""
+        with self._lock:
+            self._generation += 1
+            self._frames.clear()
+            self._bytes = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # close() 的结束标记要留给后台线程
+                self._queue.put(None)
+                break
+
+    def set_fps(self, fps):
+        """按视频源帧率调整能缓存的帧数，保持缓存的时长不变"""
+        with self._lock:
+            self.max_frames = max(int(self.seconds * fps), 1)
+
+    # ---------- 查询 ----------
+    def get(self, frame_number, exact=False):
+        """取出并解码某一帧；exact=False 时返回缓冲中帧号最接近的一帧，返回 (帧号, BGR图像)"""
+        with self._lock:
+            if frame_number in self._frames:
+                key = frame_number
+            elif exact or not self._frames:
+                return None
+            else:
+                key = min(self._frames, key=lambda k: abs(k - frame_number))
+            data = self._frames[key]
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        return key, img
+
+    def encoded_between(self, first, last):
+        """返回帧号在 [first, last] 内的 (帧号, JPEG字节) 列表，供片段导出使用"""
+        with self._lock:
+            return [(k, v) for k, v in self._frames.items() if first <= k <= last]
+
+    def frame_range(self):
+        with self._lock:
+            if not self._frames:
+                return None
+            return next(iter(self._frames)), next(reversed(self._frames))
+
+    @property
+    def memory_mb(self):
+        return self._bytes / 1024 / 1024
+
+    def __len__(self):
+        return len(self._frames)
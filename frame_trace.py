@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+逐帧性能追踪，导出 Chrome / Perfetto trace 格式
+每帧带一个 trace id，从 cap.read 到前处理、前向、NMS、画框、记录、update_plot、show_cv_img 各阶段
+都用单调时钟打时间戳。平均值会掩盖偶发卡顿，导出后在 chrome://tracing 或 ui.perfetto.dev 打开，
+可以直接看到某一帧卡在哪个阶段。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class FrameTracer:
+    def __init__(self, max_events=200_000):
+        self.enabled = True
+        self._events = deque(maxlen=max_events)   # 只保留最近的事件，内存有界
+        self._lock = threading.Lock()
+        self.trace_id = 0
+        self.pid = os.getpid()
+        # 采集-显示延迟：以第一帧的媒体时间戳和到达时刻对齐
+        self._media_origin = None
+
+    def begin_frame(self, trace_id):
+        self.trace_id = trace_id
+
+    def add_span(self, name, start_ns, end_ns, **args):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._events.append((name, start_ns, end_ns - start_ns, threading.get_ident(),
+                                 dict(args, frame=self.trace_id)))
+
+    @contextmanager
+    def span(self, name, **args):
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add_span(name, t0, time.perf_counter_ns(), **args)
+
+    def add_stamps(self, stamps, names):
+        """stamps 为 perf_counter() 秒数序列，相邻两个时间戳之间记为一个阶段"""
+        for name, a, b in zip(names, stamps[:-1], stamps[1:]):
+            self.add_span(name, int(a * 1e9), int(b * 1e9))
+
+    def mark_display(self, pos_msec):
+        """
+        在画面显示后调用，pos_msec 为 CAP_PROP_POS_MSEC。
+        返回 采集到显示的延迟(ms)：当前时刻相对首帧的流逝时间 - 媒体时间相对首帧的流逝时间
+        """
+        now_ns = time.perf_counter_ns()
+        if pos_msec is None or pos_msec <= 0:
+            return None
+        if self._media_origin is None:
+            self._media_origin = (now_ns, pos_msec)
+            return 0.0
+        wall_ms = (now_ns - self._media_origin[0]) / 1e6
+        latency_ms = wall_ms - (pos_msec - self._media_origin[1])
+        if self.enabled:
+            with self._lock:
+                self._events.append(('capture_to_display_ms', now_ns, None, threading.get_ident(),
+                                     {'value': round(latency_ms, 3)}))
+        return latency_ms
+
+    def reset_clock(self):
+        """换源或 seek 后重新对齐媒体时间"""
+        self._media_origin = None
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+        self._media_origin = None
+
+    def export(self, path):
+        """写出 Chrome trace json，ts/dur 单位为微秒"""
+        with self._lock:
+            events = list(self._events)
+        trace = []
+        for name, start_ns, dur_ns, tid, args in events:
+            if dur_ns is None:   # 计数器事件
+                trace.append({'name': name, 'ph': 'C', 'ts': start_ns / 1000, 'pid': self.pid,
+                              'tid': tid, 'args': args})
+            else:
+                trace.append({'name': name, 'ph': 'X', 'ts': start_ns / 1000, 'dur': dur_ns / 1000,
+                              'pid': self.pid, 'tid': tid, 'args': args})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+        return len(trace)
+
+
+# 全局追踪器，模型和界面共用
+TRACER = FrameTracer()
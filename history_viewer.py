@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+整段记录回看窗口
+基于 LodPyramid，缩放/平移时只把当前可见范围内、当前分辨率够用的点交给 pyqtgraph，
+24 小时的记录也能流畅浏览；放大到原始层后点击曲线可以定位到具体帧。
+"""
+import logging
+import pyqtgraph as pg
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel
+from PySide6.QtCore import Qt, QTimer, Signal
+
+from lod_pyramid import LodPyramid
+
+
+class HistoryViewer(QWidget):
+    frame_selected = Signal(int)    # 点击曲线时发出最近的已记录帧号
+
+    def __init__(self, csv_path, parent=None):
+        super().__init__(parent)
+        self.setWindowFlag(Qt.Window)
+        self.setWindowTitle(f"历史回看 - {csv_path}")
+        self.resize(1000, 600)
+
+        self.pyramid = LodPyramid(csv_path)
+
+        self.plot_widget_x = pg.PlotWidget()
+        self.plot_widget_y = pg.PlotWidget()
+        self.plot_widget_x.setTitle('横向曲线')
+        self.plot_widget_y.setTitle('纵向曲线')
+        self.plot_widget_x.setLabel('bottom', '帧号')
+        self.plot_widget_y.setLabel('bottom', '帧号')
+        self.plot_widget_x.showGrid(x=True, y=True)
+        self.plot_widget_y.showGrid(x=True, y=True)
+        self.plot_widget_y.setXLink(self.plot_widget_x)
+        self.curve_x = self.plot_widget_x.plot(pen=pg.mkPen('g', width=1))
+        self.curve_y = self.plot_widget_y.plot(pen=pg.mkPen('g', width=1))
+        # 选中帧的竖线
+        self.cursor_x = pg.InfiniteLine(angle=90, pen=pg.mkPen('y'))
+        self.cursor_y = pg.InfiniteLine(angle=90, pen=pg.mkPen('y'))
+        self.plot_widget_x.addItem(self.cursor_x)
+        self.plot_widget_y.addItem(self.cursor_y)
+
+        self.info_label = QLabel("")
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.plot_widget_x)
+        layout.addWidget(self.plot_widget_y)
+        layout.addWidget(self.info_label)
+
+        # 缩放过程中会连续触发 range 变化，延迟合并后再刷新
+        self.refresh_timer = QTimer()
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.plot_widget_x.getViewBox().sigXRangeChanged.connect(
+            lambda *_: self.refresh_timer.start(30))
+        self.plot_widget_x.scene().sigMouseClicked.connect(
+            lambda e: self._on_click(self.plot_widget_x, e))
+        self.plot_widget_y.scene().sigMouseClicked.connect(
+            lambda e: self._on_click(self.plot_widget_y, e))
+
+        f0, f1 = self.pyramid.frame_range
+        self.plot_widget_x.setXRange(f0, max(f1, f0 + 1), padding=0)
+        self.refresh()
+
+    def refresh(self):
+        """按当前可见范围和控件像素宽度查询金字塔"""
+        (f0, f1), _ = self.plot_widget_x.getViewBox().viewRange()
+        width = max(int(self.plot_widget_x.width()), 200)
+        frames, x, y, level = self.pyramid.query(f0, f1, max_points=2 * width)
+        self.curve_x.setData(frames, x)
+        self.curve_y.setData(frames, y)
+        self.info_label.setText(f"范围 {int(f0)} - {int(f1)} 帧, 层级 {level}, 点数 {len(frames)}")
+
+    def _on_click(self, widget, event):
+        frame = widget.getViewBox().mapSceneToView(event.scenePos()).x()
+        hit = self.pyramid.nearest_frame(frame)
+        if hit is None:
+            return
+        frame, x, y = hit
+        self.cursor_x.setValue(frame)
+        self.cursor_y.setValue(frame)
+        self.info_label.setText(f"帧 {frame}: x={x:.1f}, y={y:.1f}")
+        logging.info(f"历史回看选中帧 {frame}: x={x:.1f}, y={y:.1f}")
+        self.frame_selected.emit(frame)
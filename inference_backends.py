@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+可插拔推理后端
+每个后端实现 load / warmup / infer，infer 输入预处理好的 (N,3,H,W) float 张量，
+输出与 yolov5 Detect 相同的原始预测 (N, 锚框数, 5+类别数)，后续 NMS 等流程不变。
+YOLOv5Model.select_backend 会在本机实测所有可用后端，选出与 PyTorch 结果一致且最快的一个。
+选择结果按 主机名 + 权重哈希 + 设备 + 库版本 保存在 backend.json(与 cpu_autotune 的 autotune.json 同样方式)，
+导出的 TorchScript / ONNX 缓存在 backend_cache/ 下，下次启动直接加载，不再重新追踪、导出和实测。
+
+导出类后端在每个输入形状(letterbox 产生的各种尺寸、分块推理和批量推理的 batch 大小)第一次遇到真实画面时，
+与 eager 输出对比一次框坐标和分数，超出容差的形状改用 eager，校验结果同样持久化。
+
+新增后端只需继承 InferenceBackend 并用 @register_backend 注册。
+"""
+import hashlib
+import json
+import logging
+import os
+import platform
+import threading
+import time
+
+import cv2
+import numpy as np
+import torch
+
+import cpu_autotune
+
+BACKENDS = {}
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend.json')
+ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend_cache')
+BOX_TOL = 0.5                    # 框坐标最大绝对误差(输入像素)
+SCORE_TOL = 5e-3                 # 目标/类别分数最大绝对误差
+_cache_lock = threading.Lock()
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+class InferenceBackend:
+    name = 'base'
+
+    def __init__(self, owner):
+        self.owner = owner          # YOLOv5Model，后端从它取 torch 模型和设备
+        self.device = owner.device
+
+    @classmethod
+    def available(cls, device):
+        return True
+
+    def load(self):
+        pass
+
+    def warmup(self, shape=(1, 3, 640, 640)):
+        self.infer_unchecked(torch.zeros(shape, device=self.device))
+
+    def infer(self, batch):
+        raise NotImplementedError
+
+    def infer_unchecked(self, batch):
+        """不做形状校验的推理，用于预热和实测"""
+        return self.infer(batch)
+
+
+class _PredOnly(torch.nn.Module):
+    """导出用的包装：只保留 Detect 的解码输出，去掉各层特征图"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)[0]
+
+
+@register_backend
+class TorchBackend(InferenceBackend):
+    """默认的 PyTorch eager 推理，支持 cpu_autotune 的 channels_last / inference_mode"""
+    name = 'torch'
+
+    def infer(self, batch):
+        if self.owner.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode(self.owner.inference_mode):
+            return self.owner.model(batch, augment=False)[0]
+
+
+class _ShapeCachedBackend(InferenceBackend):
+    """
+    导出的图里 Detect 网格按输入尺寸固化，不同输入尺寸(letterbox auto=True 会产生多种)
+    各自导出一份，内存里和磁盘上都缓存。每个形状第一次用真实输入推理时与 eager 对比校验
+    """
+    suffix = ''
+
+    def __init__(self, owner):
+        super().__init__(owner)
+        self._compiled = {}
+        self.reference = TorchBackend(owner)
+        self.key = cache_key(owner.weights_path, owner.device)
+        self.artifact_dir = os.path.join(ARTIFACT_DIR, hashlib.sha1(self.key.encode('utf-8')).hexdigest()[:16])
+        state = load_state(self.key) or {}
+        self.shapes = dict(state.get('shapes', {}).get(self.name, {}))   # 形状 -> 校验结果
+
+    def _compile(self, shape, path):
+        """导出并保存到 path，返回可运行的对象"""
+        raise NotImplementedError
+
+    def _load_artifact(self, path):
+        raise NotImplementedError
+
+    def _run(self, compiled, batch):
+        raise NotImplementedError
+
+    def _get_compiled(self, shape):
+        compiled = self._compiled.get(shape)
+        if compiled is None:
+            t0 = time.perf_counter()
+            path = os.path.join(self.artifact_dir, f'{self.name}_{shape_str(shape)}{self.suffix}')
+            if os.path.exists(path):
+                try:
+                    compiled = self._load_artifact(path)
+                    logging.info(f"{self.name} 后端载入输入 {shape} 的缓存, {time.perf_counter() - t0:.2f} s")
+                except Exception as e:
+                    logging.warning(f"{self.name} 后端缓存 {path} 无法载入，重新导出: {str(e)}")
+            if compiled is None:
+                os.makedirs(self.artifact_dir, exist_ok=True)
+                compiled = self._compile(shape, path)
+                logging.info(f"{self.name} 后端为输入 {shape} 编译完成, {time.perf_counter() - t0:.2f} s")
+            self._compiled[shape] = compiled
+        return compiled
+
+    def infer_unchecked(self, batch):
+        return self._run(self._get_compiled(tuple(batch.shape)), batch)
+
+    def infer(self, batch):
+        key = shape_str(batch.shape)
+        status = self.shapes.get(key)
+        if status is not None and not status['ok']:
+            return self.reference.infer(batch)
+        out = self.infer_unchecked(batch)
+        if status is None:
+            out = self._validate(key, batch, out)
+        return out
+
+    def _validate(self, key, batch, out):
+        """用这一批真实输入和 eager 对比，不一致时返回 eager 结果，该形状以后都走 eager"""
+        ref = self.reference.infer(batch)
+        box_err, score_err = output_error(out, ref)
+        ok = box_err <= BOX_TOL and score_err <= SCORE_TOL
+        self.shapes[key] = {'ok': ok, 'box_err': round(box_err, 6), 'score_err': round(score_err, 8)}
+        save_shapes(self.key, self.name, self.shapes)
+        if not ok:
+            logging.warning(f"{self.name} 后端输入 {key} 与 eager 不一致(框误差 {box_err:.3f}px, "
+                            f"分数误差 {score_err:.2e})，该形状改用 eager")
+            return ref
+        logging.info(f"{self.name} 后端输入 {key} 校验通过(框误差 {box_err:.3f}px, 分数误差 {score_err:.2e})")
+        return out
+
+
+@register_backend
+class TorchScriptBackend(_ShapeCachedBackend):
+    name = 'torchscript'
+    suffix = '.pt'
+
+    def _compile(self, shape, path):
+        example = torch.zeros(shape, device=self.device)
+        with torch.no_grad():
+            traced = torch.jit.trace(_PredOnly(self.owner.model).eval(), example, check_trace=False)
+            frozen = torch.jit.freeze(traced)
+        # optimize_for_inference 的结果不能序列化，缓存冻结后的图，载入后再优化
+        try:
+            torch.jit.save(frozen, path)
+        except Exception as e:
+            logging.warning(f"TorchScript 缓存保存失败: {str(e)}")
+        return torch.jit.optimize_for_inference(frozen)
+
+    def _load_artifact(self, path):
+        return torch.jit.optimize_for_inference(torch.jit.load(path, map_location=self.device))
+
+    def _run(self, compiled, batch):
+        with torch.no_grad():
+            return compiled(batch)
+
+
+@register_backend
+class OpenCVDnnBackend(_ShapeCachedBackend):
+    """导出 ONNX 后用 cv2.dnn 推理，仅 CPU"""
+    name = 'opencv_dnn'
+    suffix = '.onnx'
+
+    @classmethod
+    def available(cls, device):
+        return torch.device(device).type == 'cpu' and hasattr(cv2, 'dnn')
+
+    def _compile(self, shape, path):
+        example = torch.zeros(shape, device=self.device)
+        try:
+            with torch.no_grad():
+                torch.onnx.export(_PredOnly(self.owner.model).eval(), example, path,
+                                  opset_version=12, input_names=['images'], output_names=['output'])
+        except Exception:
+            # 导出失败不留下半个文件，否则下次会当作缓存载入
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return self._load_artifact(path)
+
+    def _load_artifact(self, path):
+        net = cv2.dnn.readNetFromONNX(path)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        return net
+
+    def _run(self, net, batch):
+        net.setInput(np.ascontiguousarray(batch.cpu().numpy()))
+        return torch.from_numpy(net.forward()).to(self.device)
+
+
+def shape_str(shape):
+    return 'x'.join(str(int(v)) for v in shape)
+
+
+def output_error(out, ref):
+    """
+    Detect 原始输出 (N, 锚框数, 5+类别数) 的误差，返回 (框坐标最大绝对误差(像素), 分数最大绝对误差)
+    框坐标是几百像素的量级，分数在 [0, 1]，分开比较，否则分数的误差会被坐标的幅值淹没
+    """
+    out = out.float().to(ref.device)
+    if out.shape != ref.shape:
+        return float('inf'), float('inf')
+    diff = (out - ref).abs()
+    return float(diff[..., :4].max()), float(diff[..., 4:].max())
+
+
+def cache_key(weights_path, device):
+    """导出结果与主机、权重内容、设备和 torch/OpenCV 版本有关"""
+    return (f"{platform.node()}|{cpu_autotune.weights_hash(weights_path)}|{torch.device(device).type}|"
+            f"torch {torch.__version__}|cv2 {cv2.__version__}")
+
+
+def _load_cache():
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    try:
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"读取推理后端缓存失败: {str(e)}")
+        return {}
+
+
+def _write_cache(cache):
+    try:
+        with open(CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        logging.warning(f"保存推理后端缓存失败: {str(e)}")
+
+
+def load_state(key):
+    """{'backend': 选中的后端, 'latency_ms': ..., 'shapes': {后端: {形状: 校验结果}}}，没有返回 None"""
+    return _load_cache().get(key)
+
+
+def save_choice(key, name, latency_ms):
+    with _cache_lock:
+        cache = _load_cache()
+        cache.setdefault(key, {}).update(backend=name, latency_ms=round(latency_ms, 2),
+                                         selected_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        _write_cache(cache)
+
+
+def save_shapes(key, name, shapes):
+    with _cache_lock:
+        cache = _load_cache()
+        cache.setdefault(key, {}).setdefault('shapes', {})[name] = shapes
+        _write_cache(cache)
+
+
+def benchmark(backend, batch, iters=10):
+    """返回中位延迟(ms)"""
+    times = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        backend.infer_unchecked(batch)
+        if batch.device.type == 'cuda':
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+无界面推理服务
+只加载一份 YOLOv5Model，通过本地 HTTP 接收图像，多个并发请求在最长等待时间内合并成一个 batch 推理，
+每个请求返回结构化的检测框和接触点。多路相机或其他工具可以共用一个推理进程。
+
+    python inference_server.py --weights weights/best.pt --port 8765
+    POST /predict  请求体为 JPEG/PNG 编码的图像字节，返回 json
+    GET  /health   返回服务状态
+"""
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from metrics_server import METRICS
+
+
+class _Request:
+    __slots__ = ('img', 'done', 'result', 'error', 't_submit')
+
+    def __init__(self, img):
+        self.img = img
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.t_submit = time.perf_counter()
+
+
+class DynamicBatcher:
+    """
+    动态批处理：第一个请求到达后最多再等 max_wait_ms，凑满 max_batch 或超时即送入模型。
+    model 只需要提供 predict_batch(list_of_bgr) -> [(detections, contact_points), ...]
+    """
+    def __init__(self, model, max_batch=8, max_wait_ms=10.0, queue_size=256):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._running = True
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, img, timeout=10.0):
+        """阻塞直到该图像的结果返回；队列满时抛 queue.Full"""
+        req = _Request(img)
+        self._queue.put(req, timeout=timeout)
+        if not req.done.wait(timeout):
+            raise TimeoutError("推理超时")
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _run(self):
+        while self._running:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    req = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if req is None:
+                    self._running = False
+                    break
+                batch.append(req)
+            self._process(batch)
+
+    def _process(self, batch):
+        t0 = time.perf_counter()
+        try:
+            results = self.model.predict_batch([r.img for r in batch])
+        except Exception as e:
+            logging.error(f"批量推理失败: {str(e)}")
+            for r in batch:
+                r.error = e
+                r.done.set()
+            return
+        t1 = time.perf_counter()
+        METRICS.observe('stage_latency_seconds', t1 - t0, stage='server_batch')
+        METRICS.inc('server_batches_total')
+        for r, (detections, contact_points) in zip(batch, results):
+            r.result = {
+                'detections': [{'xyxy': xyxy, 'conf': conf, 'class': name}
+                               for xyxy, conf, name in detections],
+                'contact_points': [[x, y] for x, y in contact_points],
+                'batch_size': len(batch),
+                'latency_ms': round((t1 - r.t_submit) * 1000, 3),
+            }
+            r.done.set()
+
+    def close(self):
+        self._running = False
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def _send_json(self, code, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            body = METRICS.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length)
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            self._send_json(400, {'error': '无法解码图像'})
+            return
+        try:
+            self._send_json(200, self.batcher.submit(img))
+        except queue.Full:
+            self._send_json(503, {'error': '服务繁忙'})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class InferenceServer:
+    """HTTP 服务 + 动态批处理，serve_forever 在后台线程运行"""
+    def __init__(self, model, port=8765, host='127.0.0.1', max_batch=8, max_wait_ms=10.0):
+        self.batcher = DynamicBatcher(model, max_batch, max_wait_ms)
+        handler = type('InferenceHandler', (_Handler,), {'batcher': self.batcher})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"推理服务已启动: http://localhost:{self.port}/predict")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.batcher.close()
+
+
+def request_predict(img_bgr, host='127.0.0.1', port=8765, timeout=10.0):
+    """本地客户端：把 BGR 图像编码成 JPEG 发给服务，返回 json 结果"""
+    ok, buf = cv2.imencode('.jpg', img_bgr)
+    if not ok:
+        raise ValueError("图像编码失败")
+    req = urllib.request.Request(f'http://{host}:{port}/predict', data=buf.tobytes(),
+                                 headers={'Content-Type': 'image/jpeg'}, method='POST')
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode('utf-8'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='YOLOv5 弓网检测推理服务')
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10.0)
+    parser.add_argument('--conf-thres', type=float, default=0.25)
+    parser.add_argument('--iou-thres', type=float, default=0.45)
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    from yolo5_model_5 import YOLOv5Model
+    model = YOLOv5Model(opt.weights, opt.device, opt.conf_thres, opt.iou_thres)
+    server = InferenceServer(model, opt.port, opt.host, opt.max_batch, opt.max_wait_ms).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+接触点记录的多级 min/max 降采样金字塔 (level of detail)
+第 0 层是原始 (帧号, x, y)，之后每层把上一层每 factor 个点合并为一个 bin，
+保存 bin 的首末帧号和 x/y 的最小、最大值。金字塔只构建一次，以 .npy 形式缓存在
+记录文件旁的 <csv>.lod/ 目录里，查询时用 mmap 打开，只读取可见范围。
+每层的帧号列另存一份连续数组(frames<i>.npy)，二分查找直接在 mmap 上进行，不会拷贝整列。
+记录中途跳转过时帧号不是单调的，构建时先把原始层按帧号(稳定)排序，二分查找才成立。
+"""
+import json
+import logging
+import os
+import numpy as np
+
+from trajectory_analysis import iter_chunks
+
+# 第 1 层以上每行的列: 首帧, 末帧, x_min, x_max, y_min, y_max
+F_FIRST, F_LAST, X_MIN, X_MAX, Y_MIN, Y_MAX = range(6)
+LAYOUT = 3                       # 缓存格式版本，格式变化后旧缓存自动重建
+
+
+class LodPyramid:
+    def __init__(self, csv_path, factor=8, min_level_size=1024, chunk_size=1_000_000):
+        self.csv_path = str(csv_path)
+        self.factor = factor
+        self.min_level_size = min_level_size
+        self.chunk_size = chunk_size
+        self.cache_dir = self.csv_path + '.lod'
+        self.levels = []
+        self.frames = []                 # 每层的帧号列(第 0 层为帧号，其余层为 bin 首帧)
+
+        if not self._load_cache():
+            self._build()
+            self._load_cache()
+
+    # ---------- 缓存 ----------
+    def _source_meta(self):
+        st = os.stat(self.csv_path)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'factor': self.factor, 'layout': LAYOUT}
+
+    def _load_cache(self):
+        meta_path = os.path.join(self.cache_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('source') != self._source_meta():
+            logging.info(f"记录文件已变化，重新构建金字塔: {self.csv_path}")
+            return False
+        self.levels = [np.load(os.path.join(self.cache_dir, f'level{i}.npy'), mmap_mode='r')
+                       for i in range(meta['levels'])]
+        self.frames = [np.load(os.path.join(self.cache_dir, f'frames{i}.npy'), mmap_mode='r')
+                       for i in range(meta['levels'])]
+        return True
+
+    def _build(self):
+        """两遍扫描：先数行数，再把原始数据写进 memmap，逐层向上归约"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.csv_path, 'r', encoding='utf-8') as f:
+            n = sum(1 for _ in f) - 1
+        n = max(n, 0)
+
+        level0 = np.lib.format.open_memmap(os.path.join(self.cache_dir, 'level0.npy'),
+                                           mode='w+', dtype=np.float64, shape=(n, 3))
+        pos = 0
+        for block in iter_chunks(self.csv_path, self.chunk_size):
+            level0[pos:pos + len(block)] = block
+            pos += len(block)
+        level0.flush()
+        if self._sort_by_frame(level0):
+            # Windows 上被 mmap 打开的文件不能替换，先释放再换成排序后的文件
+            path = os.path.join(self.cache_dir, 'level0.npy')
+            del level0
+            os.replace(os.path.join(self.cache_dir, 'level0_sorted.npy'), path)
+            level0 = np.load(path, mmap_mode='r')
+            logging.info(f"记录中帧号不单调(有跳转)，已按帧号排序: {self.csv_path}")
+
+        prev, count = level0, 1
+        self._save_frames(level0, 0)
+        while len(prev) > self.min_level_size:
+            prev = self._reduce(prev, count)
+            self._save_frames(prev, count)
+            count += 1
+        del level0, prev
+
+        with open(os.path.join(self.cache_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'source': self._source_meta(), 'levels': count}, f)
+        logging.info(f"金字塔构建完成: {n} 点, {count} 层, 缓存于 {self.cache_dir}")
+
+    def _sort_by_frame(self, level0):
+        """
+        帧号不单调(记录中有跳转)时按帧号稳定排序写到 level0_sorted.npy，返回是否写了；
+        内存为每点两个 8 字节数(帧号列和排序下标)
+        """
+        frames = np.asarray(level0[:, 0])
+        if len(frames) < 2 or bool(np.all(frames[1:] >= frames[:-1])):
+            return False
+        order = np.argsort(frames, kind='stable')
+        del frames
+        out = np.lib.format.open_memmap(os.path.join(self.cache_dir, 'level0_sorted.npy'),
+                                        mode='w+', dtype=np.float64, shape=level0.shape)
+        for start in range(0, len(order), self.chunk_size):
+            out[start:start + self.chunk_size] = level0[order[start:start + self.chunk_size]]
+        out.flush()
+        return True
+
+    def _save_frames(self, level, index):
+        """把一层的第 0 列分块拷贝成单独的连续数组"""
+        out = np.lib.format.open_memmap(os.path.join(self.cache_dir, f'frames{index}.npy'),
+                                        mode='w+', dtype=np.float64, shape=(len(level),))
+        for start in range(0, len(level), self.chunk_size):
+            out[start:start + self.chunk_size] = level[start:start + self.chunk_size, 0]
+        out.flush()
+
+    def _reduce(self, prev, index):
+        """把上一层按 factor 合并，分块处理，内存只和 chunk_size 有关"""
+        m = -(-len(prev) // self.factor)
+        out = np.lib.format.open_memmap(os.path.join(self.cache_dir, f'level{index}.npy'),
+                                        mode='w+', dtype=np.float64, shape=(m, 6))
+        step = (self.chunk_size // self.factor) * self.factor
+        for start in range(0, len(prev), step):
+            block = np.asarray(prev[start:start + step])
+            if block.shape[1] == 3:   # 原始层: 首末帧相同，最小最大值相同
+                block = block[:, [0, 0, 1, 1, 2, 2]]
+            idx = np.arange(0, len(block), self.factor)
+            rows = slice(start // self.factor, start // self.factor + len(idx))
+            out[rows, F_FIRST] = block[idx, F_FIRST]
+            out[rows, F_LAST] = block[np.minimum(idx + self.factor, len(block)) - 1, F_LAST]
+            out[rows, X_MIN] = np.minimum.reduceat(block[:, X_MIN], idx)
+            out[rows, X_MAX] = np.maximum.reduceat(block[:, X_MAX], idx)
+            out[rows, Y_MIN] = np.minimum.reduceat(block[:, Y_MIN], idx)
+            out[rows, Y_MAX] = np.maximum.reduceat(block[:, Y_MAX], idx)
+        out.flush()
+        return out
+
+    # ---------- 查询 ----------
+    @property
+    def frame_range(self):
+        """整段记录的 (首帧, 末帧)"""
+        if not len(self.levels[0]):
+            return 0, 0
+        return int(self.levels[0][0, 0]), int(self.levels[0][-1, 0])
+
+    def query(self, f0, f1, max_points=2000):
+        """
+        返回 [f0, f1] 范围内用于绘制的 (frames, x, y, level)
+        选择点数不超过 max_points 的最精细一层；第 0 层为原始点，可以精确到帧，
+        其余层每个 bin 输出 (首帧, 最小) 和 (末帧, 最大) 两个点，保留尖峰。
+        从最粗一层往下找，缩放到局部时不会在原始层上做无用的查找。
+        """
+        if not self.levels:
+            empty = np.empty(0)
+            return empty, empty, empty, 0
+        level = len(self.levels) - 1
+        lo, hi = self._span(level, f0, f1)
+        while level > 0:
+            finer = self._span(level - 1, f0, f1)
+            if (finer[1] - finer[0]) * (1 if level == 1 else 2) > max_points:
+                break
+            level -= 1
+            lo, hi = finer
+        seg = np.asarray(self.levels[level][lo:hi])
+        if level == 0:
+            return seg[:, 0], seg[:, 1], seg[:, 2], 0
+        frames = seg[:, [F_FIRST, F_LAST]].ravel()
+        x = seg[:, [X_MIN, X_MAX]].ravel()
+        y = seg[:, [Y_MIN, Y_MAX]].ravel()
+        return frames, x, y, level
+
+    def _span(self, level, f0, f1):
+        """某一层中覆盖 [f0, f1] 的行范围，两端各多取一行，曲线连到可见区外"""
+        frames = self.frames[level]
+        lo = max(int(np.searchsorted(frames, f0, side='right')) - 1, 0)
+        hi = int(np.searchsorted(frames, f1, side='right')) + 1
+        return lo, min(hi, len(frames))
+
+    def nearest_frame(self, frame):
+        """在原始层里找最接近的已记录帧，返回 (帧号, x, y)，没有数据返回 None"""
+        raw = self.levels[0]
+        if not len(raw):
+            return None
+        i = int(np.searchsorted(self.frames[0], frame))
+        cand = [j for j in (i - 1, i) if 0 <= j < len(raw)]
+        j = min(cand, key=lambda k: abs(raw[k, 0] - frame))
+        return int(raw[j, 0]), float(raw[j, 1]), float(raw[j, 2])
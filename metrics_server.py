@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 指标接口 (Prometheus 文本格式)
+模型和主窗口把吞吐、各阶段耗时、丢帧、检出率等写入全局 METRICS，
+可选地在后台线程启动一个 HTTP 服务，监控系统直接抓取 http://<host>:<port>/metrics。
+只用标准库，不依赖 prometheus_client。
+"""
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟直方图的桶上界(秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+def process_memory_bytes():
+    """当前进程常驻内存(RSS)，优先用 psutil，没有则读 /proc 或 getrusage"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except ImportError:
+        return 0
+
+
+class Metrics:
+    """线程安全的计数器 / 仪表 / 直方图集合"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}     # (name, labels) -> value
+        self._gauges = {}
+        self._hists = {}        # (name, labels) -> [bucket_counts, sum, count]
+        self._help = {}
+        self._fps_last = None
+        self._frame_wall = None          # 最近一帧的墙钟时间
+        self.fps = 0.0
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            k = self._key(name, labels)
+            self._counters[k] = self._counters.get(k, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        with self._lock:
+            k = self._key(name, labels)
+            h = self._hists.get(k)
+            if h is None:
+                h = self._hists[k] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, seconds)
+            if i < len(self.buckets):
+                h[0][i] += 1
+            h[1] += seconds
+            h[2] += 1
+
+    def tick_frame(self):
+        """每显示一帧调用一次，用指数滑动平均估计 fps"""
+        now = time.perf_counter()
+        with self._lock:
+            if self._fps_last is not None:
+                dt = now - self._fps_last
+                if dt > 0:
+                    self.fps = 0.9 * self.fps + 0.1 / dt if self.fps else 1.0 / dt
+            self._fps_last = now
+            self._frame_wall = time.time()
+            k = self._key('frames_total', {})
+            self._counters[k] = self._counters.get(k, 0) + 1
+
+    def current_fps(self):
+        """
+        抓取时刻的 fps：距上一帧的时间超过平均帧间隔时按 1/间隔 衰减，
+        卡住或暂停的工位会降到 0 附近，而不是一直报告最后的正常值
+        """
+        with self._lock:
+            if self._fps_last is None:
+                return 0.0
+            idle = time.perf_counter() - self._fps_last
+            return min(self.fps, 1.0 / idle) if idle > 0 else self.fps
+
+    def render(self):
+        """生成 Prometheus 文本格式"""
+        self.set('fps', round(self.current_fps(), 3))
+        self.set('process_resident_memory_bytes', process_memory_bytes())
+        with self._lock:
+            inferred = self._counters.get(('frames_inferred_total', ()), 0)
+            hits = self._counters.get(('frames_with_contact_total', ()), 0)
+            frame_wall = self._frame_wall
+        if inferred:
+            self.set('detection_rate', round(hits / inferred, 4))
+        if frame_wall is not None:
+            self.set('last_frame_timestamp_seconds', round(frame_wall, 3))
+        lines = []
+        with self._lock:
+            for kind, table in (('counter', self._counters), ('gauge', self._gauges)):
+                seen = set()
+                for (name, labels), value in sorted(table.items()):
+                    if name not in seen:
+                        seen.add(name)
+                        if name in self._help:
+                            lines.append(f'# HELP {name} {self._help[name]}')
+                        lines.append(f'# TYPE {name} {kind}')
+                    lines.append(f'{name}{_label_str(dict(labels))} {value}')
+            seen = set()
+            for (name, labels), (counts, total, count) in sorted(self._hists.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f'# HELP {name} {self._help[name]}')
+                    lines.append(f'# TYPE {name} histogram')
+                labels = dict(labels)
+                cum = 0
+                for le, c in zip(self.buckets, counts):
+                    cum += c
+                    lines.append(f'{name}_bucket{_label_str({**labels, "le": le})} {cum}')
+                lines.append(f'{name}_bucket{_label_str({**labels, "le": "+Inf"})} {count}')
+                lines.append(f'{name}_sum{_label_str(labels)} {total}')
+                lines.append(f'{name}_count{_label_str(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标，模型和界面共用
+METRICS = Metrics()
+METRICS.describe('frames_total', '已显示的帧数')
+METRICS.describe('frames_inferred_total', '经过模型推理的帧数')
+METRICS.describe('frames_with_contact_total', '检测到接触点的帧数')
+METRICS.describe('frames_dropped_total', '被丢弃的帧数')
+METRICS.describe('stage_latency_seconds', '各处理阶段耗时')
+METRICS.describe('camera_latency_seconds', '相机采集到结果显示的延迟')
+METRICS.describe('model_load_seconds', '模型加载耗时')
+METRICS.describe('fps', '显示帧率(滑动平均，停止出帧后随时间衰减)')
+METRICS.describe('last_frame_timestamp_seconds', '最近一帧显示的时间(Unix 秒)，用于停帧报警')
+METRICS.describe('detection_rate', '检测到接触点的帧占推理帧的比例')
+METRICS.describe('process_resident_memory_bytes', '进程常驻内存')
+METRICS.describe('published_total', '已发布的检测结果消息数')
+METRICS.describe('publish_dropped_total', '发布队列满或发送失败丢弃的消息数')
+METRICS.describe('publish_latency_seconds', '检测结果从入队到发出的耗时')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    metrics = METRICS
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取很频繁，不写入日志
+        pass
+
+
+class MetricsServer:
+    """在后台守护线程里运行的 HTTP 服务"""
+    def __init__(self, port=9108, host='0.0.0.0', metrics=METRICS):
+        handler = type('MetricsHandler', (_Handler,), {'metrics': metrics})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"指标服务已启动: http://localhost:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_from_env(var='METRICS_PORT'):
+    """环境变量里配置了端口才启动，返回 MetricsServer 或 None"""
+    spec = os.environ.get(var, '').strip()
+    if not spec:
+        return None
+    try:
+        port = int(spec)
+    except ValueError:
+        logging.error(f"指标服务端口无效 {var}={spec}")
+        return None
+    if port <= 0:
+        return None
+    try:
+        return MetricsServer(port).start()
+    except OSError as e:
+        logging.error(f"指标服务启动失败, 端口 {port}: {str(e)}")
+        return None
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+运动门控：画面静止时复用上一次的检测结果
+把每帧缩成灰度缩略图，与上一次真正推理的那帧逐块比较：差值图按 block×block 分块取平均，
+最大的一块低于阈值才跳过推理。接触线/接触点只有几个像素宽，全图平均几乎看不出它的横向移动，
+而局部块的均值能看出来。列车停车、库内测试或相机重复输出同一帧时，可以省掉绝大部分计算。
+阈值、权重、后端或输入尺寸变化后上一次结果已不是当前设置会给出的结果，调用方应 reset()。
+"""
+import cv2
+import numpy as np
+
+from metrics_server import METRICS
+
+
+class MotionGate:
+    def __init__(self, threshold=4.0, size=(320, 180), block=8, max_reuse=30):
+        self.threshold = threshold      # 各块平均灰度差(0-255)的最大值低于该值视为静止
+        self.size = size                # 比较用的缩略图尺寸 (w, h)
+        self.block = block              # 分块边长(缩略图像素)
+        self.max_reuse = max_reuse      # 连续复用上限，到达后强制推理一次，防止缓慢漂移
+        self.enabled = True
+        self._last = None               # 上一次推理帧的缩略图
+        self._reused = 0
+        self.last_diff = None
+        self.reused_total = 0
+        self.duplicates_total = 0
+
+    def reset(self):
+        self._last = None
+        self._reused = 0
+
+    def check(self, frame):
+        """返回 True 表示可以复用上一次结果；返回 False 时调用方应当推理，本帧即成为新的参考帧"""
+        small = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA),
+                             cv2.COLOR_BGR2GRAY)
+        if not self.enabled or self._last is None:
+            self._set_reference(small)
+            return False
+
+        diff = cv2.absdiff(small, self._last)
+        w, h = self.size
+        # INTER_AREA 缩小即分块求平均
+        blocks = cv2.resize(diff, (max(w // self.block, 1), max(h // self.block, 1)), interpolation=cv2.INTER_AREA)
+        self.last_diff = float(blocks.max())
+        if self.last_diff == 0.0:
+            self.duplicates_total += 1   # 相机重复输出的同一帧
+        if self.last_diff < self.threshold and self._reused < self.max_reuse:
+            self._reused += 1
+            self.reused_total += 1
+            METRICS.inc('frames_reused_total')
+            return True
+
+        self._set_reference(small)
+        return False
+
+    def _set_reference(self, small):
+        self._last = small
+        self._reused = 0
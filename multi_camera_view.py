@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+多路监测窗口
+每路一个面板(画面 + 横向/纵向曲线)，推理由 MultiStreamMonitor 跨路批量完成，与主窗口共享同一个模型。
+监测循环在工作线程里运行，批量前向(以及导出后端首次遇到新形状时的编译)不占用界面线程；
+每批结果连同曲线数据的快照通过信号送回界面线程显示。
+"""
+import logging
+import math
+import os
+import threading
+import time
+
+import cv2
+import pyqtgraph as pg
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QImage, QPixmap
+
+from multi_stream import MultiStreamMonitor
+from session_store import SessionStore
+
+
+class _StreamPanel(QWidget):
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.label_img = QLabel(f"{name} 等待画面")
+        self.label_img.setAlignment(Qt.AlignCenter)
+        self.label_img.setMinimumSize(320, 180)
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setTitle(name)
+        self.plot_widget.setLabel('bottom', '帧号')
+        self.plot_widget.showGrid(x=True, y=True)
+        self.plot_widget.setMaximumHeight(180)
+        self.curve_x = self.plot_widget.plot(pen=pg.mkPen('g', width=1), name='x')
+        self.curve_y = self.plot_widget.plot(pen=pg.mkPen('c', width=1), name='y')
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label_img, 1)
+        layout.addWidget(self.plot_widget)
+
+    def show_cv_img(self, cv_img):
+        rgb = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
+        h, w, ch = rgb.shape
+        q_img = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
+        self.label_img.setPixmap(QPixmap.fromImage(q_img).scaled(
+            self.label_img.size(), Qt.KeepAspectRatio, Qt.FastTransformation))
+
+
+class MultiCameraView(QWidget):
+    batch_ready = Signal(object)        # 工作线程 emit：(各路最新画面, 曲线快照或 None, 状态文字)
+    stopped = Signal()
+
+    def __init__(self, model, sources, parent=None, max_batch=4, publisher=None, img_size=640):
+        super().__init__(parent)
+        self.setWindowFlag(Qt.Window)
+        self.setWindowTitle(f"多路监测 - {len(sources)} 路")
+        self.resize(1200, 800)
+
+        self.monitor = MultiStreamMonitor(model, sources, max_batch=max_batch, publisher=publisher,
+                                          img_size=img_size)
+        self.results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+        grid = QGridLayout()
+        cols = math.ceil(math.sqrt(len(sources)))
+        self.panels = {}
+        for i, st in enumerate(self.monitor.streams):
+            panel = _StreamPanel(f"{st.name}: {st.source.src}")
+            grid.addWidget(panel, i // cols, i % cols)
+            self.panels[st.name] = panel
+
+        self.btn_record = QPushButton("开始记录")
+        self.btn_record.setCheckable(True)
+        self.btn_record.toggled.connect(self.toggle_recording)
+        self.info_label = QLabel("")
+        bottom = QHBoxLayout()
+        bottom.addWidget(self.btn_record)
+        bottom.addWidget(self.info_label, 1)
+        layout = QVBoxLayout(self)
+        layout.addLayout(grid, 1)
+        layout.addLayout(bottom)
+
+        self.batch_ready.connect(self._on_batch)
+        self.stopped.connect(lambda: logging.warning("多路监测: 所有相机均已断开"))
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        """工作线程：循环批量推理，曲线数据在这里拷贝成快照，界面线程不直接读正在追加的 deque"""
+        while not self._stop.is_set():
+            if not self.monitor.active:
+                self.stopped.emit()
+                return
+            try:
+                served = self.monitor.step()
+            except Exception as e:
+                logging.error(f"多路监测推理失败: {str(e)}")
+                served = []
+            if not served:
+                time.sleep(0.002)
+                continue
+            frames = [(st.name, st.last_frame) for st in served]
+            curves, info = None, None
+            # 曲线刷新比画面低频，多路时界面开销不随路数线性增长
+            if self.monitor.steps % 5 == 0:
+                curves = [(st.name, list(st.frame_numbers), list(st.contact_point_x), list(st.contact_point_y))
+                          for st in self.monitor.streams]
+                info = "  ".join(f"{st.name}: 推理 {st.inferred} / 丢弃 {st.source.dropped}"
+                                 for st in self.monitor.streams)
+            self.batch_ready.emit((frames, curves, info))
+
+    def _on_batch(self, batch):
+        frames, curves, info = batch
+        for name, frame in frames:
+            self.panels[name].show_cv_img(frame)
+        if curves:
+            for name, fns, xs, ys in curves:
+                self.panels[name].curve_x.setData(fns, xs)
+                self.panels[name].curve_y.setData(fns, ys)
+            self.info_label.setText(info)
+
+    def toggle_recording(self, checked):
+        if checked:
+            self.monitor.start_recording(self.results_dir)
+            self.btn_record.setText("停止记录")
+        else:
+            files = self.monitor.stop_recording()
+            self.btn_record.setText("开始记录")
+            threading.Thread(target=self._ingest, args=(files,), daemon=True).start()
+
+    def _ingest(self, files):
+        """各路记录导入会话库，相机名取自文件名"""
+        store = SessionStore(os.path.join(self.results_dir, "sessions.db"))
+        for data_file, fps in files:
+            try:
+                store.ingest_csv(data_file, fps=fps)
+            except Exception as e:
+                logging.error(f"导入会话库失败: {str(e)}")
+
+    def closeEvent(self, event):
+        self._stop.set()
+        self._worker.join(timeout=2.0)
+        files = self.monitor.stop_recording()
+        if files:
+            threading.Thread(target=self._ingest, args=(files,), daemon=True).start()
+        self.monitor.close()
+        super().closeEvent(event)
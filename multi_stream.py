@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+多路相机同时监测
+一个进程接入多路相机，所有路共享同一个 YOLOv5Model：每一步从各路取出最新帧，拼成一个 batch
+做一次前向(YOLOv5Model.predict_batch)，再按路分发结果。每路各自维护接触点曲线数据和记录文件。
+
+调度按轮转起点公平取帧：每步最多取 max_batch 路，下一步从上一步最后服务的那一路之后开始，
+任何一路都不会因为其他路出帧更快而被饿死。相机端只保留最新帧(LiveCameraSource)，来不及处理的帧直接丢弃。
+输入尺寸在监测器上固定(img_size)，不跟随主窗口的动态尺寸，导出类后端不会因尺寸变化反复编译。
+step() 通常在工作线程里循环调用，记录的开始/停止与 step 用 lock 互斥。
+
+    python multi_stream.py --sources 0 1 rtsp://192.168.1.10/stream --seconds 60
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+
+from camera_source import LiveCameraSource
+from metrics_server import METRICS
+import result_publisher
+from session_store import camera_tag
+from yolo5_model_5 import YOLOv5Model
+
+
+class StreamState:
+    """单路相机的状态：数据源、曲线数据、记录文件、最近一帧画面"""
+    def __init__(self, name, source, max_points=1000):
+        self.name = name
+        self.source = source
+        self.frame_numbers = deque(maxlen=max_points)
+        self.contact_point_x = deque(maxlen=max_points)
+        self.contact_point_y = deque(maxlen=max_points)
+        self.last_frame = None           # 画好框的最近一帧
+        self.last_detections = []
+        self.inferred = 0
+        self.data_file = None
+        self.data_writer = None
+
+    def start_recording(self, out_dir):
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            # 文件名里的相机名取自实际数据源，与主窗口打开同一相机时的记录归到同一相机
+            self.data_file = os.path.join(out_dir, f"coordinate_data_{camera_tag(self.source.src)}_{timestamp}.csv")
+            self.data_writer = open(self.data_file, 'w')
+            self.data_writer.write('frame_number,x_center,y_center,reused,timestamp\n')
+            logging.info(f"[{self.name}] 开始记录数据到文件: {self.data_file}")
+        except Exception as e:
+            logging.error(f"[{self.name}] 创建数据文件失败: {str(e)}")
+            self.data_writer = None
+
+    def stop_recording(self):
+        if self.data_writer:
+            try:
+                self.data_writer.close()
+                logging.info(f"[{self.name}] 数据记录已停止，文件已保存: {self.data_file}")
+            except Exception as e:
+                logging.error(f"[{self.name}] 关闭数据文件失败: {str(e)}")
+            finally:
+                self.data_writer = None
+
+    def add_result(self, frame_number, frame, detections, contact_points, overlay):
+        self.inferred += 1
+        self.last_detections = detections
+        self.last_frame = overlay.draw(frame, detections)
+        if not contact_points:
+            return
+        x_center, y_center = contact_points[0]
+        self.frame_numbers.append(frame_number)
+        self.contact_point_x.append(x_center)
+        self.contact_point_y.append(y_center)
+        if self.data_writer:
+            try:
+                self.data_writer.write(f'{frame_number},{x_center},{y_center},0,{time.time():.3f}\n')
+            except Exception as e:
+                logging.error(f"[{self.name}] 写入数据失败: {str(e)}")
+
+
+class MultiStreamMonitor:
+    def __init__(self, model, sources, max_batch=4, max_points=1000, width=1280, height=720, fps=30,
+                 publisher=None, img_size=640):
+        self.model = model
+        self.img_size = img_size         # 固定的推理输入尺寸
+        self.lock = threading.Lock()
+        self.publisher = publisher       # ResultPublisher，第 i 路以路号 i+1 发布(0 为主窗口)
+        self.max_batch = max_batch
+        self.streams = []
+        for i, src in enumerate(sources):
+            # 相机索引协商 MJPG；网络流/文件保持原格式
+            if isinstance(src, int):
+                source = LiveCameraSource(src, width=width, height=height, fps=fps, fourcc='MJPG')
+            else:
+                source = LiveCameraSource(src, width=None, height=None, fps=None, fourcc=None)
+            if not source.isOpened():
+                logging.warning(f"无法打开第 {i} 路: {src}")
+            self.streams.append(StreamState(f"cam{i}", source, max_points))
+        self._next = 0                   # 下一步轮转的起点
+        self.steps = 0
+
+    def step(self):
+        """取一批最新帧做一次批量推理，返回本步处理的 StreamState 列表"""
+        with self.lock:
+            return self._step()
+
+    def _step(self):
+        n = len(self.streams)
+        ready = []
+        last = None
+        for k in range(n):
+            i = (self._next + k) % n
+            st = self.streams[i]
+            if not st.source.isOpened() or st.source.ended:
+                continue
+            ok, frame = st.source.read(timeout=0)
+            if ok:
+                ready.append((st, st.source.frame_number, frame))
+                last = i
+                if len(ready) >= self.max_batch:
+                    break
+        if not ready:
+            return []
+        self._next = (last + 1) % n
+
+        t0 = time.perf_counter()
+        results = self.model.predict_batch([frame for _, _, frame in ready], img_size=self.img_size)
+        METRICS.observe('stage_latency_seconds', time.perf_counter() - t0, stage='multi_stream_batch')
+        for (st, frame_number, frame), (detections, contact_points) in zip(ready, results):
+            if self.publisher is not None:
+                # 推理完立即发布，不等画框和曲线
+                self.publisher.publish(frame_number, st.source.get(cv2.CAP_PROP_POS_MSEC), detections,
+                                       contact_points, stream=self.streams.index(st) + 1)
+            st.add_result(frame_number, frame, detections, contact_points, self.model.overlay)
+        self.steps += 1
+        return [st for st, _, _ in ready]
+
+    @property
+    def active(self):
+        return any(st.source.isOpened() and not st.source.ended for st in self.streams)
+
+    def start_recording(self, out_dir):
+        with self.lock:
+            for st in self.streams:
+                st.start_recording(out_dir)
+
+    def stop_recording(self):
+        """停止各路记录，返回 [(记录文件, 帧率)]"""
+        files = []
+        with self.lock:
+            for st in self.streams:
+                if st.data_writer:
+                    st.stop_recording()
+                    files.append((st.data_file, st.source.get(cv2.CAP_PROP_FPS) or 30.0))
+        return files
+
+    def close(self):
+        self.stop_recording()
+        for st in self.streams:
+            st.source.release()
+        summary = ", ".join(f"{st.name} 推理 {st.inferred} 帧/丢弃 {st.source.dropped} 帧" for st in self.streams)
+        logging.info(f"多路监测结束: {self.steps} 批, {summary}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='多路相机共享模型监测(无界面)')
+    parser.add_argument('--sources', nargs='+', required=True, help='相机索引或视频流地址')
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--max-batch', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--out', default='results', help='各路记录文件目录')
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    sources = [int(s) if s.isdigit() else s for s in opt.sources]
+    model = YOLOv5Model(opt.weights)
+    # 设置了 RESULT_PUBLISH 时同样发布各路结果
+    publisher = result_publisher.start_from_env(model.names)
+    monitor = MultiStreamMonitor(model, sources, max_batch=opt.max_batch, publisher=publisher)
+    monitor.start_recording(opt.out)
+    t_end = time.perf_counter() + opt.seconds
+    try:
+        while time.perf_counter() < t_end and monitor.active:
+            if not monitor.step():
+                time.sleep(0.002)
+    finally:
+        monitor.close()
+        if publisher is not None:
+            publisher.close()
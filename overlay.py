@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+检测框叠加绘制
+原先每个框都要重新格式化置信度字符串、getTextSize、画实心底色再抗锯齿写字。
+标签的外观只取决于 类别 + 置信度(两位小数) + 线宽，这里把画好底色和文字的标签图块按这个键缓存，
+之后每个框只需画矩形并把图块拷贝到位。可以传入缩放比例，在已缩放到显示尺寸的画面上绘制，
+绘制开销与源分辨率无关。
+"""
+import cv2
+import numpy as np
+
+
+class OverlayRenderer:
+    def __init__(self, color=(100, 160, 0), line_thickness=2, text_color=(255, 255, 255), conf_step=0.01):
+        self.color = color
+        self.line_thickness = line_thickness
+        self.text_color = text_color
+        self.conf_step = conf_step       # 置信度分桶，与标签显示的两位小数一致
+        self._sprites = {}
+
+    def _sprite(self, name, conf, tl):
+        """返回画好底色和文字的标签图块，图块最后一行与框的上沿对齐"""
+        bucket = int(round(conf / self.conf_step))
+        key = (name, bucket, tl)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            label = f'{name} {bucket * self.conf_step:.2f}'
+            tf = max(tl - 1, 1)
+            (tw, th), _ = cv2.getTextSize(label, 0, fontScale=tl / 3, thickness=tf)
+            # 与原 _plot_one_box 一致：底色覆盖框上沿往上 th + 3 行(含上沿所在行)，文字基线在上沿上方 2 像素
+            sprite = np.empty((th + 4, tw + 1, 3), dtype=np.uint8)
+            sprite[:] = self.color
+            cv2.putText(sprite, label, (0, th + 1), 0, tl / 3, self.text_color,
+                        thickness=tf, lineType=cv2.LINE_AA)
+            self._sprites[key] = sprite
+        return sprite
+
+    def draw(self, img, detections, scale=1.0, labels=True, line_thickness=None):
+        """
+        在 img 上原地画出一帧的全部检测框，detections 为 [(xyxy, conf, 类别名)]。
+        scale 为 img 相对检测坐标的缩放比例(在显示尺寸画面上绘制时使用)
+        """
+        tl = line_thickness or self.line_thickness
+        h, w = img.shape[:2]
+        boxes = [(int(xyxy[0] * scale), int(xyxy[1] * scale), int(xyxy[2] * scale), int(xyxy[3] * scale))
+                 for xyxy, _, _ in detections]
+        for x1, y1, x2, y2 in boxes:
+            cv2.rectangle(img, (x1, y1), (x2, y2), self.color, thickness=tl, lineType=cv2.LINE_AA)
+        if not labels:
+            return img
+        # 标签在所有框之后贴上，保证文字不被相邻框的线条覆盖
+        for (x1, y1, _, _), (_, conf, name) in zip(boxes, detections):
+            sprite = self._sprite(name, conf, tl)
+            sh, sw = sprite.shape[:2]
+            top, left = y1 - sh + 1, x1
+            # 超出画面的部分裁掉
+            t0, l0 = max(top, 0), max(left, 0)
+            t1, l1 = min(top + sh, h), min(left + sw, w)
+            if t1 <= t0 or l1 <= l0:
+                continue
+            img[t0:t1, l0:l1] = sprite[t0 - top:t1 - top, l0 - left:l1 - left]
+        return img
+
+    def clear(self):
+        self._sprites.clear()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+检测结果回放
+检测时除了 coordinate_data_*.csv，同时把每帧的全部检测框写入 detections_*.csv(DetectionRecorder)。
+回看时加载这个文件(DetectionLog)，按帧号取出记录的检测框画在画面上、接触点画进曲线，不再跑网络：
+回看速度只受解码限制，换了权重之后重看仍和当时的结果完全一致。
+
+文件格式：首行 '# source=<视频路径>'，之后为 CSV(类别名含逗号、引号时按 CSV 规则加引号)
+    frame_number,class,conf,x1,y1,x2,y2
+每个检测框一行；检测过但没有目标的帧写一行空类别，用来区分"没有目标"和"没有检测过"。
+
+    python replay.py results/detections_20240101_120000.csv --out replay.mp4    # 离线渲染标注视频
+"""
+import argparse
+import csv
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from overlay import OverlayRenderer
+
+COLUMNS = ['frame_number', 'class', 'conf', 'x1', 'y1', 'x2', 'y2']
+CONTACT_NAME = 'contact point'
+
+
+def detections_file_for(data_file):
+    """坐标记录文件对应的检测结果文件：coordinate_data_<时间>.csv -> detections_<时间>.csv"""
+    folder, name = os.path.split(data_file)
+    return os.path.join(folder, name.replace('coordinate_data_', 'detections_', 1))
+
+
+def recorded_source(data_file):
+    """坐标记录文件对应的视频源(取自同名检测结果文件的首行)，没有时返回空串"""
+    try:
+        with open(detections_file_for(data_file), 'r', encoding='utf-8') as f:
+            first = f.readline()
+    except OSError:
+        return ''
+    return first[len('# source='):].strip() if first.startswith('# source=') else ''
+
+
+class DetectionRecorder:
+    def __init__(self, path, source=''):
+        self.path = path
+        self.frames = 0
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.file.write(f'# source={source}\n')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, frame_number, detections):
+        if not detections:
+            self.writer.writerow([frame_number, '', '', '', '', '', ''])
+        self.writer.writerows([frame_number, name, f'{conf:.4f}', f'{xyxy[0]:.1f}', f'{xyxy[1]:.1f}',
+                               f'{xyxy[2]:.1f}', f'{xyxy[3]:.1f}'] for xyxy, conf, name in detections)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+        logging.info(f"检测结果已保存: {self.path} ({self.frames} 帧)")
+
+
+def _parse_numbers(cells, dtype):
+    """字符串数组整体拼接后一次解析，比 astype 逐个转换快得多"""
+    return np.fromstring(' '.join(cells.ravel().tolist()), dtype=dtype, sep=' ')
+
+
+class DetectionLog:
+    """
+    整个文件读成一个字符串矩阵后按列转换成数组(不为每个检测框建 dict)，按帧号排序；
+    get(frame) 用二分查找取一帧的检测框，跳转后补曲线用 contact_range 一次切出一段接触点
+    """
+    def __init__(self, path):
+        self.path = path
+        self.source = ''
+        with open(path, 'r', encoding='utf-8') as f:
+            first = f.readline()
+            if first.startswith('# source='):
+                self.source = first[len('# source='):].strip()
+            else:
+                f.seek(0)
+            if f.readline().strip() != ','.join(COLUMNS):
+                raise ValueError(f"不是检测结果文件: {path}")
+            body = f.read().strip()
+        n = len(COLUMNS)
+        cells = body.replace('\n', ',').split(',') if body else []
+        if '"' in body or len(cells) % n:
+            # 类别名带逗号/引号时才需要按 CSV 规则逐行解析
+            cells = [c for r in csv.reader(body.splitlines()) if len(r) == n for c in r]
+        table = np.array(cells, dtype=str).reshape(-1, n)
+        table = table[table[:, 0] != '']
+        if not len(table):
+            raise ValueError(f"检测结果文件为空: {path}")
+
+        frames = _parse_numbers(table[:, 0], np.int64)
+        order = np.argsort(frames, kind='stable')
+        table = table[order]
+        self.frames = frames[order]
+        # 按列转换；空类别的行(没有目标的帧)数值列为空串
+        empty = table[:, 1] == ''
+        numeric = table[:, 2:]
+        numeric[numeric == ''] = '0'
+        numeric = _parse_numbers(numeric, np.float32).reshape(-1, n - 2)
+        self.conf = numeric[:, 0]
+        self.boxes = numeric[:, 1:]
+        names, cls = np.unique(table[:, 1], return_inverse=True)
+        if len(names) and names[0] == '':
+            names, cls = names[1:], cls - 1
+        self.names = names.tolist()
+        index = {name: i for i, name in enumerate(self.names)}
+        self.cls = np.where(empty, -1, cls).astype(np.int32)
+
+        # 每帧第一个接触点，与实时检测时写入曲线的点一致
+        cp_cls = index.get(CONTACT_NAME, -2)
+        cp_rows = np.flatnonzero(self.cls == cp_cls)
+        cp_frames, first = np.unique(self.frames[cp_rows], return_index=True)
+        cp_boxes = self.boxes[cp_rows[first]]
+        self.cp_frames = cp_frames
+        self.cp_x = (cp_boxes[:, 0] + cp_boxes[:, 2]) / 2
+        self.cp_y = (cp_boxes[:, 1] + cp_boxes[:, 3]) / 2
+        logging.info(f"加载检测结果 {path}: {len(np.unique(self.frames))} 帧, {int((self.cls >= 0).sum())} 个检测框")
+
+    @property
+    def first_frame(self):
+        return int(self.frames[0])
+
+    @property
+    def last_frame(self):
+        return int(self.frames[-1])
+
+    def has(self, frame_number):
+        lo, hi = np.searchsorted(self.frames, [frame_number, frame_number + 1])
+        return hi > lo
+
+    def get(self, frame_number):
+        """一帧的检测框 [(xyxy, conf, 类别名)]，格式同 YOLOv5Model.last_detections"""
+        lo, hi = np.searchsorted(self.frames, [frame_number, frame_number + 1])
+        return [(self.boxes[i].tolist(), float(self.conf[i]), self.names[self.cls[i]])
+                for i in range(lo, hi) if self.cls[i] >= 0]
+
+    def contact_points(self, frame_number):
+        return [((xyxy[0] + xyxy[2]) / 2, (xyxy[1] + xyxy[3]) / 2)
+                for xyxy, conf, name in self.get(frame_number) if name == CONTACT_NAME]
+
+    def contact_range(self, start, end):
+        """帧号在 [start, end] 内的接触点曲线数据 (帧号, x, y)"""
+        lo, hi = np.searchsorted(self.cp_frames, [start, end + 1])
+        return self.cp_frames[lo:hi].tolist(), self.cp_x[lo:hi].tolist(), self.cp_y[lo:hi].tolist()
+
+
+def render(log, video_path, out_path, overlay=None):
+    """不做推理，按记录的检测结果把整段视频画好框写出，返回帧数"""
+    overlay = overlay or OverlayRenderer()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    n = 0
+    t0 = time.perf_counter()
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            n += 1
+            # 与 next_frame 一致，帧号从 1 开始
+            writer.write(overlay.draw(frame, log.get(n)))
+    finally:
+        cap.release()
+        writer.release()
+    elapsed = time.perf_counter() - t0
+    logging.info(f"回放渲染 {n} 帧, 用时 {elapsed:.1f}s ({n / max(elapsed, 1e-6):.0f} 帧/秒): {out_path}")
+    return n
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='按记录的检测结果渲染标注视频(不做推理)')
+    parser.add_argument('detections', help='detections_*.csv')
+    parser.add_argument('--video', default='', help='默认取记录文件里的 source')
+    parser.add_argument('--out', default='replay.mp4')
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    log = DetectionLog(opt.detections)
+    render(log, opt.video or log.source, opt.out)
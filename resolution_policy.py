@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+推理输入尺寸动态调整
+模型预先对一组输入尺寸做好预热，本策略根据延迟和接触点的大小/置信度在各尺寸间切换:
+- 超出延迟预算，或接触点足够大且置信度高 -> 降一档
+- 接触点置信度下降或丢失 -> 升一档，但预计升档后的延迟超过 预算×headroom 时不升
+每个尺寸各自记录延迟的滑动平均，升档前用目标尺寸的实测值判断；没测过或实测值已超过 stale_frames 帧没有更新
+(负载可能早已变化)时按像素数从当前档估算，长时间运行的相机不会因为一次高负载永远停在小尺寸。
+切换后的第一帧包含形状校验/编译等一次性开销，不计入统计。降档阈值(预算)和升档阈值(预算×headroom)之间留出回差，慢机器上不会在两档之间来回切换。
+每次切换后冷却若干帧，防止来回抖动。性能较弱的工控机可以保持实时，又不会永久损失精度。
+换视频源或跳转后调用 reset() 从最大尺寸重新开始。
+"""
+import logging
+
+CONTACT = 'contact point'
+
+
+class ResolutionPolicy:
+    def __init__(self, sizes=(416, 512, 640), budget_ms=40.0, conf_high=0.6, conf_low=0.4,
+                 min_object_px=24, cooldown=30, ewma=0.1, headroom=0.85, stale_frames=900):
+        self.sizes = sorted(sizes)
+        self.budget_ms = budget_ms
+        self.conf_high = conf_high
+        self.conf_low = conf_low
+        self.min_object_px = min_object_px   # 接触点短边在网络输入上至少要有这么多像素才允许降档
+        self.cooldown = cooldown
+        self.ewma = ewma
+        self.headroom = headroom             # 升档要求预计延迟不超过 预算×headroom
+        self.stale_frames = stale_frames     # 其他尺寸的实测值超过这么多帧未更新就不再采信
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        """回到最大尺寸，清空各尺寸的延迟统计"""
+        self.index = len(self.sizes) - 1     # 从最大尺寸开始
+        self.size_latency = {}               # 尺寸 -> 延迟滑动平均(ms)
+        self._measured_at = {}               # 尺寸 -> 最后一次更新时的帧计数
+        self._frames = 0
+        self._since_change = 0
+
+    @property
+    def size(self):
+        return self.sizes[self.index]
+
+    @property
+    def latency_ms(self):
+        """当前尺寸的延迟滑动平均"""
+        return self.size_latency.get(self.size)
+
+    def expected_latency(self, index):
+        """某一档的预计延迟：有近期实测值用实测值，否则按输入像素数从当前档推算"""
+        size = self.sizes[index]
+        if size in self.size_latency and self._frames - self._measured_at[size] <= self.stale_frames:
+            return self.size_latency[size]
+        return self.latency_ms * (size / self.size) ** 2
+
+    def update(self, latency_ms, detections, img_shape):
+        """每次推理后调用，返回新的输入尺寸；不需要切换时返回 None"""
+        self._frames += 1
+        if self._since_change > 0:
+            prev = self.latency_ms
+            self.size_latency[self.size] = latency_ms if prev is None else \
+                (1 - self.ewma) * prev + self.ewma * latency_ms
+            self._measured_at[self.size] = self._frames
+        self._since_change += 1
+        if not self.enabled or self._since_change < self.cooldown or self.latency_ms is None:
+            return None
+
+        contacts = [(xyxy, conf) for xyxy, conf, name in detections if name == CONTACT]
+        best = max(contacts, key=lambda c: c[1]) if contacts else None
+
+        # 实时性是硬约束，先看延迟
+        if self.index > 0 and self.latency_ms > self.budget_ms:
+            return self._step(-1, f"延迟 {self.latency_ms:.1f}ms 超出预算 {self.budget_ms:.0f}ms")
+
+        # 置信度下降或丢失：精度优先，升一档(升档后仍留有余量才升)
+        if (best is None or best[1] < self.conf_low) and self.index < len(self.sizes) - 1:
+            expected = self.expected_latency(self.index + 1)
+            if expected <= self.budget_ms * self.headroom:
+                return self._step(+1, f"{'置信度低' if best else '接触点丢失'}, 预计延迟 {expected:.1f}ms")
+            return None
+
+        if self.index > 0:
+            if best is not None and best[1] >= self.conf_high:
+                xyxy = best[0]
+                short_side = min(xyxy[2] - xyxy[0], xyxy[3] - xyxy[1])
+                # 换算到下一档输入尺寸上的像素数
+                scale = self.sizes[self.index - 1] / max(img_shape[:2])
+                if short_side * scale >= self.min_object_px:
+                    return self._step(-1, f"接触点较大({short_side:.0f}px)且置信度 {best[1]:.2f}")
+        return None
+
+    def _step(self, direction, reason):
+        old = self.size
+        self.index += direction
+        self._since_change = 0
+        logging.info(f"输入尺寸 {old} -> {self.size}: {reason}")
+        return self.size
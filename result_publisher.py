@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+检测结果实时发布
+每帧的检测框和接触点打包成紧凑的二进制(或 JSON)消息，通过 UDP 组播(或单播)发出，
+下游的线路报警逻辑直接订阅，不必再轮询 CSV 文件。
+
+publish() 只把结果放进有界队列就返回，由后台线程编码并发送；队列满时丢弃最旧的消息(新鲜度优先)，
+慢订阅者或网络问题都不会阻塞 next_frame。发布延迟(入队到发出)和丢弃数写入 METRICS。
+
+二进制格式(小端):
+    头   <4s B B H I d d h f f   magic 'PCR1', 版本, 路号(主窗口 0, 多路监测 1..n), 检测数, 序号,
+                                 发送时刻(epoch 秒, 后台线程发出前取), 媒体时间(ms),
+                                 接触点标志(1 有 / 0 无) 占 h, 接触点 x, y
+    帧号 <q
+    每个检测 <H f f f f f        类别序号, 置信度, x1, y1, x2, y2
+
+本机测试:
+    python result_publisher.py listen                        # 订阅并打印，显示端到端延迟
+    RESULT_PUBLISH=239.255.42.99:5007 python MainQt.py       # 界面端开启发布
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+from metrics_server import METRICS
+
+MAGIC = b'PCR1'
+VERSION = 1
+_HEAD = struct.Struct('<4sBBHIddhff')
+_FRAME = struct.Struct('<q')
+_DET = struct.Struct('<Hfffff')
+DEFAULT_GROUP = '239.255.42.99'
+DEFAULT_PORT = 5007
+
+
+def _is_multicast(host):
+    try:
+        return 224 <= int(host.split('.')[0]) <= 239
+    except ValueError:
+        return False
+
+
+def encode_binary(seq, stream, frame_number, pos_msec, detections, contact_points, class_index):
+    cp = contact_points[0] if contact_points else (0.0, 0.0)
+    parts = [_HEAD.pack(MAGIC, VERSION, stream, len(detections), seq & 0xFFFFFFFF, time.time(),
+                        pos_msec or 0.0, 1 if contact_points else 0, cp[0], cp[1]),
+             _FRAME.pack(int(frame_number))]
+    for xyxy, conf, name in detections:
+        parts.append(_DET.pack(class_index.get(name, 0xFFFF), conf, *xyxy))
+    return b''.join(parts)
+
+
+def encode_json(seq, stream, frame_number, pos_msec, detections, contact_points):
+    msg = {'seq': seq, 'stream': stream, 'frame': int(frame_number), 't': time.time(), 'pos_msec': pos_msec,
+           'contact': list(contact_points[0]) if contact_points else None,
+           'dets': [[name, round(conf, 4)] + [round(v, 1) for v in xyxy] for xyxy, conf, name in detections]}
+    return json.dumps(msg, separators=(',', ':')).encode('utf-8')
+
+
+def decode(data, names=None):
+    """解析一条消息(二进制或 JSON)，返回 dict，格式同 encode_json"""
+    if not data.startswith(MAGIC):
+        return json.loads(data.decode('utf-8'))
+    _, version, stream, n, seq, t, pos_msec, has_cp, cx, cy = _HEAD.unpack_from(data, 0)
+    (frame,) = _FRAME.unpack_from(data, _HEAD.size)
+    offset = _HEAD.size + _FRAME.size
+    dets = []
+    for i in range(n):
+        cls, conf, x1, y1, x2, y2 = _DET.unpack_from(data, offset + i * _DET.size)
+        name = names[cls] if names and cls < len(names) else cls
+        dets.append([name, conf, x1, y1, x2, y2])
+    return {'seq': seq, 'stream': stream, 'frame': frame, 't': t, 'pos_msec': pos_msec,
+            'contact': [cx, cy] if has_cp else None, 'dets': dets}
+
+
+class ResultPublisher:
+    def __init__(self, host=DEFAULT_GROUP, port=DEFAULT_PORT, names=(), fmt='binary', queue_size=256,
+                 ttl=1, interface=None):
+        self.addr = (host, port)
+        self.fmt = fmt
+        self.class_index = {name: i for i, name in enumerate(names)}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._seq_lock = threading.Lock()   # 主窗口和多路监测的工作线程可能同时发布
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if _is_multicast(host):
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            # 本机订阅者也能收到，测试客户端可以完全跑在 localhost 上
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            if interface:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        self.sock.setblocking(False)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logging.info(f"结果发布已启动: udp://{host}:{port} ({fmt})")
+
+    def publish(self, frame_number, pos_msec, detections, contact_points, stream=0):
+        """
+        可在界面线程或多路监测的工作线程调用，只入队。编码放在后台线程发送前进行，消息里的发送时刻不含排队时间，
+        订阅端算出的延迟就是网络延迟。detections 入队后调用方不能再原地修改
+        """
+        with self._seq_lock:
+            self.seq += 1
+            seq = self.seq
+        item = (time.perf_counter(), (seq, stream, frame_number, pos_msec, detections, contact_points))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # 丢最旧的一条，保证订阅者拿到的是最新结果
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._drop('queue_full')
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._drop('queue_full')
+
+    def _drop(self, reason):
+        self.dropped += 1
+        METRICS.inc('publish_dropped_total', reason=reason)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                t_enqueue, fields = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self.fmt == 'json':
+                data = encode_json(*fields)
+            else:
+                data = encode_binary(*fields, self.class_index)
+            try:
+                self.sock.sendto(data, self.addr)
+            except (BlockingIOError, InterruptedError):
+                self._drop('socket_busy')
+                continue
+            except OSError as e:
+                self._drop('send_error')
+                logging.debug(f"结果发布失败: {str(e)}")
+                continue
+            self.sent += 1
+            METRICS.observe('publish_latency_seconds', time.perf_counter() - t_enqueue)
+            METRICS.inc('published_total')
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self.sock.close()
+        logging.info(f"结果发布已停止: 发送 {self.sent}, 丢弃 {self.dropped}")
+
+
+def start_from_env(names=(), var='RESULT_PUBLISH'):
+    """环境变量 RESULT_PUBLISH=地址:端口[/json] 配置了才启动，返回 ResultPublisher 或 None"""
+    spec = os.environ.get(var, '').strip()
+    if not spec:
+        return None
+    fmt = 'binary'
+    if spec.endswith('/json'):
+        spec, fmt = spec[:-5], 'json'
+    host, _, port = spec.rpartition(':')
+    try:
+        return ResultPublisher(host or DEFAULT_GROUP, int(port or DEFAULT_PORT), names=names, fmt=fmt)
+    except (OSError, ValueError) as e:
+        logging.error(f"结果发布启动失败 {spec}: {str(e)}")
+        return None
+
+
+def subscribe(host=DEFAULT_GROUP, port=DEFAULT_PORT, timeout=None):
+    """订阅并逐条返回原始消息，组播地址会加入组"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if _is_multicast(host):
+        sock.bind(('', port))
+        mreq = struct.pack('4s4s', socket.inet_aton(host), socket.inet_aton('0.0.0.0'))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    else:
+        sock.bind((host, port))
+    sock.settimeout(timeout)
+    try:
+        while True:
+            try:
+                data, _ = sock.recvfrom(65535)
+            except socket.timeout:
+                return
+            yield data
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='检测结果订阅(测试客户端)')
+    parser.add_argument('cmd', choices=['listen'])
+    parser.add_argument('--host', default=DEFAULT_GROUP)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--names', default='', help='逗号分隔的类别名，按模型类别顺序')
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    names = opt.names.split(',') if opt.names else None
+    last_seq = None
+    lost = 0
+    for data in subscribe(opt.host, opt.port):
+        msg = decode(data, names)
+        if last_seq is not None and msg['seq'] > last_seq + 1:
+            lost += msg['seq'] - last_seq - 1
+        last_seq = msg['seq']
+        latency_ms = (time.time() - msg['t']) * 1000
+        print(f"#{msg['seq']} 路{msg['stream']} 帧 {msg['frame']} 接触点 {msg['contact']} "
+              f"检测 {len(msg['dets'])} 延迟 {latency_ms:.2f}ms 丢失 {lost}")
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+视频帧索引与精确定位
+对视频做一次只 grab 不解码的扫描，记录每帧的时间戳和关键帧位置，保存为旁挂文件 <视频>.idx.npz。
+之后定位到任意帧: 先跳到目标之前最近的关键帧，再用时间戳核对实际位置，向前 grab 到目标帧，
+不依赖容器自身(往往不准的)帧号定位。3 小时视频里复查 30 秒的事件不必从头解码。
+
+帧号约定与 MainWindow 一致: 帧号 F 表示读完该帧后 CAP_PROP_POS_FRAMES 的值(从 1 开始)。
+"""
+import logging
+import os
+import re
+
+import cv2
+import numpy as np
+
+
+class SeekIndex:
+    def __init__(self, video_path, build=True):
+        self.video_path = str(video_path)
+        self.index_path = self.video_path + '.idx.npz'
+        self.pts_ms = None          # 每帧时间戳(ms)，下标为 0 起的帧序号
+        self.keyframes = None       # 关键帧的 0 起序号；容器不提供时为 None
+        if not self._load() and build:
+            self.build()
+
+    def _source_meta(self):
+        st = os.stat(self.video_path)
+        return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            data = np.load(self.index_path)
+            if not np.array_equal(data['meta'], self._source_meta()):
+                return False
+            self.pts_ms = data['pts_ms']
+            self.keyframes = data['keyframes'] if data['has_keyframes'] else None
+            return True
+        except (OSError, KeyError, ValueError):
+            return False
+
+    def build(self):
+        """扫描整个视频，只 grab 不解码；FFmpeg 后端支持时用原始包模式读取关键帧标志"""
+        cap = cv2.VideoCapture(self.video_path)
+        raw = hasattr(cv2, 'CAP_PROP_LRF_HAS_KEY_FRAME') and cap.set(cv2.CAP_PROP_FORMAT, -1)
+        pts, keys = [], []
+        while cap.grab():
+            pts.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+            if raw and cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keys.append(len(pts) - 1)
+        cap.release()
+
+        self.pts_ms = np.asarray(pts, dtype=np.float64)
+        self.keyframes = np.asarray(keys, dtype=np.int64) if keys else None
+        np.savez(self.index_path, pts_ms=self.pts_ms, meta=self._source_meta(),
+                 keyframes=self.keyframes if self.keyframes is not None else np.empty(0, np.int64),
+                 has_keyframes=self.keyframes is not None)
+        logging.info(f"视频索引完成: {len(self.pts_ms)} 帧, "
+                     f"关键帧 {len(keys) if keys else '未知'}, 保存到 {self.index_path}")
+
+    def __len__(self):
+        return 0 if self.pts_ms is None else len(self.pts_ms)
+
+    # ---------- 帧号 / 时间换算 ----------
+    def frame_at_time(self, ms):
+        """时间(ms) -> 帧号(从 1 开始)"""
+        i = int(np.searchsorted(self.pts_ms, ms, side='left'))
+        return min(max(i, 0), len(self) - 1) + 1
+
+    def time_of_frame(self, frame_number):
+        return float(self.pts_ms[min(max(frame_number - 1, 0), len(self) - 1)])
+
+    def _index_of_pts(self, ms):
+        """根据 grab 后读到的时间戳反查 0 起序号，对不上(超过半帧)返回 None"""
+        if not len(self):
+            return None
+        i = int(np.clip(np.searchsorted(self.pts_ms, ms), 0, len(self) - 1))
+        cand = [j for j in (i - 1, i) if j >= 0]
+        j = min(cand, key=lambda k: abs(self.pts_ms[k] - ms))
+        tol = np.median(np.diff(self.pts_ms)) / 2 if len(self) > 1 else 1.0
+        return j if abs(self.pts_ms[j] - ms) <= tol else None
+
+    # ---------- 定位 ----------
+    def seek(self, cap, frame_number, max_attempts=4):
+        """
+        定位 cap，使下一次 read 返回帧号为 frame_number 的帧。
+        返回定位后已消费的帧数(即 frame_number - 1)，失败时退回 cap.set 并返回 None
+        """
+        target = min(max(frame_number - 1, 0), max(len(self) - 1, 0))   # 下一次要读的 0 起序号
+        if target == 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return 0
+        # 先停在 target 之前的某帧上(grab 后核对时间戳)，再逐帧 grab 到 target - 1
+        start = target - 1
+        if self.keyframes is not None and len(self.keyframes):
+            k = int(np.searchsorted(self.keyframes, start, side='right')) - 1
+            if k >= 0:
+                start = int(self.keyframes[k])
+        back = 0
+        for _ in range(max_attempts):
+            s = max(start - back, 0)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, s)
+            if not cap.grab():
+                break
+            actual = self._index_of_pts(cap.get(cv2.CAP_PROP_POS_MSEC))
+            if actual is not None and actual <= target - 1:
+                while actual < target - 1:
+                    if not cap.grab():
+                        return None
+                    actual += 1
+                return target
+            # 容器定位越过了目标，往前多退一些再试
+            back = back * 2 if back else 16
+        logging.warning(f"精确定位失败，退回容器定位: 帧 {frame_number}")
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        return None
+
+
+def parse_position(token, index=None):
+    """
+    解析单个位置，返回帧号
+    支持帧号 "1200"，秒 "70s"，时分秒 "01:10:05"；按时间定位需要 SeekIndex
+    """
+    token = token.strip()
+    if re.fullmatch(r'\d+', token):
+        return int(token)
+    if re.fullmatch(r'[\d.]+s', token):
+        seconds = float(token[:-1])
+    elif re.fullmatch(r'(\d+:)?\d+:[\d.]+', token):
+        seconds = 0.0
+        for field in token.split(':'):
+            seconds = seconds * 60 + float(field)
+    else:
+        raise ValueError(f"无法解析 {token}")
+    if index is None:
+        raise ValueError("按时间定位需要先建立视频索引")
+    return index.frame_at_time(seconds * 1000)
+
+
+def parse_range(text, index=None):
+    """解析区间文本 "起始-结束"，两端格式同 parse_position，返回 (起始帧号, 结束帧号)"""
+    parts = [p for p in re.split(r'\s*[-~]\s*', text.strip()) if p]
+    if len(parts) != 2:
+        raise ValueError("格式应为 起始-结束")
+    start, end = parse_position(parts[0], index), parse_position(parts[1], index)
+    if end < start:
+        start, end = end, start
+    return start, end
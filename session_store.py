@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+检测记录会话库 (SQLite)
+每次检测生成的 coordinate_data_*.csv 导入到 results/sessions.db:
+- sessions: 每个记录文件一行，含相机、起止时间、帧率、x/y 均值
+- points: 逐帧接触点，主键 (session_id, t)，t 为采样时刻(记录文件的 timestamp 列)，按时间查询直接走主键
+- minute_summary: 每会话每分钟的点数/和/平方和/极值，可合并，跨月的统计和超限筛选只扫这张表
+
+超限查询先在分钟汇总里筛出极值超过阈值的分钟，再只取这些分钟的逐帧数据，
+几个月的巡检记录也能在毫秒级返回，不必再逐个解析 CSV。
+
+记录里的帧号是视频/相机的绝对帧号(中途开始检测、跳转、倍速播放都会使它与时间脱节)，不能用来换算时间：
+新记录每行带 timestamp(epoch 秒)；没有该列的旧记录按 起始时间 + (帧号 - 首帧帧号) / fps 估算。
+相机名取自文件名 coordinate_data_<相机>_<时间>.csv，由记录时的实际数据源生成(camera_tag)。
+
+    python session_store.py ingest results/
+    python session_store.py excursions --threshold 80 --since 7d
+    python session_store.py summary --since 2024-05-01 --until 2024-05-02 --camera cam0
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from trajectory_analysis import iter_chunks
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "sessions.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    source TEXT UNIQUE NOT NULL,
+    source_size INTEGER,
+    camera TEXT,
+    started_at REAL,
+    ended_at REAL,
+    fps REAL,
+    frames INTEGER,
+    x_mean REAL,
+    y_mean REAL,
+    ingested_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_camera_time ON sessions(camera, started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_time ON sessions(started_at, ended_at);
+CREATE TABLE IF NOT EXISTS points (
+    session_id INTEGER NOT NULL,
+    t REAL NOT NULL,
+    frame INTEGER NOT NULL,
+    x REAL,
+    y REAL,
+    reused INTEGER DEFAULT 0,
+    PRIMARY KEY (session_id, t)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minute_summary (
+    session_id INTEGER NOT NULL,
+    minute INTEGER NOT NULL,
+    n INTEGER,
+    x_sum REAL, x_sq REAL, x_min REAL, x_max REAL,
+    y_sum REAL, y_sq REAL, y_min REAL, y_max REAL,
+    PRIMARY KEY (session_id, minute)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_minute ON minute_summary(minute);
+"""
+
+_SCHEMA_VERSION = 2              # 2: points 以采样时刻为键
+_NAME_RE = re.compile(r'coordinate_data_(?:(?P<camera>.+)_)?(?P<ts>\d{8}_\d{6})\.csv$')
+DEFAULT_CAMERA = 'main'
+
+
+def camera_tag(src):
+    """记录文件名里的相机名：相机索引 -> camera<索引>，流地址取主机+路径，视频文件取文件名(去扩展名)"""
+    if isinstance(src, int) or (isinstance(src, str) and src.isdigit()):
+        return f'camera{int(src)}'
+    src = str(src).rstrip('/')
+    if '://' in src:
+        stem = src.split('://', 1)[1].rsplit('@', 1)[-1]       # 去掉协议和账号密码
+    else:
+        stem = os.path.splitext(os.path.basename(src))[0]
+    return re.sub(r'[^0-9A-Za-z\-]+', '-', stem).strip('-') or DEFAULT_CAMERA
+
+
+def parse_time(value):
+    """时间参数：epoch 秒、datetime、'2024-05-01[ 12:00[:00]]' 或相对时间 '7d' / '12h' / '30m'"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)([dhm])', value.strip())
+    if m:
+        return time.time() - float(m.group(1)) * {'d': 86400, 'h': 3600, 'm': 60}[m.group(2)]
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value.strip(), fmt).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"无法解析时间 {value}")
+
+
+class SessionStore:
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < _SCHEMA_VERSION and conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'points'").fetchone():
+                # 库只是 CSV 的索引，旧格式直接重建，下次 ingest 重新导入
+                logging.warning(f"会话库 {db_path} 为旧格式，重建后需重新导入记录")
+                conn.executescript("DROP TABLE points; DROP TABLE minute_summary; DROP TABLE sessions;")
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    @contextmanager
+    def _connect(self):
+        """每次调用单独连接(用完关闭)，界面线程和后台导入线程可以同时使用；正常退出时提交"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- 导入 ----------
+    def ingest_csv(self, csv_path, camera=None, started_at=None, fps=30.0, chunk_size=200_000):
+        """
+        导入一个记录文件，返回 session id；同一文件已导入且大小未变时跳过。
+        起始时间和相机默认从文件名 coordinate_data_[相机_]YYYYmmdd_HHMMSS.csv 解析；
+        逐点时间取 timestamp 列，旧记录没有该列时按首帧对齐到起始时间估算
+        """
+        source = os.path.abspath(csv_path)
+        size = os.path.getsize(source)
+        m = _NAME_RE.search(os.path.basename(source))
+        if camera is None:
+            camera = (m.group('camera') if m and m.group('camera') else DEFAULT_CAMERA)
+        if started_at is None:
+            started_at = datetime.strptime(m.group('ts'), '%Y%m%d_%H%M%S').timestamp() if m \
+                else os.path.getmtime(source)
+        started_at = parse_time(started_at)
+
+        with open(source, 'r', encoding='utf-8') as f:
+            header = f.readline().strip().split(',')
+        columns = ('frame_number', 'x_center', 'y_center') + tuple(c for c in ('reused', 'timestamp') if c in header)
+        col = {c: i for i, c in enumerate(columns)}
+
+        t0 = time.perf_counter()
+        with self._connect() as conn:
+            row = conn.execute("SELECT id, source_size FROM sessions WHERE source = ?", (source,)).fetchone()
+            if row is not None:
+                if row['source_size'] == size:
+                    return row['id']
+                # 文件又写入了新数据：整体重新导入
+                self._delete_session(conn, row['id'])
+            cur = conn.execute(
+                "INSERT INTO sessions (source, source_size, camera, started_at, fps, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (source, size, camera, started_at, fps, time.time()))
+            sid = cur.lastrowid
+
+            minutes = {}
+            n = 0
+            sum_x = sum_y = 0.0
+            first_frame = None
+            t_max = started_at
+            for block in iter_chunks(source, chunk_size, columns):
+                frames = block[:, 0].astype(np.int64)
+                x, y = block[:, 1], block[:, 2]
+                reused = block[:, col['reused']].astype(np.int64) if 'reused' in col \
+                    else np.zeros(len(block), np.int64)
+                if 'timestamp' in col:
+                    t = block[:, col['timestamp']]
+                else:
+                    first_frame = int(frames[0]) if first_frame is None else first_frame
+                    t = started_at + (frames - first_frame) / fps
+                conn.executemany(
+                    "INSERT OR REPLACE INTO points (session_id, t, frame, x, y, reused) VALUES (?, ?, ?, ?, ?, ?)",
+                    zip([sid] * len(frames), t.tolist(), frames.tolist(), x.tolist(), y.tolist(), reused.tolist()))
+                self._accumulate_minutes(minutes, t, x, y)
+                n += len(block)
+                sum_x += float(x.sum())
+                sum_y += float(y.sum())
+                t_max = max(t_max, float(t.max()))
+
+            conn.executemany(
+                "INSERT INTO minute_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(sid, minute) + tuple(v) for minute, v in minutes.items()])
+            conn.execute(
+                "UPDATE sessions SET ended_at = ?, frames = ?, x_mean = ?, y_mean = ? WHERE id = ?",
+                (t_max, n, sum_x / n if n else None, sum_y / n if n else None, sid))
+        logging.info(f"会话库导入 {os.path.basename(source)}: {n} 点, {len(minutes)} 分钟, "
+                     f"耗时 {time.perf_counter() - t0:.2f}s")
+        return sid
+
+    @staticmethod
+    def _accumulate_minutes(minutes, t, x, y):
+        """按分钟分组累加 n/和/平方和/极值(可跨块合并)"""
+        keys = np.floor(t / 60).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        keys, x, y = keys[order], x[order], y[order]
+        uniq, starts = np.unique(keys, return_index=True)
+        bounds = np.append(starts, len(keys))
+        for k, a, b in zip(uniq.tolist(), bounds[:-1], bounds[1:]):
+            xs, ys = x[a:b], y[a:b]
+            v = [int(b - a), float(xs.sum()), float((xs ** 2).sum()), float(xs.min()), float(xs.max()),
+                 float(ys.sum()), float((ys ** 2).sum()), float(ys.min()), float(ys.max())]
+            old = minutes.get(k)
+            if old is not None:
+                v = [old[0] + v[0], old[1] + v[1], old[2] + v[2], min(old[3], v[3]), max(old[4], v[4]),
+                     old[5] + v[5], old[6] + v[6], min(old[7], v[7]), max(old[8], v[8])]
+            minutes[k] = v
+
+    @staticmethod
+    def _delete_session(conn, sid):
+        conn.execute("DELETE FROM points WHERE session_id = ?", (sid,))
+        conn.execute("DELETE FROM minute_summary WHERE session_id = ?", (sid,))
+        conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def ingest_dir(self, folder, fps=30.0):
+        """导入目录下全部记录文件(已导入且未变化的跳过)"""
+        ids = []
+        for name in sorted(os.listdir(folder)):
+            if _NAME_RE.search(name):
+                try:
+                    ids.append(self.ingest_csv(os.path.join(folder, name), fps=fps))
+                except Exception as e:
+                    logging.error(f"导入 {name} 失败: {str(e)}")
+        return ids
+
+    # ---------- 查询 ----------
+    def sessions(self, since=None, until=None, camera=None):
+        sql = "SELECT * FROM sessions WHERE ended_at >= ? AND started_at <= ?"
+        args = [parse_time(since) or 0, parse_time(until) or float('inf')]
+        if camera:
+            sql += " AND camera = ?"
+            args.append(camera)
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(sql + " ORDER BY started_at", args)]
+
+    def points(self, since=None, until=None, camera=None):
+        """时间范围内的逐帧数据，返回 [(session_id, 时间, frame, x, y)]；按会话取时间区间走主键"""
+        since, until = parse_time(since) or 0, parse_time(until) or 4e12
+        out = []
+        with self._connect() as conn:
+            for s in self.sessions(since, until, camera):
+                for r in conn.execute("SELECT t, frame, x, y FROM points WHERE session_id = ? AND t BETWEEN ? AND ?",
+                                      (s['id'], since, until)):
+                    out.append((s['id'], r['t'], r['frame'], r['x'], r['y']))
+        return out
+
+    def minute_summaries(self, since=None, until=None, camera=None):
+        """每分钟汇总(多个会话同一分钟合并)：[(分钟起始时间, n, x均值, x标准差, x最小, x最大, y均值, y标准差, y最小, y最大)]"""
+        since, until = parse_time(since) or 0, parse_time(until) or 4e12
+        sql = ("SELECT m.minute, SUM(m.n) n, SUM(m.x_sum) xs, SUM(m.x_sq) xq, MIN(m.x_min) x0, MAX(m.x_max) x1, "
+               "SUM(m.y_sum) ys, SUM(m.y_sq) yq, MIN(m.y_min) y0, MAX(m.y_max) y1 "
+               "FROM minute_summary m JOIN sessions s ON s.id = m.session_id "
+               "WHERE m.minute BETWEEN ? AND ?")
+        args = [int(since // 60), int(until // 60)]
+        if camera:
+            sql += " AND s.camera = ?"
+            args.append(camera)
+        sql += " GROUP BY m.minute ORDER BY m.minute"
+        out = []
+        with self._connect() as conn:
+            for r in conn.execute(sql, args):
+                n = r['n']
+                x_mean, y_mean = r['xs'] / n, r['ys'] / n
+                x_std = max(r['xq'] / n - x_mean ** 2, 0.0) ** 0.5
+                y_std = max(r['yq'] / n - y_mean ** 2, 0.0) ** 0.5
+                out.append((r['minute'] * 60, n, x_mean, x_std, r['x0'], r['x1'], y_mean, y_std, r['y0'], r['y1']))
+        return out
+
+    def excursions(self, threshold, axis='x', since=None, until=None, camera=None, reference=None):
+        """
+        偏离参考值超过 threshold 的点，返回 [(session_id, 时间, frame, x, y)]。
+        reference 为 None 时以各会话的均值为参考(拉出值中心)。先用分钟极值筛选，再取逐帧数据
+        """
+        if axis not in ('x', 'y'):
+            raise ValueError("axis 只能是 x 或 y")
+        since, until = parse_time(since) or 0, parse_time(until) or 4e12
+        ref_sql = "?" if reference is not None else f"s.{axis}_mean"
+        sql = (f"SELECT m.session_id, m.minute, {ref_sql} ref "
+               f"FROM minute_summary m JOIN sessions s ON s.id = m.session_id "
+               f"WHERE m.minute BETWEEN ? AND ? "
+               f"AND MAX(ABS(m.{axis}_max - {ref_sql}), ABS(m.{axis}_min - {ref_sql})) > ?")
+        args = ([reference] if reference is not None else []) + [int(since // 60), int(until // 60)] + \
+               ([reference, reference] if reference is not None else []) + [threshold]
+        if camera:
+            sql += " AND s.camera = ?"
+            args.append(camera)
+        out = []
+        with self._connect() as conn:
+            for m in conn.execute(sql + " ORDER BY m.minute", args).fetchall():
+                t0, t1 = max(m['minute'] * 60, since), min(m['minute'] * 60 + 60, until)
+                for r in conn.execute(f"SELECT t, frame, x, y FROM points WHERE session_id = ? "
+                                      f"AND t >= ? AND t < ? AND ABS({axis} - ?) > ?",
+                                      (m['session_id'], t0, t1, m['ref'], threshold)):
+                    out.append((m['session_id'], r['t'], r['frame'], r['x'], r['y']))
+        return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='检测记录会话库')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('ingest', help='导入记录文件或目录')
+    p.add_argument('path')
+    p.add_argument('--fps', type=float, default=30.0)
+    for name in ('excursions', 'summary', 'sessions'):
+        p = sub.add_parser(name)
+        p.add_argument('--since', default=None)
+        p.add_argument('--until', default=None)
+        p.add_argument('--camera', default=None)
+        if name == 'excursions':
+            p.add_argument('--threshold', type=float, required=True)
+            p.add_argument('--axis', default='x')
+            p.add_argument('--reference', type=float, default=None)
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    store = SessionStore(opt.db)
+    t0 = time.perf_counter()
+    if opt.cmd == 'ingest':
+        if os.path.isdir(opt.path):
+            store.ingest_dir(opt.path, fps=opt.fps)
+        else:
+            store.ingest_csv(opt.path, fps=opt.fps)
+    elif opt.cmd == 'sessions':
+        for s in store.sessions(opt.since, opt.until, opt.camera):
+            print(f"{s['id']:>5} {s['camera']:<8} {datetime.fromtimestamp(s['started_at']):%Y-%m-%d %H:%M:%S} "
+                  f"{s['frames']:>9} 点  {s['source']}")
+    elif opt.cmd == 'summary':
+        for t, n, xm, xs, x0, x1, ym, ys, y0, y1 in store.minute_summaries(opt.since, opt.until, opt.camera):
+            print(f"{datetime.fromtimestamp(t):%Y-%m-%d %H:%M}  n={n:<6} x={xm:.1f}±{xs:.1f} [{x0:.0f}, {x1:.0f}]  "
+                  f"y={ym:.1f}±{ys:.1f} [{y0:.0f}, {y1:.0f}]")
+    else:
+        rows = store.excursions(opt.threshold, opt.axis, opt.since, opt.until, opt.camera, opt.reference)
+        for sid, t, frame, x, y in rows:
+            print(f"{datetime.fromtimestamp(t):%Y-%m-%d %H:%M:%S.%f}  会话 {sid}  帧 {frame}  x={x:.1f} y={y:.1f}")
+        print(f"共 {len(rows)} 个超限点")
+    logging.info(f"耗时 {(time.perf_counter() - t0) * 1000:.1f} ms")
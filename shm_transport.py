@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+采集进程与推理进程之间的共享内存帧传输
+multiprocessing.shared_memory 里放一个固定槽位的环形缓冲，采集进程把解码后的 BGR 帧直接写进槽位，
+持有 YOLOv5Model 的进程按序号读取，帧不经过 pickle 和管道。
+每个槽位用序号做版本号(写入中为 -1)。读端拿到的是共享内存上的视图，写端随时可能覆盖，
+所以要么拷贝出来再用 is_valid(seq) 确认拷贝期间没有被覆盖(read(copy=True) 即如此)，
+要么只在视图上做只读处理，处理完再检查 is_valid(seq)，失效则丢弃结果。
+
+SharedMemorySource 把这一套包装成与 cv2.VideoCapture 兼容的数据源：相机在子进程里采集和解码，
+主进程只做一次内存拷贝取出最新帧，解码不再与界面和推理争抢 GIL。
+主窗口设置环境变量 CAPTURE_PROCESS=1 后，相机改用该数据源。
+
+内存布局:
+    [全局头 16×int64] [槽位头 n_slots×8×int64] [槽位数据 n_slots×max_h×max_w×3]
+"""
+import logging
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from camera_source import LiveCameraSource
+from metrics_server import METRICS
+
+_MAGIC = 0x50414E54   # 'PANT'
+# 全局头字段；G_STATE: 0 打开中 / 1 已打开 / -1 打开失败，G_FPS_MILLI 为源帧率×1000
+G_MAGIC, G_SLOTS, G_MAX_H, G_MAX_W, G_COUNT, G_CLOSED, G_STATE, G_FPS_MILLI, G_SRC_H, G_SRC_W = range(10)
+# 槽位头字段
+S_SEQ, S_FRAME, S_TS_NS, S_H, S_W = range(5)
+_GLOBAL_INTS = 16
+_HDR_INTS = 8
+
+
+class SharedFrameRing:
+    def __init__(self, name=None, n_slots=8, max_h=1080, max_w=1920, create=False):
+        if create:
+            size = self._nbytes(n_slots, max_h, max_w)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = create
+
+        self._global = np.ndarray((_GLOBAL_INTS,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self._global[:] = 0
+            self._global[[G_MAGIC, G_SLOTS, G_MAX_H, G_MAX_W]] = _MAGIC, n_slots, max_h, max_w
+        elif self._global[G_MAGIC] != _MAGIC:
+            raise ValueError(f"共享内存 {name} 不是帧环形缓冲")
+
+        self.n_slots = int(self._global[G_SLOTS])
+        self.max_h = int(self._global[G_MAX_H])
+        self.max_w = int(self._global[G_MAX_W])
+        self.slot_bytes = self.max_h * self.max_w * 3
+        self._slots = np.ndarray((self.n_slots, _HDR_INTS), dtype=np.int64, buffer=self.shm.buf,
+                                 offset=_GLOBAL_INTS * 8)
+        self._data_offset = (_GLOBAL_INTS + _HDR_INTS * self.n_slots) * 8
+        if create:
+            self._slots[:] = 0
+
+    @staticmethod
+    def _nbytes(n_slots, max_h, max_w):
+        return (_GLOBAL_INTS + _HDR_INTS * n_slots) * 8 + n_slots * max_h * max_w * 3
+
+    @classmethod
+    def create(cls, n_slots=8, max_h=1080, max_w=1920, name=None):
+        return cls(name, n_slots, max_h, max_w, create=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # ---------- 写端(采集进程) ----------
+    def write(self, frame, frame_number, ts_ns=None):
+        h, w = frame.shape[:2]
+        if h > self.max_h or w > self.max_w or frame.ndim != 3 or frame.shape[2] != 3:
+            raise ValueError(f"帧尺寸 {frame.shape} 超出共享内存槽位 {self.max_h}x{self.max_w}x3")
+        seq = int(self._global[G_COUNT]) + 1
+        slot = seq % self.n_slots
+        hdr = self._slots[slot]
+        hdr[S_SEQ] = -1                     # 标记写入中
+        self._view(slot, h, w)[:] = frame
+        hdr[S_FRAME] = frame_number
+        hdr[S_TS_NS] = ts_ns if ts_ns is not None else time.monotonic_ns()
+        hdr[S_H], hdr[S_W] = h, w
+        hdr[S_SEQ] = seq                    # 写完后再发布序号
+        self._global[G_COUNT] = seq
+        return seq
+
+    def close_writer(self):
+        """通知读端不会再有新帧"""
+        self._global[G_CLOSED] = 1
+
+    def set_source_info(self, opened, fps=0.0, height=0, width=0):
+        """写端打开数据源后发布源的属性，读端据此得到帧率和画面尺寸"""
+        self._global[[G_FPS_MILLI, G_SRC_H, G_SRC_W]] = int(round((fps or 0) * 1000)), height, width
+        self._global[G_STATE] = 1 if opened else -1
+
+    # ---------- 读端(推理进程) ----------
+    def _view(self, slot, h, w):
+        return np.ndarray((h, w, 3), dtype=np.uint8, buffer=self.shm.buf,
+                          offset=self._data_offset + slot * self.slot_bytes)
+
+    @property
+    def latest_seq(self):
+        return int(self._global[G_COUNT])
+
+    @property
+    def closed(self):
+        return bool(self._global[G_CLOSED])
+
+    @property
+    def state(self):
+        return int(self._global[G_STATE])
+
+    @property
+    def source_info(self):
+        """(帧率, 高, 宽)"""
+        return self._global[G_FPS_MILLI] / 1000.0, int(self._global[G_SRC_H]), int(self._global[G_SRC_W])
+
+    def read(self, seq, copy=False):
+        """
+        读取序号为 seq 的帧，返回 (frame, frame_number, ts_ns)；该槽位已被覆盖或正在写入时返回 None。
+        copy=False 时 frame 是共享内存上的视图，写端随时可能覆盖，调用方用完后必须检查 is_valid(seq)；
+        copy=True 时拷贝出来并在拷贝后检查序号，返回的帧归调用方所有。
+        """
+        hdr = self._slots[seq % self.n_slots]
+        if hdr[S_SEQ] != seq:
+            return None
+        frame_number, ts_ns, h, w = (int(v) for v in hdr[[S_FRAME, S_TS_NS, S_H, S_W]])
+        frame = self._view(seq % self.n_slots, h, w)
+        if copy:
+            frame = frame.copy()
+            # 拷贝期间写端可能已开始覆盖这个槽位
+            if hdr[S_SEQ] != seq:
+                return None
+        return frame, frame_number, ts_ns
+
+    def is_valid(self, seq):
+        return int(self._slots[seq % self.n_slots][S_SEQ]) == seq
+
+    def wait_next(self, last_seq, timeout=1.0, latest_only=True, poll=0.0005, copy=False):
+        """
+        等待比 last_seq 新的帧，返回 (seq, frame, frame_number, ts_ns)，超时或写端关闭返回 None
+        latest_only=True 时直接跳到最新一帧(推理跟不上时丢弃旧帧)，否则按顺序逐帧读取；copy 同 read
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            latest = self.latest_seq
+            if latest > last_seq:
+                seq = latest if latest_only else max(last_seq + 1, latest - self.n_slots + 1)
+                got = self.read(seq, copy=copy)
+                if got is not None:
+                    return (seq,) + got
+                last_seq = seq      # 读的时候被覆盖了，继续等下一帧
+                continue
+            if self.closed or time.perf_counter() > deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        # 先释放 numpy 视图，否则 SharedMemory.close 会报 BufferError
+        self._global = self._slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_process(src, ring_name, stop_event, width=1280, height=720, fps=30, fourcc='MJPG'):
+    """采集进程入口：打开相机/视频流(协商格式同 LiveCameraSource)，把解码后的帧写入共享内存"""
+    ring = SharedFrameRing.attach(ring_name)
+    if isinstance(src, int):
+        cap = LiveCameraSource(src, width=width, height=height, fps=fps, fourcc=fourcc)
+    else:
+        cap = LiveCameraSource(src, width=None, height=None, fps=None, fourcc=None)
+    ring.set_source_info(cap.isOpened(), cap.get(cv2.CAP_PROP_FPS),
+                         int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    try:
+        while cap.isOpened() and not stop_event.is_set():
+            ret, frame = cap.read(timeout=0.5)
+            if not ret:
+                if cap.ended:
+                    break
+                continue
+            ring.write(frame, cap.frame_number)
+    finally:
+        cap.release()
+        ring.close_writer()
+        ring.close()
+
+
+def start_capture(src, n_slots=8, max_h=1080, max_w=1920, **camera_options):
+    """
+    在本进程创建共享内存并启动采集子进程，返回 (ring, process, stop_event)
+    推理进程用 ring.wait_next() 取帧，结束时 stop_event.set()、process.join()、ring.close()
+    """
+    ring = SharedFrameRing.create(n_slots, max_h, max_w)
+    stop_event = mp.Event()
+    proc = mp.Process(target=capture_process, args=(src, ring.name, stop_event), kwargs=camera_options,
+                      daemon=True)
+    proc.start()
+    logging.info(f"采集子进程已启动: {src} -> 共享内存 {ring.name}, {n_slots} 槽位")
+    return ring, proc, stop_event
+
+
+class SharedMemorySource:
+    """
+    子进程采集的相机源，接口与 LiveCameraSource 相同(read / get / set / isOpened / release / latency_ms)，
+    可直接替换 MainWindow.cap。只返回最新帧，来不及处理的帧计入 dropped。
+    """
+    def __init__(self, src, width=1280, height=720, fps=30, fourcc='MJPG', n_slots=4,
+                 max_h=1080, max_w=1920, open_timeout=10.0):
+        self.src = src
+        self.ring, self.proc, self._stop = start_capture(src, n_slots, max_h, max_w, width=width,
+                                                         height=height, fps=fps, fourcc=fourcc)
+        self._seq = 0
+        self.frame_number = 0
+        self.capture_ns = None           # 最近返回帧的采集时刻(monotonic_ns，跨进程一致)
+        self.dropped = 0
+        self._t_open_ns = time.monotonic_ns()
+        # 等子进程打开数据源，拿到协商后的属性
+        deadline = time.perf_counter() + open_timeout
+        while self.ring.state == 0 and self.proc.is_alive() and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        self._opened = self.ring.state == 1
+        fps_actual, h, w = self.ring.source_info
+        self._props = {cv2.CAP_PROP_FPS: fps_actual, cv2.CAP_PROP_FRAME_HEIGHT: h, cv2.CAP_PROP_FRAME_WIDTH: w}
+        if self._opened and (h > max_h or w > max_w):
+            logging.error(f"画面 {w}x{h} 超出共享内存槽位 {max_w}x{max_h}")
+            self._opened = False
+
+    def read(self, timeout=2.0):
+        """等待比上次更新的一帧，拷贝出来后返回；写端已结束或超时返回 (False, None)"""
+        got = self.ring.wait_next(self._seq, timeout=timeout, latest_only=True, copy=True)
+        if got is None:
+            return False, None
+        seq, frame, frame_number, ts_ns = got
+        if self._seq and seq > self._seq + 1:
+            self.dropped += seq - self._seq - 1
+            METRICS.inc('frames_dropped_total', seq - self._seq - 1, reason='stale_camera')
+        self._seq = seq
+        self.frame_number, self.capture_ns = frame_number, ts_ns
+        return True, frame
+
+    @property
+    def ended(self):
+        return self.ring.closed and self.ring.latest_seq <= self._seq
+
+    def latency_ms(self):
+        if self.capture_ns is None:
+            return None
+        return (time.monotonic_ns() - self.capture_ns) / 1e6
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame_number
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return 0.0 if self.capture_ns is None else (self.capture_ns - self._t_open_ns) / 1e6
+        return self._props.get(prop, 0.0)
+
+    def set(self, prop, value):
+        # 相机属性在子进程里协商，运行中不支持修改
+        return False
+
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        if self.ring is None:
+            return
+        self._stop.set()
+        self.proc.join(timeout=2.0)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.ring.close()
+        self.ring = None
+        self._opened = False
+        if self.dropped:
+            logging.info(f"相机 {self.src}(子进程采集): 为保证实时性丢弃旧帧 {self.dropped} 帧")
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+长时间浸泡测试 (7x24 运行前的内存/泄漏检查)
+用合成视频或指定视频循环播放(PrefetchVideoSource.loop)，通过完整的 MainWindow 流程(推理、曲线、记录、日志控件)全速跑数小时，
+定时采样 RSS、Python 对象数、tracemalloc 增长最多的分配位置以及曲线列表/日志行数等，
+预热期之后内存增长超过阈值即判定失败(退出码 1)。
+tracemalloc 只在每次采样前的一个短窗口(--trace-window)里开启，平时流水线全速运行，
+RSS 也不包含 tracemalloc 自身的开销；窗口内新增且没有释放的分配按代码行排序输出。
+
+    python soak_test.py --hours 4 --interval 60 --max-growth-mb 200
+    python soak_test.py --video sample.mp4 --hours 0.1 --offscreen
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from metrics_server import process_memory_bytes
+
+
+def make_synthetic_video(path, frames=300, size=(1280, 720), fps=30):
+    """生成一段接触点做之字形运动的合成视频"""
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+    for i in range(frames):
+        img = np.full((h, w, 3), 40, dtype=np.uint8)
+        x = int(w / 2 + w / 4 * np.sin(2 * np.pi * i / frames))
+        y = int(h / 2 + 10 * np.sin(2 * np.pi * i / 17))
+        cv2.line(img, (0, y), (w, y), (200, 200, 200), 3)       # 接触线
+        cv2.rectangle(img, (x - 120, y), (x + 120, y + 40), (90, 90, 90), -1)   # 弓头
+        cv2.circle(img, (x, y), 8, (255, 255, 255), -1)
+        writer.write(img)
+    writer.release()
+    return path
+
+
+class SoakSampler:
+    def __init__(self, window, top_n=10):
+        self.window = window
+        self.top_n = top_n
+        self.samples = []
+        self.t0 = time.perf_counter()
+        self._trace_base = None
+
+    def begin_trace(self):
+        """开启采样窗口：只记录一层调用栈，开销最小"""
+        if self._trace_base is None:
+            tracemalloc.start(1)
+            self._trace_base = tracemalloc.take_snapshot()
+
+    def _end_trace(self):
+        """结束采样窗口，返回 (窗口内增长最多的分配位置, 窗口内仍存活的分配字节数)"""
+        if self._trace_base is None:
+            return [], 0
+        top = tracemalloc.take_snapshot().compare_to(self._trace_base, 'lineno')[:self.top_n]
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self._trace_base = None
+        return top, traced
+
+    def sample(self):
+        gc.collect()
+        w = self.window
+        top, traced = self._end_trace()
+        data_file_size = os.path.getsize(w.data_file) if w.data_file and os.path.exists(w.data_file) else 0
+        s = {
+            'elapsed_s': round(time.perf_counter() - self.t0, 1),
+            'rss_mb': round(process_memory_bytes() / 1024 / 1024, 2),
+            'py_objects': len(gc.get_objects()),
+            'window_traced_mb': round(traced / 1024 / 1024, 2),
+            'frames': w.cap.get(cv2.CAP_PROP_POS_FRAMES) if w.cap else 0,
+            'plot_points': len(w.frame_numbers),
+            'log_lines': w.plaintext.blockCount(),
+            'replay_buffer_mb': round(w.frame_buffer.memory_mb, 2),
+            'data_file_mb': round(data_file_size / 1024 / 1024, 2),
+            'top_growth': [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} "
+                           f"+{stat.size_diff / 1024:.1f}KiB ({stat.count_diff:+d})" for stat in top],
+        }
+        self.samples.append(s)
+        logging.info(f"浸泡采样 {s['elapsed_s']}s: RSS {s['rss_mb']}MB, 对象 {s['py_objects']}, "
+                     f"帧 {s['frames']}, 曲线点 {s['plot_points']}, 日志行 {s['log_lines']}")
+        return s
+
+    def verdict(self, warmup_s, max_growth_mb):
+        """预热期后的第一个采样作为基线，返回 (是否通过, 增长MB, 每小时增长MB)"""
+        steady = [s for s in self.samples if s['elapsed_s'] >= warmup_s]
+        if len(steady) < 2:
+            return True, 0.0, 0.0
+        growth = steady[-1]['rss_mb'] - steady[0]['rss_mb']
+        t = np.array([s['elapsed_s'] for s in steady]) / 3600.0
+        rss = np.array([s['rss_mb'] for s in steady])
+        slope = float(np.polyfit(t, rss, 1)[0]) if t[-1] > t[0] else 0.0
+        return growth <= max_growth_mb, growth, slope
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MainWindow 长时间浸泡测试')
+    parser.add_argument('--video', default=None, help='循环播放的视频，不给则生成合成视频')
+    parser.add_argument('--hours', type=float, default=1.0)
+    parser.add_argument('--interval', type=float, default=60.0, help='采样间隔(秒)')
+    parser.add_argument('--trace-window', type=float, default=10.0, help='每次采样前开启 tracemalloc 的时长(秒)')
+    parser.add_argument('--warmup', type=float, default=300.0, help='预热期(秒)，不计入增长')
+    parser.add_argument('--max-growth-mb', type=float, default=200.0)
+    parser.add_argument('--out', default='soak_report.json')
+    parser.add_argument('--offscreen', action='store_true', help='无显示器时使用 offscreen 平台')
+    opt = parser.parse_args()
+    if opt.offscreen:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+    from MainQt import MainWindow
+
+    app = QApplication([])
+    window = MainWindow()
+    window.show()
+
+    video = opt.video or make_synthetic_video(os.path.join(tempfile.gettempdir(), 'soak_synthetic.mp4'))
+    window.open_source(video)
+    window.video_play = True
+    # 循环在视频源内部完成，window.cap 仍是生产路径上的 PrefetchVideoSource
+    window.cap.loop = True
+    window.timer.setInterval(0)              # 全速运行，不按 30ms 节拍
+    window.start_detection()
+
+    sampler = SoakSampler(window)
+    trace_window_ms = int(min(opt.trace_window, opt.interval / 2) * 1000)
+
+    def start_window():
+        sampler.begin_trace()
+        QTimer.singleShot(trace_window_ms, sampler.sample)
+
+    sample_timer = QTimer()
+    sample_timer.timeout.connect(start_window)
+    sample_timer.start(int(opt.interval * 1000))
+    QTimer.singleShot(int(opt.hours * 3600 * 1000), app.quit)
+    logging.info(f"浸泡测试开始: {video}, 时长 {opt.hours}h")
+    app.exec()
+
+    sampler.sample()
+    loops = getattr(window.cap, 'loops', 0)
+    window.stop_play()
+    ok, growth, slope = sampler.verdict(opt.warmup, opt.max_growth_mb)
+    report = {'video': video, 'hours': opt.hours, 'loops': loops, 'passed': ok,
+              'rss_growth_mb': round(growth, 2), 'rss_slope_mb_per_hour': round(slope, 2),
+              'max_growth_mb': opt.max_growth_mb, 'samples': sampler.samples}
+    with open(opt.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    msg = f"浸泡测试{'通过' if ok else '失败'}: 预热后 RSS 增长 {growth:.1f}MB ({slope:.1f}MB/h), 报告 {opt.out}"
+    (logging.info if ok else logging.error)(msg)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+接触点轨迹离线分析
+读取 start_data_recording 写出的 coordinate_data_*.csv，分块加载，全部向量化计算：
+拉出值(之字形)幅值、抬升量统计、离群点与跳变检测、基于 FFT 的周期性分析。
+内存只与 chunk_size 有关，与文件长度无关，千万级采样点也可以直接跑。
+记录里的帧号是视频的绝对帧号，跳转后会回退或大幅前跳：帧号不递增或间隔超过 max_gap 处视为不连续，
+在此处切开分段，插值、频谱分段和跳变判断都不跨越断点。
+"""
+import argparse
+import itertools
+import logging
+import numpy as np
+
+
+def iter_chunks(csv_path, chunk_size=1_000_000, columns=('frame_number', 'x_center', 'y_center')):
+    """按块读取记录文件，每次返回 (N, len(columns)) 的 float64 数组，按表头名取列"""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+        try:
+            usecols = [header.index(c) for c in columns]
+        except ValueError:
+            raise ValueError(f"记录文件缺少必要的列 {columns}, 实际表头: {header}")
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                break
+            block = np.loadtxt(lines, delimiter=',', usecols=usecols, ndmin=2, dtype=np.float64)
+            if len(block):
+                yield block
+
+
+class _RunningStats:
+    """可合并的流式统计量(Chan 并行算法)，按块更新均值/方差/极值"""
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, v):
+        if not len(v):
+            return
+        n_b = len(v)
+        mean_b = float(v.mean())
+        m2_b = float(((v - mean_b) ** 2).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+
+    @property
+    def std(self):
+        return (self.m2 / self.n) ** 0.5 if self.n else 0.0
+
+    def as_dict(self):
+        return {'count': self.n, 'mean': self.mean, 'std': self.std,
+                'min': self.min if self.n else None, 'max': self.max if self.n else None}
+
+
+class _WelchAccumulator:
+    """分段平均周期图：按块喂入等间隔序列，段与段之间拼接余数，不需要一次性做整段 FFT"""
+    def __init__(self, nperseg=4096):
+        self.nperseg = nperseg
+        self.window = np.hanning(nperseg)
+        self.psd = np.zeros(nperseg // 2 + 1)
+        self.segments = 0
+        self._tail = np.empty(0)
+
+    def update(self, v):
+        v = np.concatenate([self._tail, v])
+        n_seg = len(v) // self.nperseg
+        if n_seg:
+            segs = v[:n_seg * self.nperseg].reshape(n_seg, self.nperseg)
+            segs = segs - segs.mean(axis=1, keepdims=True)   # 去直流
+            spec = np.abs(np.fft.rfft(segs * self.window, axis=1)) ** 2
+            self.psd += spec.sum(axis=0)
+            self.segments += n_seg
+        self._tail = v[n_seg * self.nperseg:]
+
+    def break_segment(self):
+        """序列在此处不连续：丢弃不足一段的余数，下一段从新数据开始"""
+        self._tail = np.empty(0)
+
+    def dominant(self, fps=None):
+        """返回主频(周期/帧)、对应周期(帧)及秒数；数据不足一段时返回 None"""
+        if not self.segments:
+            return None
+        psd = self.psd / self.segments
+        freqs = np.fft.rfftfreq(self.nperseg)
+        k = int(np.argmax(psd[1:])) + 1   # 跳过直流分量
+        # 主峰能量占比，用于判断是否真的存在周期性
+        ratio = float(psd[k] / psd[1:].sum()) if psd[1:].sum() > 0 else 0.0
+        result = {'freq_per_frame': float(freqs[k]),
+                  'period_frames': float(1.0 / freqs[k]),
+                  'peak_power_ratio': ratio,
+                  'segments': self.segments}
+        if fps:
+            result['period_seconds'] = result['period_frames'] / fps
+        return result
+
+
+def analyze_recording(csv_path,
+                      chunk_size=1_000_000,
+                      stagger_window=500,
+                      jump_threshold=30.0,
+                      outlier_sigma=4.0,
+                      nperseg=4096,
+                      fps=None,
+                      max_events=10000,
+                      max_gap=300):
+    """
+    对一个记录文件做完整分析，返回结果 dict
+    - stagger_window: 计算拉出值幅值的窗口长度(采样点)
+    - jump_threshold: 相邻两帧坐标变化超过该像素值视为跳变
+    - outlier_sigma: 偏离全局均值超过 k 倍标准差视为离群点
+    - max_events: 跳变/离群帧号最多保留多少个，保证内存有界
+    - max_gap: 相邻记录帧号相差超过该值(或不递增)视为不连续(跳转)，不做插值
+    """
+    # 第一遍：全局统计量 + 拉出值窗口幅值 + 跳变 + 频谱
+    stats_x, stats_y = _RunningStats(), _RunningStats()
+    welch_x, welch_y = _WelchAccumulator(nperseg), _WelchAccumulator(nperseg)
+    amplitudes = []
+    x_tail = np.empty(0)
+    jumps = []
+    jump_count = 0
+    gap_count = 0
+    break_count = 0
+    prev = None           # 上一块最后一行，用于跨块差分和插值
+
+    for block in iter_chunks(csv_path, chunk_size):
+        frames, x, y = block[:, 0], block[:, 1], block[:, 2]
+        stats_x.update(x)
+        stats_y.update(y)
+
+        # 拉出值：固定窗口内峰峰值的一半，余数拼到下一块
+        xs = np.concatenate([x_tail, x])
+        n_win = len(xs) // stagger_window
+        if n_win:
+            w = xs[:n_win * stagger_window].reshape(n_win, stagger_window)
+            amplitudes.append(np.ptp(w, axis=1) / 2.0)
+        x_tail = xs[n_win * stagger_window:]
+
+        # 跳变：与上一块最后一行拼接后做差分
+        if prev is not None:
+            f_all, x_all, y_all = (np.concatenate([[prev[i]], c]) for i, c in enumerate((frames, x, y)))
+        else:
+            f_all, x_all, y_all = frames, x, y
+        df = np.diff(f_all)
+        broken = (df <= 0) | (df > max_gap)
+        break_count += int(np.count_nonzero(broken))
+        gap_count += int(np.count_nonzero((df > 1) & ~broken))
+        # 断点两侧不是相邻的画面，坐标差不算跳变
+        step = np.hypot(np.diff(x_all), np.diff(y_all))
+        idx = np.flatnonzero((step > jump_threshold) & ~broken)
+        jump_count += len(idx)
+        if len(jumps) < max_events and len(idx):
+            jumps.extend(f_all[idx + 1][:max_events - len(jumps)].astype(np.int64).tolist())
+
+        # 频谱：没有检测到接触点的帧不在记录里，先在每个连续段内线性插值回等间隔帧网格，
+        # 跨块拼接时上一块最后一行只用于插值，不重复送入
+        start = 1 if prev is not None else 0
+        bounds = [0, *(np.flatnonzero(broken) + 1).tolist(), len(f_all)]
+        for k, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])):
+            if k > 0:
+                welch_x.break_segment()
+                welch_y.break_segment()
+            sf = f_all[a:b]
+            skip = start if k == 0 else 0
+            grid = np.arange(sf[0], sf[-1] + 1)
+            welch_x.update(np.interp(grid, sf, x_all[a:b])[skip:])
+            welch_y.update(np.interp(grid, sf, y_all[a:b])[skip:])
+
+        prev = (frames[-1], x[-1], y[-1])
+
+    if stats_x.n == 0:
+        logging.warning(f"记录文件 {csv_path} 中没有数据")
+        return None
+
+    # 第二遍：离群点，需要全局均值/标准差
+    outliers = []
+    outlier_count = 0
+    for block in iter_chunks(csv_path, chunk_size):
+        zx = np.abs(block[:, 1] - stats_x.mean) / (stats_x.std or 1.0)
+        zy = np.abs(block[:, 2] - stats_y.mean) / (stats_y.std or 1.0)
+        idx = np.flatnonzero((zx > outlier_sigma) | (zy > outlier_sigma))
+        outlier_count += len(idx)
+        if len(outliers) < max_events and len(idx):
+            outliers.extend(block[idx, 0][:max_events - len(outliers)].astype(np.int64).tolist())
+
+    amps = np.concatenate(amplitudes) if amplitudes else np.empty(0)
+    y_stats = stats_y.as_dict()
+    # 图像坐标系 y 向下，抬升量 = 平均位置 - 最高点(y 最小)
+    y_stats['uplift_max'] = stats_y.mean - stats_y.min
+    y_stats['drop_max'] = stats_y.max - stats_y.mean
+
+    return {
+        'file': str(csv_path),
+        'samples': stats_x.n,
+        'missing_gaps': gap_count,
+        'discontinuities': break_count,
+        'stagger': {
+            'window': stagger_window,
+            'windows': int(len(amps)),
+            'amplitude_median': float(np.median(amps)) if len(amps) else None,
+            'amplitude_max': float(amps.max()) if len(amps) else None,
+            'x': stats_x.as_dict(),
+        },
+        'uplift': y_stats,
+        'jumps': {'threshold': jump_threshold, 'count': jump_count, 'frames': jumps},
+        'outliers': {'sigma': outlier_sigma, 'count': outlier_count, 'frames': outliers},
+        'periodicity': {'x': welch_x.dominant(fps), 'y': welch_y.dominant(fps)},
+    }
+
+
+def log_summary(result):
+    """把分析结果以几行日志输出到终端/界面"""
+    if not result:
+        return
+    st, up = result['stagger'], result['uplift']
+    logging.info(f"轨迹分析 {result['file']}: 采样点 {result['samples']}, 缺失段 {result['missing_gaps']}, "
+                 f"不连续(跳转) {result['discontinuities']} 处")
+    if st['windows']:
+        logging.info(f"拉出值幅值: 中位 {st['amplitude_median']:.1f}px, 最大 {st['amplitude_max']:.1f}px")
+    logging.info(f"纵向: 均值 {up['mean']:.1f}, 标准差 {up['std']:.2f}, 最大抬升 {up['uplift_max']:.1f}px")
+    logging.info(f"跳变 {result['jumps']['count']} 次, 离群点 {result['outliers']['count']} 个")
+    per = result['periodicity']['x']
+    if per:
+        logging.info(f"横向主周期 {per['period_frames']:.1f} 帧, 主峰占比 {per['peak_power_ratio']:.2f}")
+
+
+if __name__ == '__main__':
+    import json
+    parser = argparse.ArgumentParser(description='接触点记录文件离线分析')
+    parser.add_argument('csv', nargs='+', help='coordinate_data_*.csv')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--stagger-window', type=int, default=500)
+    parser.add_argument('--jump', type=float, default=30.0, help='跳变阈值(像素)')
+    parser.add_argument('--sigma', type=float, default=4.0, help='离群点阈值(标准差倍数)')
+    parser.add_argument('--nperseg', type=int, default=4096, help='FFT 分段长度')
+    parser.add_argument('--fps', type=float, default=None)
+    parser.add_argument('--max-gap', type=int, default=300, help='帧号间隔超过该值视为跳转(不连续)')
+    parser.add_argument('--json', default=None, help='结果另存为 json')
+    opt = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    results = []
+    for path in opt.csv:
+        r = analyze_recording(path, opt.chunk_size, opt.stagger_window, opt.jump,
+                              opt.sigma, opt.nperseg, opt.fps, max_gap=opt.max_gap)
+        log_summary(r)
+        results.append(r)
+    if opt.json:
+        with open(opt.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -20,6 +20,19 @@ class Ui_MainWindow(object):
         self.clear_terminal = self.control_menu.addAction("清空终端")
         self.logs_dir = self.control_menu.addAction("日志文件夹")
         self.results_dir = self.control_menu.addAction("结果文件夹")
+        self.history_view = self.control_menu.addAction("历史回看")
+        self.tiled_mode = self.control_menu.addAction("分块推理(高分辨率)")
+        self.tiled_mode.setCheckable(True)
+        self.display_overlay = self.control_menu.addAction("按显示尺寸画框")
+        self.display_overlay.setCheckable(True)
+        self.cpu_tune = self.control_menu.addAction("CPU 调优")
+        self.export_trace = self.control_menu.addAction("导出性能追踪")
+        self.jump_frame = self.control_menu.addAction("跳转到帧/时间")
+        self.process_range = self.control_menu.addAction("区间处理")
+        self.multi_camera = self.control_menu.addAction("多路监测")
+        self.replay_mode = self.control_menu.addAction("回放检测结果")
+        self.replay_mode.setCheckable(True)
+        self.playback_speed = self.control_menu.addAction("播放速度")
         self.control_menu.addSeparator()
         self.quit = self.control_menu.addAction("退出")
         self.swift_lang = menubar.addAction("切换语言")
@@ -28,6 +41,10 @@ class Ui_MainWindow(object):
 
         statusbar = self.statusBar()
         self.date = datetime.now().strftime("%m")
+        self.size_label = QLabel("输入 640")
+        statusbar.addPermanentWidget(self.size_label)
+        self.latency_label = QLabel("")
+        statusbar.addPermanentWidget(self.latency_label)
         statusbar.addPermanentWidget(QLabel("V1.0." + self.date))
         statusbar.showMessage("已就绪",5000)
         statusbar.setFixedHeight(15)
@@ -296,6 +313,7 @@ class Ui_MainWindow(object):
         self.plaintext = QPlainTextEdit("执行反馈日志-Results show")
         self.plaintext.setMinimumSize(1100, 80)
         self.plaintext.setReadOnly(True)  # 设置文本框为只读
+        self.plaintext.setMaximumBlockCount(5000)  # 限制行数，长时间运行时不会无限增长
         # 设置文本框-终端的CSS样式
         self.plaintext.setStyleSheet("""
             QPlainTextEdit {
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+后台预取解码的视频源
+接口与 cv2.VideoCapture 兼容(read / get / set / isOpened / release)，可直接替换 MainWindow.cap。
+解码在后台线程进行并放入有界队列，每帧带帧号和媒体时间戳，文件回放时解码与推理完全重叠。
+要跳过的帧走 grab() / skip(n) 路径：已经解码在队列里的直接丢弃，其余由后台线程只 grab 不解码；
+decode_stride 可随时修改，每 n 帧只解码 1 帧(快进)。
+read() 超时(解码或定位慢)与读到结尾区分开：只有 ended 为 True 才是真正结束。
+帧号由本类自行计数(不读 CAP_PROP_POS_FRAMES)，配合 SeekIndex 定位后仍然准确。
+loop 为 True 时读到结尾由后台线程回到开头继续解码，帧号持续累加(浸泡测试用)，不会产生结尾标记。
+"""
+import logging
+import queue
+import threading
+
+import cv2
+
+
+class PrefetchVideoSource:
+    def __init__(self, src, queue_size=8, decode_stride=1, loop=False):
+        self.cap = cv2.VideoCapture(src)
+        self.src = src
+        self.decode_stride = max(int(decode_stride), 1)   # 每 n 帧只解码 1 帧，其余 grab 跳过
+        self.loop = loop                      # 读到结尾后回到开头
+        self.loops = 0                        # 已回到开头的次数
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()         # 保护 cap，seek 与后台解码互斥
+        self._generation = 0                  # seek 后递增，丢弃旧的预取帧
+        self._stop = threading.Event()
+        self._eof = False
+        self._ended = False                   # 消费端已经取到结尾标记
+        self._skip = 0                        # 待跳过的帧数，由后台线程 grab 掉
+        self._consumed = 0                    # 已从 cap 取出(grab 或 read)的帧数，后台线程持有锁时更新
+        self.frame_number = 0                 # 最近一次 read 返回帧的帧号(与 CAP_PROP_POS_FRAMES 一致)
+        self.pos_msec = 0.0
+        self._thread = None
+        if self.cap.isOpened():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    # ---------- 后台解码 ----------
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                gen = self._generation
+                if self._eof:
+                    item = None
+                else:
+                    # 请求跳过的帧和 decode_stride 跳过的帧只 grab 不 retrieve
+                    n_grab = self._skip + self.decode_stride - 1
+                    self._skip = 0
+                    for _ in range(n_grab):
+                        if not self.cap.grab():
+                            break
+                        self._consumed += 1
+                    ret, frame = self.cap.read()
+                    if not ret and self.loop and self._consumed > 0:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        self.loops += 1
+                        ret, frame = self.cap.read()
+                    if ret:
+                        self._consumed += 1
+                        item = (frame, self._consumed, self.cap.get(cv2.CAP_PROP_POS_MSEC))
+                    else:
+                        self._eof = True
+                        item = (None, None, None)
+            if item is None:
+                # 已到结尾，等待 seek 或关闭
+                self._stop.wait(0.01)
+                continue
+            self._put(gen, item)
+
+    def _put(self, gen, item):
+        """入队时持锁，与 skip 的清队列互斥，解码完成后才收到的跳过请求也能生效"""
+        while not self._stop.is_set():
+            with self._lock:
+                if gen != self._generation:
+                    return
+                if self._skip and item[0] is not None:
+                    self._skip -= 1
+                    return
+                try:
+                    self._queue.put_nowait((gen, item))
+                    return
+                except queue.Full:
+                    pass
+            self._stop.wait(0.005)
+
+    # ---------- 消费端 ----------
+    def read_item(self, timeout=2.0):
+        """
+        返回 (frame, frame_number, pos_msec)，结束或超时返回 (None, None, None)；
+        两者用 ended 区分，超时后可以继续读
+        """
+        while True:
+            try:
+                gen, item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                logging.warning(f"视频源解码超时({timeout:.1f}s): {self.src}")
+                return None, None, None
+            if gen != self._generation:
+                continue
+            frame, frame_number, pos_msec = item
+            if frame is not None:
+                self.frame_number, self.pos_msec = frame_number, pos_msec
+            else:
+                self._ended = True
+            return item
+
+    def read(self, timeout=2.0):
+        frame, _, _ = self.read_item(timeout)
+        return frame is not None, frame
+
+    @property
+    def ended(self):
+        """已读到结尾(read 返回 False 而 ended 为 False 表示只是超时)"""
+        return self._ended
+
+    def skip(self, n=1):
+        """跳过接下来的 n 帧：队列里已解码的直接丢弃，其余交给后台线程只 grab 不解码，返回是否还有帧"""
+        with self._lock:
+            while n > 0:
+                try:
+                    gen, item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if gen != self._generation:
+                    continue
+                if item[0] is None:
+                    # 结尾标记放回去，下一次 read 仍能读到
+                    self._queue.put_nowait((gen, item))
+                    return False
+                n -= 1
+            self._skip += n
+        return not self._eof or not self._queue.empty()
+
+    def grab(self):
+        """跳过下一帧，不解码"""
+        return self.skip(1)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame_number
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.pos_msec
+        with self._lock:
+            return self.cap.get(prop)
+
+    def set(self, prop, value):
+        """seek：清空预取队列后重新定位"""
+        with self._lock:
+            ok = self.cap.set(prop, value)
+            self._consumed = int(value) if prop == cv2.CAP_PROP_POS_FRAMES else \
+                int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            self._flush()
+        return ok
+
+    def seek(self, frame_number, index):
+        """用 SeekIndex 精确定位，下一次 read 返回帧号为 frame_number 的帧"""
+        with self._lock:
+            consumed = index.seek(self.cap, frame_number)
+            self._consumed = consumed if consumed is not None else int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            self._flush()
+        return consumed is not None
+
+    def _flush(self):
+        """调用方持有 self._lock"""
+        self._generation += 1
+        self._eof = False
+        self._ended = False
+        self._skip = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        with self._lock:
+            self.cap.release()
@@ -1,8 +1,12 @@
 import torch
+import torchvision
 import cv2
 import numpy as np
 import sys
+import time
 import logging
+import threading
+from functools import wraps
 from pathlib import Path
 
 '''
@@ -14,18 +18,61 @@ from models.experimental import attempt_load
 from utils.general import non_max_suppression, scale_coords
 from utils.datasets import letterbox
 
+from metrics_server import METRICS
+from frame_trace import TRACER
+import cpu_autotune
+import deploy_artifact
+import inference_backends
+from inference_backends import BACKENDS, TorchBackend
+from overlay import OverlayRenderer
+
+
+def _locked(method):
+    """整个方法持有模型锁：换权重/换后端期间其他线程的推理会等待"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class YOLOv5Model:
     def __init__(self,
                  weights_path: str,
                  device: str = None,
                  conf_thres: float = 0.25,
-                 iou_thres: float = 0.45):
+                 iou_thres: float = 0.45,
+                 backend: str = 'torch'):
         # 自动检测设备
         if device is None:
             device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.device = torch.device(device)
         self.conf_thres = conf_thres
         self.iou_thres = iou_thres
+        # GUI、批量检测、多路流、推理服务可能在不同线程共用同一个模型：
+        # Detect 的 grid/anchor_grid、cv2.dnn 的 net、导出后端的编译缓存都不是线程安全的，
+        # 所有前向和换权重/换后端都在这把锁里进行
+        self.lock = threading.RLock()
+        self.last_detections = []
+        self.last_timings = {}
+        self.img_size = 640             # 推理输入尺寸(letterbox 长边)
+        self.img_sizes = [640]          # 已预热、可动态切换的输入尺寸
+        # 分块推理(高分辨率图像)：默认关闭
+        self.tiled = False
+        self.tile_size = 640
+        self.tile_overlap = 0.2
+        self.tile_batch = 16
+        self._tile_cache = {}
+        # 画框：标签图块缓存；draw_boxes 为 False 时由调用方在显示尺寸上绘制
+        self.overlay = OverlayRenderer(color=(100, 160, 0), line_thickness=2)
+        self.draw_boxes = True
+        # CPU 调优项，由 cpu_autotune 设置
+        self.weights_path = weights_path
+        self.channels_last = False
+        self.inference_mode = False
+
+        # 线程数(含 inter-op)必须在任何并行计算之前设置，所以在加载模型前应用已保存的调优结果
+        self.tune_config = cpu_autotune.apply_saved(weights_path, self.device)
 
         # 打印设备信息
         if torch.cuda.is_available():
@@ -38,30 +85,109 @@ class YOLOv5Model:
             logging.info("未检测到GPU，使用CPU设备")
 
         # 1. 加载模型并移至指定设备
-        self.model = attempt_load(weights_path, map_location=self.device)
-        self.model.to(self.device)
-        self.stride = int(self.model.stride.max())
-        self.names = self.model.module.names if hasattr(self.model, 'module') \
-                     else self.model.names
-                      
+        t_load = time.perf_counter()
+        self._load_weights(weights_path)
+
+        # 2. warmup
+        self._warmup()
+
+        # 3. 推理后端：'torch' 为默认 eager，'auto' 实测所有可用后端选最快，也可直接指定名称
+        self.backend_mode = backend
+        self.backend = TorchBackend(self)
+        self.backend_latency_ms = None
+        if backend == 'auto':
+            self.select_backend()
+        elif backend != 'torch':
+            self.set_backend(backend)
+        self.load_time = time.perf_counter() - t_load
+        METRICS.set('model_load_seconds', round(self.load_time, 4))
+        logging.info(f"模型加载耗时 {self.load_time:.2f} s")
+
+    def _load_weights(self, weights_path):
+        self.model = self._load_network(weights_path)
+        self.stride, self.names = self._network_info(self.model)
+        if self.tune_config:
+            cpu_autotune.apply_model_options(self, self.tune_config)
+
+    def _load_network(self, weights_path):
+        """
+        *.deploy 直接 mmap 载入；.pt 旁边有内容一致的部署文件时优先使用，否则走 attempt_load。
+        只返回网络，不改动当前状态
+        """
+        artifact = weights_path if deploy_artifact.is_artifact(weights_path) \
+                   else deploy_artifact.find_for(weights_path)
+        if artifact:
+            model, _ = deploy_artifact.load(artifact, self.device)
+        else:
+            model = attempt_load(weights_path, map_location=self.device)
+            model.to(self.device)
+
         # 验证模型是否正确加载到指定设备
-        model_device = next(self.model.parameters()).device
+        model_device = next(model.parameters()).device
         logging.info(f"模型成功加载到设备: {model_device}")
+        return model
 
-        # 2. warmup
-        self.model(torch.zeros(1, 3, 640, 640).to(self.device).type_as(next(self.model.parameters())))
+    @staticmethod
+    def _network_info(model):
+        """(stride, 类别名)"""
+        return int(model.stride.max()), model.module.names if hasattr(model, 'module') else model.names
+
+    @torch.no_grad()
+    def _warmup(self, model=None):
+        model = self.model if model is None else model
+        model(torch.zeros(1, 3, 640, 640).to(self.device).type_as(next(model.parameters())))
         logging.info("模型预热完成，准备进行推理")
 
+    @_locked
+    def load_weights(self, weights_path):
+        """
+        切换权重：沿用当前设备。调优配置和推理后端都按新权重重新确定——
+        已保存的调优结果/后端选择以权重内容为键，旧权重导出的图和形状校验结果不再使用
+        """
+        t_load = time.perf_counter()
+        # 新网络先载入并预热成功，再替换当前状态；失败时仍是完整的旧权重(路径、调优配置、后端一致)
+        tune_config = cpu_autotune.apply_saved(weights_path, self.device)
+        try:
+            model = self._load_network(weights_path)
+            stride, names = self._network_info(model)
+            self._warmup(model)
+        except Exception:
+            if self.tune_config:
+                cpu_autotune.apply_threads(self.tune_config)
+            raise
+        self.model, self.stride, self.names = model, stride, names
+        self.weights_path = weights_path
+        self.tune_config = tune_config
+        if tune_config:
+            cpu_autotune.apply_model_options(self, tune_config)
+        else:
+            self.channels_last = False
+            self.inference_mode = False
+        self.last_detections = []
+        name = self.backend.name
+        self.backend = TorchBackend(self)
+        self.backend_latency_ms = None
+        if self.backend_mode == 'auto':
+            self.select_backend()
+        elif name != 'torch':
+            # 新建的后端按新权重的键取缓存，每个输入形状第一次推理时重新与 eager 校验
+            self.set_backend(name)
+        self.load_time = time.perf_counter() - t_load
+        METRICS.set('model_load_seconds', round(self.load_time, 4))
+        logging.info(f"权重切换耗时 {self.load_time:.2f} s")
+
     @torch.no_grad()
     def predict(self, img_bgr):
         """输入 OpenCV BGR，返回画好框的 BGR 和检测结果信息"""
-        import time
-        
+        if self.tiled:
+            return self.predict_tiled(img_bgr)
+
         # 记录开始时间
         start_time = time.time()
+        t0 = time.perf_counter()
         
         # 1. 前处理
-        img = letterbox(img_bgr, 640, stride=self.stride, auto=True)[0]
+        img = letterbox(img_bgr, self.img_size, stride=self.stride, auto=True)[0]
         img = img[:, :, ::-1].transpose(2, 0, 1)  # BGR → RGB, HWC → CHW
         img = np.ascontiguousarray(img)
         img = torch.from_numpy(img).to(self.device).float() / 255.0
@@ -72,9 +198,13 @@ class YOLOv5Model:
         tensor_device = img.device
         # logging.debug(f"输入张量位于设备: {tensor_device}")
 
+        t1 = time.perf_counter()
+
         # 2. 推理
-        pred = self.model(img, augment=False)[0]
+        pred = self._forward(img)
+        t2 = time.perf_counter()
         pred = non_max_suppression(pred, self.conf_thres, self.iou_thres)
+        t3 = time.perf_counter()
         
         # 计算推理时间
         inference_time = (time.time() - start_time) * 1000  # 转换为毫秒
@@ -94,32 +224,282 @@ class YOLOv5Model:
 
         # 3. 后处理并画框
         det = pred[0]
-        contact_points = []
         if len(det):
             det[:, :4] = scale_coords(img.shape[2:], det[:, :4], img_bgr.shape).round()
-            for *xyxy, conf, cls in reversed(det):
-                label = f'{self.names[int(cls)]} {conf:.2f}'
-                self._plot_one_box(xyxy, img_bgr, label=label,
-                                   color=(100, 160, 0), line_thickness=2)
-                
-                # 提取contact point的中心点坐标
-                if self.names[int(cls)] == 'contact point':
-                    x_center = (xyxy[0] + xyxy[2]) / 2
-                    y_center = (xyxy[1] + xyxy[3]) / 2
-                    contact_points.append((float(x_center), float(y_center)))
-        
+        contact_points = self._annotate(det, img_bgr)
+
+        self._record_timings(t0, t1, t2, t3, time.perf_counter(), contact_points)
+
         # 返回画好框的图像和contact point信息
         return img_bgr, contact_points
 
+    def _forward(self, batch):
+        """模型前向，交给当前推理后端，返回 Detect 的原始预测"""
+        with self.lock:
+            return self.backend.infer(batch)
+
+    @_locked
+    @torch.no_grad()
+    def warmup_sizes(self, sizes, frame_shape=(1080, 1920)):
+        """
+        按实际画面尺寸把每个候选输入尺寸 letterbox 后预热一遍，
+        导出类后端也会在此时为这些形状编译好，切换尺寸时不会卡顿
+        """
+        dummy = np.zeros((*frame_shape[:2], 3), dtype=np.uint8)
+        for size in sizes:
+            img = letterbox(dummy, size, stride=self.stride, auto=True)[0]
+            self.backend.warmup((1, 3, *img.shape[:2]))
+        self.img_sizes = sorted(sizes)
+        logging.info(f"输入尺寸 {self.img_sizes} 预热完成 (画面 {frame_shape[1]}x{frame_shape[0]})")
+
+    @_locked
+    def set_backend(self, name):
+        """直接指定推理后端"""
+        backend = BACKENDS[name](self)
+        backend.load()
+        backend.warmup()
+        self.backend = backend
+        logging.info(f"使用推理后端 {name}")
+
+    @_locked
+    @torch.no_grad()
+    def select_backend(self, names=None, iters=10, force=False):
+        """
+        本机 + 本权重已有选择结果(backend.json)时直接沿用；否则实测已注册的后端：
+        框坐标或分数与 PyTorch eager 的误差超出容差的淘汰，剩下的选中位延迟最低的一个。
+        实测用的是随机输入，真实画面的每个输入形状第一次出现时后端还会再校验一次
+        """
+        key = inference_backends.cache_key(self.weights_path, self.device)
+        state = inference_backends.load_state(key) or {}
+        name = state.get('backend')
+        if name and not force and (not names or name in names) and \
+                (name == 'torch' or (name in BACKENDS and BACKENDS[name].available(self.device))):
+            if name == 'torch':
+                self.backend = TorchBackend(self)
+            else:
+                self.set_backend(name)
+            self.backend_latency_ms = state.get('latency_ms')
+            logging.info(f"沿用已保存的推理后端 {name} ({state.get('selected_at', '')})")
+            return name
+
+        sample = torch.rand(1, 3, 640, 640, device=self.device)
+        reference = TorchBackend(self)
+        ref = reference.infer(sample)
+        best, best_ms = reference, inference_backends.benchmark(reference, sample, iters)
+        logging.info(f"推理后端 torch: {best_ms:.1f} ms")
+        for name, cls in BACKENDS.items():
+            if name == reference.name or (names and name not in names) or not cls.available(self.device):
+                continue
+            try:
+                backend = cls(self)
+                backend.load()
+                backend.warmup(tuple(sample.shape))
+                box_err, score_err = inference_backends.output_error(backend.infer_unchecked(sample), ref)
+                if box_err > inference_backends.BOX_TOL or score_err > inference_backends.SCORE_TOL:
+                    logging.info(f"推理后端 {name}: 框误差 {box_err:.3f}px / 分数误差 {score_err:.2e} 超出容差, 不采用")
+                    continue
+                ms = inference_backends.benchmark(backend, sample, iters)
+            except Exception as e:
+                logging.warning(f"推理后端 {name} 不可用: {str(e)}")
+                continue
+            logging.info(f"推理后端 {name}: {ms:.1f} ms, 框误差 {box_err:.3f}px, 分数误差 {score_err:.2e}")
+            if ms < best_ms:
+                best, best_ms = backend, ms
+        self.backend = best
+        self.backend_latency_ms = best_ms
+        inference_backends.save_choice(key, best.name, best_ms)
+        logging.info(f"选用推理后端 {best.name}, 延迟 {best_ms:.1f} ms, 已保存到 {inference_backends.CACHE_PATH}")
+        return best.name
+
+    def _annotate(self, det, img_bgr):
+        """det 已是原图坐标：画框，记录 last_detections，返回 contact point 中心点列表"""
+        contact_points = []
+        # 本帧全部检测结果 (xyxy, conf, 类别名)，供事件触发等后续模块使用
+        self.last_detections = []
+        for *xyxy, conf, cls in reversed(det):
+            self.last_detections.append(([float(v) for v in xyxy], float(conf), self.names[int(cls)]))
+
+            # 提取contact point的中心点坐标
+            if self.names[int(cls)] == 'contact point':
+                x_center = (xyxy[0] + xyxy[2]) / 2
+                y_center = (xyxy[1] + xyxy[3]) / 2
+                contact_points.append((float(x_center), float(y_center)))
+        if self.draw_boxes:
+            self.overlay.draw(img_bgr, self.last_detections)
+        return contact_points
+
+    def reuse(self, img_bgr):
+        """静止画面复用上一次推理的结果：在新帧上重画 last_detections，返回值与 predict 相同"""
+        contact_points = [((xyxy[0] + xyxy[2]) / 2, (xyxy[1] + xyxy[3]) / 2)
+                          for xyxy, conf, name in self.last_detections if name == 'contact point']
+        if self.draw_boxes:
+            self.overlay.draw(img_bgr, self.last_detections)
+        return img_bgr, contact_points
+
+    def _record_timings(self, t0, t1, t2, t3, t4, contact_points):
+        """各阶段耗时(秒)存入 last_timings 并写入指标"""
+        self.last_timings = {'preprocess': t1 - t0, 'inference': t2 - t1,
+                             'nms': t3 - t2, 'postprocess': t4 - t3}
+        for stage, seconds in self.last_timings.items():
+            METRICS.observe('stage_latency_seconds', seconds, stage=stage)
+        TRACER.add_stamps((t0, t1, t2, t3, t4), ('preprocess', 'forward', 'nms', 'draw'))
+        METRICS.inc('frames_inferred_total')
+        if contact_points:
+            METRICS.inc('frames_with_contact_total')
+
+    def _tile_grid(self, h, w):
+        """按分辨率缓存切块位置，返回 [(x0, y0), ...]"""
+        key = (h, w, self.tile_size, self.tile_overlap)
+        grid = self._tile_cache.get(key)
+        if grid is None:
+            def starts(length):
+                if length <= self.tile_size:
+                    return [0]
+                step = self.tile_size - int(self.tile_size * self.tile_overlap)
+                n = int(np.ceil((length - self.tile_size) / step)) + 1
+                return np.linspace(0, length - self.tile_size, n).round().astype(int).tolist()
+            grid = [(x0, y0) for y0 in starts(h) for x0 in starts(w)]
+            self._tile_cache[key] = grid
+            logging.info(f"分块推理: {w}x{h} 切为 {len(grid)} 块 {self.tile_size}px, 重叠 {self.tile_overlap:.0%}")
+        return grid
+
+    @torch.no_grad()
+    def predict_tiled(self, img_bgr):
+        """
+        高分辨率图像分块推理：切成互相重叠的 tile_size 方块，整批前向，
+        贴着内部切缝的残框与相邻切块里同一目标的框合并后做全局 NMS。
+        小目标不会因为整图缩放到 640 而丢失，跨切缝的大目标(受电弓)也能拼回完整的框
+        """
+        t0 = time.perf_counter()
+        h, w = img_bgr.shape[:2]
+        ts = self.tile_size
+        grid = self._tile_grid(h, w)
+        tiles = []
+        for x0, y0 in grid:
+            tile = img_bgr[y0:y0 + ts, x0:x0 + ts]
+            if tile.shape[0] != ts or tile.shape[1] != ts:   # 图像比切块小时补灰边
+                tile = cv2.copyMakeBorder(tile, 0, ts - tile.shape[0], 0, ts - tile.shape[1],
+                                          cv2.BORDER_CONSTANT, value=(114, 114, 114))
+            tiles.append(tile[:, :, ::-1].transpose(2, 0, 1))
+        t1 = time.perf_counter()
+
+        preds = []
+        for i in range(0, len(tiles), self.tile_batch):
+            batch = torch.from_numpy(np.ascontiguousarray(np.stack(tiles[i:i + self.tile_batch])))
+            batch = batch.to(self.device).float() / 255.0
+            preds.extend(non_max_suppression(self._forward(batch), self.conf_thres, self.iou_thres))
+        t2 = time.perf_counter()
+
+        margin = 2
+        boxes, clipped, tiles = [], [], []
+        for (x0, y0), det in zip(grid, preds):
+            if not len(det):
+                continue
+            # 贴着内部切缝的框被截断了：比重叠区小的目标相邻切块会给出完整的框，
+            # 比重叠区大的目标每块都只有一段，需要合并
+            cut = torch.zeros(len(det), dtype=torch.bool, device=det.device)
+            if x0 > 0:
+                cut |= det[:, 0] <= margin
+            if y0 > 0:
+                cut |= det[:, 1] <= margin
+            if x0 + ts < w:
+                cut |= det[:, 2] >= ts - margin
+            if y0 + ts < h:
+                cut |= det[:, 3] >= ts - margin
+            det = det.clone()
+            det[:, [0, 2]] += x0
+            det[:, [1, 3]] += y0
+            boxes.append(det)
+            clipped.append(cut)
+            tiles.append(det.new_tensor([x0, y0, x0 + ts, y0 + ts]).expand(len(det), 4))
+
+        if boxes:
+            det = self._merge_clipped(torch.cat(boxes), torch.cat(clipped), torch.cat(tiles))
+            det[:, [0, 2]] = det[:, [0, 2]].clamp(0, w)
+            det[:, [1, 3]] = det[:, [1, 3]].clamp(0, h)
+            keep = torchvision.ops.batched_nms(det[:, :4], det[:, 4], det[:, 5].long(), self.iou_thres)
+            # 与 non_max_suppression 的输出顺序一致：置信度降序
+            det = det[keep].round()
+        else:
+            det = torch.zeros((0, 6), device=self.device)
+        t3 = time.perf_counter()
+
+        contact_points = self._annotate(det, img_bgr)
+        self._record_timings(t0, t1, t2, t3, time.perf_counter(), contact_points)
+        return img_bgr, contact_points
+
     @staticmethod
-    def _plot_one_box(xyxy, img, color, label=None, line_thickness=3):
-        tl = line_thickness or max(round(sum(img.shape[:2]) / 2 * 0.003), 2)
-        c1, c2 = (int(xyxy[0]), int(xyxy[1])), (int(xyxy[2]), int(xyxy[3]))
-        cv2.rectangle(img, c1, c2, color, thickness=tl, lineType=cv2.LINE_AA)
-        if label:
-            tf = max(tl - 1, 1)
-            t_size = cv2.getTextSize(label, 0, fontScale=tl / 3, thickness=tf)[0]
-            c2 = c1[0] + t_size[0], c1[1] - t_size[1] - 3
-            cv2.rectangle(img, c1, c2, color, -1, cv2.LINE_AA)
-            cv2.putText(img, label, (c1[0], c1[1] - 2), 0, tl / 3,
-                        (255, 255, 255), thickness=tf, lineType=cv2.LINE_AA)
\ No newline at end of file
+    def _merge_clipped(det, clipped, tiles, iou_thres=0.5):
+        """
+        把被切缝截断的框与相邻切块里同类的框合并为外接框，置信度取最大值。
+        同一目标在两块里的框只在两块的公共区域里重合，所以先把两个框都裁到公共区域再算 IoU。
+        tiles 是每个框所在切块的范围，合并后取并集，可以继续和下一块的残段合并(跨多块的目标)
+        """
+        if not clipped.any():
+            return det
+        det, tiles = det.clone(), tiles.clone()
+        alive = torch.ones(len(det), dtype=torch.bool, device=det.device)
+        merged = True
+        while merged:
+            merged = False
+            for i in torch.nonzero(clipped & alive).flatten().tolist():
+                if not alive[i]:
+                    continue
+                # 公共区域 R
+                rx0, ry0 = torch.max(tiles[:, 0], tiles[i, 0]), torch.max(tiles[:, 1], tiles[i, 1])
+                rx1, ry1 = torch.min(tiles[:, 2], tiles[i, 2]), torch.min(tiles[:, 3], tiles[i, 3])
+                ax0, ax1 = torch.min(torch.max(det[i, 0], rx0), rx1), torch.min(torch.max(det[i, 2], rx0), rx1)
+                ay0, ay1 = torch.min(torch.max(det[i, 1], ry0), ry1), torch.min(torch.max(det[i, 3], ry0), ry1)
+                bx0, bx1 = torch.min(torch.max(det[:, 0], rx0), rx1), torch.min(torch.max(det[:, 2], rx0), rx1)
+                by0, by1 = torch.min(torch.max(det[:, 1], ry0), ry1), torch.min(torch.max(det[:, 3], ry0), ry1)
+                inter = (torch.min(ax1, bx1) - torch.max(ax0, bx0)).clamp(min=0) * \
+                        (torch.min(ay1, by1) - torch.max(ay0, by0)).clamp(min=0)
+                union = (ax1 - ax0) * (ay1 - ay0) + (bx1 - bx0) * (by1 - by0) - inter
+                iou = inter / union.clamp(min=1e-6)
+                other_tile = (tiles != tiles[i]).any(1)
+                same = alive & other_tile & (det[:, 5] == det[i, 5]) & (iou >= iou_thres)
+                if not same.any():
+                    continue
+                group, group_tiles = det[same], tiles[same]
+                det[i, :2] = torch.min(det[i, :2], group[:, :2].min(0).values)
+                det[i, 2:4] = torch.max(det[i, 2:4], group[:, 2:4].max(0).values)
+                det[i, 4] = torch.max(det[i, 4], group[:, 4].max())
+                tiles[i, :2] = torch.min(tiles[i, :2], group_tiles[:, :2].min(0).values)
+                tiles[i, 2:] = torch.max(tiles[i, 2:], group_tiles[:, 2:].max(0).values)
+                alive &= ~same
+                merged = True
+        return det[alive]
+
+    @torch.no_grad()
+    def predict_batch(self, imgs_bgr, img_size=None):
+        """
+        批量推理：输入若干 OpenCV BGR 图像，返回每张图的 (detections, contact_points)，不画框
+        所有图像 letterbox 到同一尺寸(auto=False) 后拼成一个 batch 做一次前向。
+        img_size 默认取 self.img_size(主窗口的动态尺寸)，其他调用方可传入固定尺寸
+        """
+        img_size = img_size or self.img_size
+        if not imgs_bgr:
+            return []
+        batch = []
+        for im in imgs_bgr:
+            img = letterbox(im, img_size, stride=self.stride, auto=False)[0]
+            batch.append(img[:, :, ::-1].transpose(2, 0, 1))  # BGR → RGB, HWC → CHW
+        batch = torch.from_numpy(np.ascontiguousarray(np.stack(batch))).to(self.device).float() / 255.0
+
+        pred = self._forward(batch)
+        pred = non_max_suppression(pred, self.conf_thres, self.iou_thres)
+
+        results = []
+        for det, im in zip(pred, imgs_bgr):
+            detections, contact_points = [], []
+            if len(det):
+                det[:, :4] = scale_coords(batch.shape[2:], det[:, :4], im.shape).round()
+                for *xyxy, conf, cls in reversed(det):
+                    name = self.names[int(cls)]
+                    xyxy = [float(v) for v in xyxy]
+                    detections.append((xyxy, float(conf), name))
+                    if name == 'contact point':
+                        contact_points.append(((xyxy[0] + xyxy[2]) / 2, (xyxy[1] + xyxy[3]) / 2))
+            results.append((detections, contact_points))
+        METRICS.inc('frames_inferred_total', len(imgs_bgr))
+        return results